@@ -4,6 +4,7 @@ import dash
 from dash import dcc, html
 from flask import send_from_directory
 
+from pages.r_pool import R_POOL
 from pages.viz import init_callbacks
 from pages.viz import layout as viz_layout
 
@@ -23,6 +24,8 @@ def download_file(filename):
 dash.register_page('visualization', layout=viz_layout, path='/visualization', name='Visualization', title='StatNet33 - Visualization', order=2)
 
 app.layout = html.Div([
+    # Job id of the ERGM fit this browser session made last, simulations start from its fitted model
+    dcc.Store(id='current-model', storage_type='session'),
     html.Div(className='navbar', children=[
         html.H1('StatNet33', style={'color': 'white', 'margin': '0', 'padding': '15px', 'text-align': 'center'}),
         html.Div(style={'display': 'flex', 'justify-content': 'center'}, children=[
@@ -36,5 +39,8 @@ app.layout = html.Div([
 # Initialize the callbacks for the visualization page
 init_callbacks(app)
 
+# Start the R workers now, so the first fit or simulation does not wait for the statnet libraries to load
+R_POOL.warm_up()
+
 if __name__ == '__main__':
     app.run_server(debug=True, host='127.0.0.1', port=8050)
@@ -0,0 +1,223 @@
+import threading
+
+import networkx as nx
+import numpy as np
+import pandas as pd
+
+
+class CSRGraph:
+    """
+    Directed graph stored as NumPy CSR arrays: int32 neighbour indices, float64 edge
+    weights and columnar node attributes. Node ids are kept as strings, like the
+    NetworkX graphs the app used to build, and are only converted to NetworkX on demand.
+    """
+
+    def __init__(self, node_ids, indptr, indices, weights, node_attrs=None):
+        self.node_ids = node_ids
+        self.indptr = indptr
+        self.indices = indices
+        self.weights = weights
+        # Attribute table aligned with node_ids, None for nodes without attributes
+        self.node_attrs = node_attrs
+        self._index = None
+        self._reverse = None
+        self._networkx = None
+        self._lock = threading.Lock()
+
+    @classmethod
+    def from_frames(cls, edges, nodes=None, source='Source', target='Target', weight='Weight', node_id='ID'):
+        """
+        Build the graph in bulk from an edge DataFrame and an optional node attribute DataFrame
+        :param edges: DataFrame with one row per edge
+        :param nodes: DataFrame with one row per node and its attributes
+        :return: A CSRGraph
+        """
+        # Same node order NetworkX gives: edge endpoints as they appear, repeated edges included,
+        # then attribute-only nodes
+        endpoints = np.column_stack([edges[source].astype(str), edges[target].astype(str)]).ravel()
+        node_ids = pd.unique(endpoints)
+
+        edges = edges.drop_duplicates(subset=[source, target], keep='last')
+        sources = edges[source].astype(str).to_numpy()
+        targets = edges[target].astype(str).to_numpy()
+        if nodes is not None:
+            attr_ids = nodes[node_id].astype(str)
+            node_ids = pd.unique(np.concatenate([node_ids, attr_ids.to_numpy()]))
+        node_ids = np.asarray(node_ids, dtype=object)
+        index = pd.Index(node_ids)
+
+        weights = edges[weight].to_numpy(dtype=np.float64) if weight in edges.columns else None
+
+        node_attrs = None
+        if nodes is not None:
+            # Later rows win, as repeated add_node calls would do
+            attrs = nodes.set_axis(attr_ids.to_numpy())
+            attrs = attrs[~attrs.index.duplicated(keep='last')]
+            # Nullable dtypes, so the empty rows of attribute-only gaps do not turn ints and bools into floats
+            attrs = attrs.astype({
+                column: 'boolean' if pd.api.types.is_bool_dtype(dtype) else 'Int64'
+                for column, dtype in attrs.dtypes.items()
+                if pd.api.types.is_bool_dtype(dtype) or pd.api.types.is_integer_dtype(dtype)
+            })
+            node_attrs = attrs.reindex(node_ids)
+            node_attrs['_has_attrs'] = node_attrs.index.isin(attrs.index)
+
+        return cls.from_arrays(node_ids, index.get_indexer(sources), index.get_indexer(targets), weights, node_attrs)
+
+    @classmethod
+    def from_arrays(cls, node_ids, src, dst, weights=None, node_attrs=None):
+        """
+        Build the graph from edge endpoint positions, in any order
+        :param node_ids: Array of node ids
+        :param src: Source position of every edge
+        :param dst: Target position of every edge
+        :param weights: Weight of every edge, 1 when not given
+        :return: A CSRGraph
+        """
+        order = np.argsort(src, kind='stable')
+        indptr = np.zeros(len(node_ids) + 1, dtype=np.int64)
+        np.cumsum(np.bincount(src, minlength=len(node_ids)), out=indptr[1:])
+        indices = np.asarray(dst)[order].astype(np.int32)
+        if weights is None:
+            weights = np.ones(len(indices), dtype=np.float64)
+        else:
+            weights = np.asarray(weights, dtype=np.float64)[order]
+        return cls(node_ids, indptr, indices, weights, node_attrs)
+
+    @property
+    def num_nodes(self):
+        return len(self.node_ids)
+
+    @property
+    def num_edges(self):
+        return len(self.indices)
+
+    @property
+    def index(self):
+        """Mapping from node id to its position in the arrays"""
+        if self._index is None:
+            self._index = dict(zip(self.node_ids, range(self.num_nodes)))
+        return self._index
+
+    def sources(self):
+        """Source position of every edge, in CSR order"""
+        return np.repeat(np.arange(self.num_nodes, dtype=np.int32), np.diff(self.indptr))
+
+    def out_degree(self):
+        return np.diff(self.indptr)
+
+    def in_degree(self):
+        return np.bincount(self.indices, minlength=self.num_nodes)
+
+    def degree(self):
+        return self.out_degree() + self.in_degree()
+
+    def degree_centrality(self):
+        if self.num_nodes <= 1:
+            return np.ones(self.num_nodes)
+        return self.degree() / (self.num_nodes - 1)
+
+    def successors(self, i):
+        return self.indices[self.indptr[i]:self.indptr[i + 1]]
+
+    def predecessors(self, i):
+        return self.reverse().successors(i)
+
+    def edge_weight(self, i, j):
+        """Weight of the edge i -> j, given node positions"""
+        start = self.indptr[i]
+        offset = np.flatnonzero(self.indices[start:self.indptr[i + 1]] == j)[0]
+        return self.weights[start + offset].item()
+
+    def reverse(self):
+        """The graph with every edge reversed, built once and cached"""
+        if self._reverse is None:
+            self._reverse = CSRGraph.from_arrays(self.node_ids, self.indices, self.sources(), self.weights)
+        return self._reverse
+
+    def to_undirected(self):
+        """
+        Symmetric graph with one edge each way for every connected pair, with unit weights
+        """
+        sources = self.sources().astype(np.int64)
+        targets = self.indices.astype(np.int64)
+        codes = np.unique(np.concatenate([sources * self.num_nodes + targets, targets * self.num_nodes + sources]))
+        return CSRGraph.from_arrays(self.node_ids, codes // self.num_nodes, codes % self.num_nodes)
+
+    def expand(self, frontier):
+        """
+        All out-neighbours of a set of nodes, gathered in a single vectorized step
+        :param frontier: Array of node positions
+        :return: Array of neighbour positions, with repeats
+        """
+        starts = self.indptr[frontier]
+        counts = self.indptr[frontier + 1] - starts
+        # Offset of every neighbour into `indices`, without a Python loop over the frontier
+        offsets = np.repeat(starts - np.cumsum(counts) + counts, counts) + np.arange(counts.sum())
+        return self.indices[offsets]
+
+    def bfs_distances(self, source):
+        """
+        Unweighted shortest path lengths from one node, expanding a whole frontier at a time
+        :param source: Node position
+        :return: int32 array of distances, -1 for unreachable nodes
+        """
+        distances = np.full(self.num_nodes, -1, dtype=np.int32)
+        distances[source] = 0
+        frontier = np.array([source], dtype=np.int64)
+        depth = 0
+        while len(frontier):
+            depth += 1
+            neighbours = self.expand(frontier)
+            neighbours = np.unique(neighbours[distances[neighbours] < 0])
+            distances[neighbours] = depth
+            frontier = neighbours
+        return distances
+
+    def node_attributes(self, i):
+        """Attributes of one node as a dict, empty if the node has no attribute row"""
+        if self.node_attrs is None or not self.node_attrs['_has_attrs'].iat[i]:
+            return {}
+        # A one-row frame keeps each column's own type, where a row Series would share one dtype
+        return self.node_attrs.iloc[[i]].drop(columns='_has_attrs').to_dict('records')[0]
+
+    def _attribute_records(self):
+        attrs = self.node_attrs.drop(columns='_has_attrs')
+        has_attrs = self.node_attrs['_has_attrs'].to_numpy()
+        records = attrs.to_dict('records')
+        return [record if has else {} for record, has in zip(records, has_attrs)]
+
+    def to_networkx(self):
+        """Equivalent nx.DiGraph, built once on first use"""
+        with self._lock:
+            if self._networkx is None:
+                DG = nx.DiGraph()
+                if self.node_attrs is None:
+                    DG.add_nodes_from(self.node_ids)
+                else:
+                    DG.add_nodes_from(zip(self.node_ids, self._attribute_records()))
+                DG.add_weighted_edges_from(zip(
+                    self.node_ids[self.sources()],
+                    self.node_ids[self.indices],
+                    self.weights.tolist(),
+                ))
+                self._networkx = DG
+        return self._networkx
+
+    def cytoscape_elements(self):
+        """Cytoscape elements in the format of nx.cytoscape_data, built straight from the arrays"""
+        if self.node_attrs is None:
+            records = [{} for _ in range(self.num_nodes)]
+        else:
+            records = self._attribute_records()
+        nodes = [
+            {'data': {**record, 'id': node_id, 'value': node_id, 'name': node_id}}
+            for node_id, record in zip(self.node_ids, records)
+        ]
+        edges = [
+            {'data': {'weight': weight, 'source': source, 'target': target}}
+            for source, target, weight in zip(
+                self.node_ids[self.sources()], self.node_ids[self.indices], self.weights.tolist()
+            )
+        ]
+        return {'nodes': nodes, 'edges': edges}
@@ -2,14 +2,16 @@
 import json
 import random
 
-import networkx as nx
 import numpy as np
 import pandas as pd
 import seaborn as sns
 from colour import Color
 from dash import MATCH, Input, Output, State, callback
 
-from .constants import ARROW_POSITIONS, DF_NODES, ELEMENTS, NETWORKX_DATA
+from .constants import (ARROW_POSITIONS, DF_NODES, ELEMENTS, GRAPH,
+                        GRAPH_VERSION)
+from .metrics import (EDGE_METRIC_INDEX, EXACT_NODE_LIMIT, NODE_METRIC_STORE,
+                      resolve_sample_size)
 
 current_tap_data = None
 
@@ -84,7 +86,33 @@ def validate_px_percentage(value, default="0px"):
         return default
 
 
+def centrality_sample_size(sample_size, tolerance):
+    """
+    Sample size of the approximate centralities for the loaded graph, None for exact values
+    """
+    return resolve_sample_size(GRAPH.num_nodes, sample_size, tolerance)
+
+
+def shortest_path_lengths(node):
+    """
+    BFS distances from a node to every node it reaches, nearest first
+    """
+    distances = GRAPH.bfs_distances(GRAPH.index[node])
+    reached = np.flatnonzero(distances >= 0)
+    reached = reached[np.argsort(distances[reached], kind="stable")]
+    return dict(zip(GRAPH.node_ids[reached], distances[reached].tolist()))
+
+
+def format_estimate(value, error, unit=""):
+    if error is None:
+        return str(value)
+    return f"{value} (±{error:.4f}{unit}, sampled estimate)"
+
+
 def assign_callbacks(app):
+    # Fill the edge metric index in the background as soon as the graph is loaded
+    EDGE_METRIC_INDEX.start(GRAPH, GRAPH_VERSION)
+
     # ############################## HIDING ###################################
     
 
@@ -141,45 +169,58 @@ def assign_callbacks(app):
     
     @app.callback(
         Output("tap-output", "children"),
+        Output("interval-edge-metrics", "disabled"),
         [Input("cytoscape", "tapNodeData"),
-        Input("cytoscape", "tapEdgeData")]
+        Input("cytoscape", "tapEdgeData"),
+        Input("interval-edge-metrics", "n_intervals")],
+        [State("input-centrality-samples", "value"),
+        State("input-centrality-tolerance", "value")]
     )
-    def displayTapNodeData(tap_node_data, tap_edge_data):
+    def displayTapNodeData(tap_node_data, tap_edge_data, n_intervals, centrality_samples, centrality_tolerance):
         global current_tap_data
         def get_node_data(node_id):
             node_atrr = ''
-            for key in NETWORKX_DATA.nodes[node_id].keys():
-                node_atrr += str(key) + ': ' + str(NETWORKX_DATA.nodes[node_id][key]) + "\n"
+            for key, value in GRAPH.node_attributes(GRAPH.index[node_id]).items():
+                node_atrr += str(key) + ': ' + str(value) + "\n"
             return node_atrr
         
         if (tap_node_data) and (current_tap_data != tap_node_data):
             node = tap_node_data['id']
+            sample_size = centrality_sample_size(centrality_samples, centrality_tolerance)
+            metrics = NODE_METRIC_STORE.lookup(GRAPH, GRAPH_VERSION, node, sample_size)
+            errors = NODE_METRIC_STORE.errors(GRAPH, GRAPH_VERSION, sample_size)
             result =( "You recently clicked/tapped the node: " + tap_node_data['id'].upper() + "\n" +
                      "========================================================="+ "\n" +
-                    "NODE DEGREE: " + str(NETWORKX_DATA.degree()[node]) +"\n"+"(Total connection count)" +"\n"+ "\n" +
-                    "NODE IN-DEGREE: " + str(NETWORKX_DATA.in_degree()[node]) + "\n" +"(Incoming connection count)" + "\n" + "\n" +
-                    "NODE OUT-DEGREE: "+ str(NETWORKX_DATA.out_degree()[node]) + "\n" +"(Outgoing connection count)" + "\n" + "\n" +
-                    "NODE CLUSTERING COEFFICIENT: " + str(nx.clustering(NETWORKX_DATA)[node]) + "\n" +"(How tightly-knit the neighbors are)" +"\n"+ "\n" +
-                    "NODE TRIANGLES FORMED: " + str(nx.triangles(NETWORKX_DATA.to_undirected())[node]) + "\n" +"(Only applied for undirected network)"+"\n" + "\n" +
-                    "NODE DEGREE CENTRALITY: "+ str(nx.degree_centrality(NETWORKX_DATA)[node]) + "\n" +"(Node's importance based on its connections)" +"\n" +"\n" +
-                    "NODE BETWEENNESS CENTRALITY: "+ str(nx.betweenness_centrality(NETWORKX_DATA)[node]) + "\n" +"(How often a node appears on shortest paths between other nodes)" +"\n" +"\n" +
-                    "NODE CLOSENESS CENTRALITY: " + str(nx.closeness_centrality(NETWORKX_DATA)[node]) + "\n" +"(How quickly information spreads to other nodes)" +"\n"+"\n" +
+                    "NODE DEGREE: " + str(metrics['degree']) +"\n"+"(Total connection count)" +"\n"+ "\n" +
+                    "NODE IN-DEGREE: " + str(metrics['in_degree']) + "\n" +"(Incoming connection count)" + "\n" + "\n" +
+                    "NODE OUT-DEGREE: "+ str(metrics['out_degree']) + "\n" +"(Outgoing connection count)" + "\n" + "\n" +
+                    "NODE CLUSTERING COEFFICIENT: " + str(metrics['clustering']) + "\n" +"(How tightly-knit the neighbors are)" +"\n"+ "\n" +
+                    "NODE TRIANGLES FORMED: " + str(metrics['triangles']) + "\n" +"(Only applied for undirected network)"+"\n" + "\n" +
+                    "NODE DEGREE CENTRALITY: "+ str(metrics['degree_centrality']) + "\n" +"(Node's importance based on its connections)" +"\n" +"\n" +
+                    "NODE BETWEENNESS CENTRALITY: "+ format_estimate(metrics['betweenness_centrality'], errors.get('betweenness_centrality')) + "\n" +"(How often a node appears on shortest paths between other nodes)" +"\n" +"\n" +
+                    "NODE CLOSENESS CENTRALITY: " + format_estimate(metrics['closeness_centrality'], errors.get('closeness_centrality'), " hops of mean distance") + "\n" +"(How quickly information spreads to other nodes)" +"\n"+"\n" +
                     "NODE SINGLE SOURCE SHORTEST PATH LENGTHS: "+"\n"+"(Lengths of shortest paths from this node to other nodes)" + "\n"
-                    + str(nx.single_source_shortest_path_length(NETWORKX_DATA, node)) + "\n" 
+                    + str(shortest_path_lengths(node)) + "\n" 
                     + "========================================================="+ "\n"
                     + "NODE ATTRIBUTES: " + "\n"
                     + get_node_data(node) 
                     )
             current_tap_data = tap_node_data
-            return result
+            return result, True
         elif tap_edge_data:
             source = str(tap_edge_data['source'])
             target = str(tap_edge_data['target'])
+            edge_metrics = EDGE_METRIC_INDEX.lookup(GRAPH, GRAPH_VERSION, source, target)
+            if edge_metrics is None:
+                # Keep polling until the background index is ready
+                edge_betweenness = "computing…"
+            else:
+                edge_betweenness = str(edge_metrics['betweenness_centrality'])
             result = ("You recently clicked/tapped the edge between "
                     + source.upper() + " and " + target.upper() + "\n" 
                     + "========================================================="+ "\n" 
-                    + "EDGE WEIGHT: "+ str(NETWORKX_DATA[source][target]['weight']) + "\n"+ "(Strength of the connection)" + "\n" +"\n" 
-                    + "EDGE BETWEENNESS CENTRALITY: " + str(nx.edge_betweenness_centrality(NETWORKX_DATA)[(source,target)]) + "\n"+ "(The importance in connecting different parts of the network)" + "\n"+ "\n" 
+                    + "EDGE WEIGHT: "+ str(GRAPH.edge_weight(GRAPH.index[source], GRAPH.index[target])) + "\n"+ "(Strength of the connection)" + "\n" +"\n" 
+                    + "EDGE BETWEENNESS CENTRALITY: " + edge_betweenness + "\n"+ "(The importance in connecting different parts of the network)" + "\n"+ "\n" 
                     + "========================================================="+ "\n"
                     + "Source Attributes: " + "\n"
                     + get_node_data(source) + "\n"
@@ -187,13 +228,30 @@ def assign_callbacks(app):
                     + "Target Attributes: " + "\n"
                     + get_node_data(target)            
             )
-            return result
+            return result, edge_metrics is not None
                                             
         else:
-            return "Click to a node or edge to see the data here."
+            return "Click to a node or edge to see the data here.", True
         
     
 
+    @app.callback(
+        Output("div-centrality-estimate", "children"),
+        [Input("input-centrality-samples", "value"),
+        Input("input-centrality-tolerance", "value")]
+    )
+    def update_centrality_estimate(centrality_samples, centrality_tolerance):
+        num_nodes = GRAPH.num_nodes
+        sample_size = centrality_sample_size(centrality_samples, centrality_tolerance)
+        if sample_size is None:
+            if (centrality_samples or centrality_tolerance) and num_nodes <= EXACT_NODE_LIMIT:
+                return f"Exact centralities are used for graphs with up to {EXACT_NODE_LIMIT} nodes."
+            return "Exact centralities."
+        errors = NODE_METRIC_STORE.errors(GRAPH, GRAPH_VERSION, sample_size)
+        return (f"Sampled centralities from {sample_size} of {num_nodes} nodes. "
+                f"Betweenness error ±{errors['betweenness_centrality']:.4f}, "
+                f"closeness mean distance error ±{errors['closeness_centrality']:.2f} hops (95% confidence).")
+
     @app.callback(
         Output("div-display-elements-json", "children"),
         Input("cytoscape", "elements"),
@@ -372,7 +430,9 @@ def assign_callbacks(app):
                 "dropdown-attr-cat",
                 "dropdown-attr-num",
                 "input-max-size",
-                "dropdown-pallete"
+                "dropdown-pallete",
+                "input-centrality-samples",
+                "input-centrality-tolerance",
             ]
         ],
     )
@@ -452,6 +512,8 @@ def assign_callbacks(app):
         chosen_attr_num,
         node_max_size,
         color_palette,
+        centrality_samples,
+        centrality_tolerance,
     ):
         def update_style(stylesheet, selector, addition):
             for style in stylesheet:
@@ -532,12 +594,13 @@ def assign_callbacks(app):
                 )
         
         if chosen_attr_num != "None":
+            sample_size = centrality_sample_size(centrality_samples, centrality_tolerance)
             if chosen_attr_num == "Degree Centrality":
-                style_by_stat(nx.degree_centrality(NETWORKX_DATA),node_max_size)
+                style_by_stat(NODE_METRIC_STORE.as_dict(GRAPH, GRAPH_VERSION, 'degree_centrality', sample_size),node_max_size)
             elif chosen_attr_num == "Betweenness Centrality":
-                style_by_stat(nx.betweenness_centrality(NETWORKX_DATA),node_max_size)
+                style_by_stat(NODE_METRIC_STORE.as_dict(GRAPH, GRAPH_VERSION, 'betweenness_centrality', sample_size),node_max_size)
             elif chosen_attr_num == "Closeness Centrality":
-                style_by_stat(nx.closeness_centrality(NETWORKX_DATA),node_max_size)
+                style_by_stat(NODE_METRIC_STORE.as_dict(GRAPH, GRAPH_VERSION, 'closeness_centrality', sample_size),node_max_size)
             else:            
                 max_value = DF_NODES[chosen_attr_num].max()
                 if max_value == 0:
@@ -695,11 +758,12 @@ def assign_callbacks(app):
             if edge_line_color != "#999999":
                 default_color = edge_line_color
             rgb_default = Color(default_color).rgb
-            max_weight = max([data['weight'] for source, target, data in NETWORKX_DATA.edges(data=True)])
-            min_weight = min([data['weight'] for source, target, data in NETWORKX_DATA.edges(data=True)])
+            max_weight = GRAPH.weights.max()
+            min_weight = GRAPH.weights.min()
             if max_weight != min_weight:
-                for source, target, data in NETWORKX_DATA.edges(data=True):
-                    color_strength = (data['weight'] - min_weight)/(max_weight - min_weight)
+                edges = zip(GRAPH.node_ids[GRAPH.sources()], GRAPH.node_ids[GRAPH.indices], GRAPH.weights.tolist())
+                for source, target, weight in edges:
+                    color_strength = (weight - min_weight)/(max_weight - min_weight)
                     edge_color = generate_color(rgb_default, color_strength)
                     addselector_tostylesheet(
                         stylesheet=stylesheet,
@@ -1,10 +1,13 @@
+import hashlib
 import json
 import os
-import random
 
-import networkx as nx
+import numpy as np
 import pandas as pd
 
+from pages.csr_graph import CSRGraph
+from pages.network_io import read_table
+
 #######################################
 
 def createpath(path_name):
@@ -14,32 +17,33 @@ def createpath(path_name):
 
 # Read edge data
 path1 = createpath('../../data/network_edges.csv')
-data = pd.read_csv(path1)
+data = read_table(path1)
 
 # Add weights to the edges if not present
 if 'Weight' not in data.columns:
     # weight is a random number from 0 to 1
-    data['Weight'] = [random.random() for i in range(len(data))]
+    data['Weight'] = np.random.random(len(data))
 
 
 #Read node data
 path2 = createpath('../../data/network_data.csv')
-attr = pd.read_csv(path2)
+attr = read_table(path2)
 #if no ID column, add it
 if 'ID' not in attr.columns:
     attr['ID'] = attr.index
 
 
-#Create Networkx graph
-DG = nx.DiGraph()
-for i in range(len(data)):
-    DG.add_edge(str(data['Source'][i]), str(data['Target'][i]), weight=data['Weight'][i])
-    
-for index, row in attr.iterrows():
-    node_id = str(row['ID'])
-    attributes = row
-    DG.add_node(node_id, **attributes)
-        
+#Create the CSR graph in bulk, NetworkX graphs are built from it on demand
+graph = CSRGraph.from_frames(data, attr)
+
+
+# Version token of the loaded graph, changes whenever either input file changes
+graph_hash = hashlib.sha1()
+for path in (path1, path2):
+    with open(path, 'rb') as file:
+        graph_hash.update(file.read())
+graph_version = graph_hash.hexdigest()
+
 
 #Get attribute list
 numeric_attributes = []
@@ -56,7 +60,7 @@ attr_list = numeric_attributes + categorical_attributes
 
 #################################################################    
 
-ELEMENTS = nx.cytoscape_data(DG)['elements']
+ELEMENTS = graph.cytoscape_elements()
 ARROW_POSITIONS = ("source", "mid-source", "target", "mid-target")
 LABEL_ELEMENT_TYPES = ("node", "edge")
 LABEL_ELEMENT_TYPES_ALL = ("node", "edge", "source", "target")
@@ -64,4 +68,5 @@ DF_NODES = attr
 DF_EDGES = data
 NUMERIC_ATTR = numeric_attributes
 CATEGORICAL_ATTR = categorical_attributes
-NETWORKX_DATA = DG
+GRAPH = graph
+GRAPH_VERSION = graph_version
@@ -5,6 +5,7 @@ from pages.demos import dash_reusable_components as drc
 
 from .constants import (CATEGORICAL_ATTR, ELEMENTS, LABEL_ELEMENT_TYPES,
                         LABEL_ELEMENT_TYPES_ALL, NUMERIC_ATTR)
+from .metrics import DEFAULT_SAMPLE_SIZE, EXACT_NODE_LIMIT
 
 user_interface = html.Div(
     style={
@@ -69,6 +70,23 @@ user_interface = html.Div(
                     value="None",
                     clearable=False,
                 ),
+                drc.NamedInput(
+                    name=f"Centrality sample size k (blank for exact, or {DEFAULT_SAMPLE_SIZE} above {EXACT_NODE_LIMIT} nodes)",
+                    id="input-centrality-samples",
+                    type="number",
+                    min=1,
+                    step=1,
+                    placeholder="Enter a number of sampled nodes...",
+                ),
+                drc.NamedInput(
+                    name="Centrality error tolerance (overrides k)",
+                    id="input-centrality-tolerance",
+                    type="number",
+                    min=0,
+                    max=1,
+                    placeholder="Enter an error between 0 and 1...",
+                ),
+                html.P(id="div-centrality-estimate"),
                 drc.NamedDropdown(
                     name="Select color pallete",
                     id="dropdown-pallete",
@@ -709,13 +727,21 @@ layout = html.Div(
                                         "height": "calc(100vh - 90px)",
                                         "overflow": "auto",
                                     },
-                                    children=html.Pre(
-                                        id="tap-output",
-                                        style={
-                                            "color": "#d0d0d0",
-                                            "margin": "5px",
-                                        },
-                                    ),
+                                    children=[
+                                        html.Pre(
+                                            id="tap-output",
+                                            style={
+                                                "color": "#d0d0d0",
+                                                "margin": "5px",
+                                            },
+                                        ),
+                                        # Refreshes the edge statistics while they are still being computed
+                                        dcc.Interval(
+                                            id="interval-edge-metrics",
+                                            interval=1000,
+                                            disabled=True,
+                                        ),
+                                    ],
                                     
                                 ),
                             ),
@@ -0,0 +1,249 @@
+import math
+import random
+import threading
+from concurrent.futures import Future
+
+import networkx as nx
+import numpy as np
+
+# Graphs up to this size always use the exact centrality routines
+EXACT_NODE_LIMIT = 2000
+# Sample size used above EXACT_NODE_LIMIT when neither a sample size nor a tolerance is given
+DEFAULT_SAMPLE_SIZE = 1000
+# Confidence level of the reported sampling error
+CONFIDENCE = 0.95
+# Fixed seed so repeated estimates of the same graph agree with each other
+SAMPLING_SEED = 33
+
+
+def resolve_sample_size(num_nodes, sample_size=None, tolerance=None, confidence=CONFIDENCE):
+    """
+    Pick the number of pivots/landmarks used by the approximate centralities
+    :param num_nodes: Number of nodes in the graph
+    :param sample_size: Requested sample size k, DEFAULT_SAMPLE_SIZE when neither it nor tolerance is given
+    :param tolerance: Requested additive error, used instead of sample_size when given
+    :param confidence: Confidence level the tolerance should hold with
+    :return: The sample size, or None when the exact routines should be used
+    """
+    if num_nodes <= EXACT_NODE_LIMIT:
+        return None
+    if tolerance:
+        sample_size = math.ceil(math.log(2 * num_nodes / (1 - confidence)) / (2 * tolerance ** 2))
+    elif not sample_size:
+        sample_size = DEFAULT_SAMPLE_SIZE
+    if sample_size >= num_nodes:
+        return None
+    return int(sample_size)
+
+
+def sampling_error(num_nodes, sample_size, confidence=CONFIDENCE):
+    """
+    Hoeffding bound on the additive error of a mean of sample_size values in [0, 1],
+    holding for all num_nodes estimates at once with the given confidence
+    """
+    return math.sqrt(math.log(2 * num_nodes / (1 - confidence)) / (2 * sample_size))
+
+
+def approximate_betweenness(graph, sample_size):
+    """
+    Pivot-sampled Brandes betweenness, normalised like nx.betweenness_centrality
+    """
+    values = nx.betweenness_centrality(graph.to_networkx(), k=sample_size, seed=SAMPLING_SEED)
+    return graph_array(graph, values), sampling_error(graph.num_nodes, sample_size)
+
+
+def approximate_closeness(graph, sample_size):
+    """
+    Landmark-based closeness, an estimate of nx.closeness_centrality (with wf_improved)
+    from the BFS distances of a random sample of landmark nodes
+    :return: The estimates and the error bound on each node's mean distance, in hops
+    """
+    landmarks = random.Random(SAMPLING_SEED).sample(range(graph.num_nodes), sample_size)
+
+    distance_sum = np.zeros(graph.num_nodes)
+    reached_by = np.zeros(graph.num_nodes)
+    max_distance = 0
+    for landmark in landmarks:
+        # A BFS from the landmark gives its distance *to* every node, which is
+        # the direction nx.closeness_centrality uses for directed graphs
+        distances = graph.bfs_distances(landmark)
+        reached = distances > 0
+        distance_sum[reached] += distances[reached]
+        reached_by[reached] += 1
+        max_distance = max(max_distance, distances.max())
+
+    # Landmarks are not counted as reaching themselves
+    candidates = np.full(graph.num_nodes, float(sample_size))
+    candidates[landmarks] -= 1
+    with np.errstate(divide="ignore", invalid="ignore"):
+        closeness = np.where(distance_sum > 0, (reached_by / candidates) * (reached_by / distance_sum), 0.0)
+    return closeness, sampling_error(graph.num_nodes, sample_size) * max_distance
+
+
+# Metrics with a sampled estimator, used instead of the exact routine when a sample size is set
+SAMPLED_NODE_METRICS = {
+    "betweenness_centrality": approximate_betweenness,
+    "closeness_centrality": approximate_closeness,
+}
+
+def graph_array(graph, values):
+    """
+    Turn a {node: value} dict from NetworkX into an array in the graph's node order
+    """
+    return np.array([values[node] for node in graph.node_ids])
+
+
+# Whole-graph node metrics shown by the tap inspector and used to resize nodes.
+# Each one is computed once per graph version and stored as an array indexed by node.
+# Degree metrics run on the CSR arrays, the others on a NetworkX copy built on demand.
+NODE_METRICS = {
+    "degree": lambda graph: graph.degree(),
+    "in_degree": lambda graph: graph.in_degree(),
+    "out_degree": lambda graph: graph.out_degree(),
+    "clustering": lambda graph: graph_array(graph, nx.clustering(graph.to_networkx())),
+    "triangles": lambda graph: graph_array(graph, nx.triangles(graph.to_networkx().to_undirected())),
+    "degree_centrality": lambda graph: graph.degree_centrality(),
+    "betweenness_centrality": lambda graph: graph_array(graph, nx.betweenness_centrality(graph.to_networkx())),
+    "closeness_centrality": lambda graph: graph_array(graph, nx.closeness_centrality(graph.to_networkx())),
+}
+
+
+class NodeMetricStore:
+    """
+    Cache of whole-graph node metrics for one graph version, each computed the first time it is asked for.
+    Exact values are kept per graph version and sampled centralities per (version, sample size),
+    so switching metrics or sample sizes never throws away values already computed.
+    """
+
+    def __init__(self):
+        # Only guards the cache itself; metrics are computed outside it
+        self._lock = threading.Lock()
+        self._version = None
+        # (metric name, sample size or None) -> Future of (values array, error or None)
+        self._values = {}
+
+    def _metric(self, graph, version, name, sample_size):
+        """
+        Values and estimated error of one metric, None as error for exact values.
+        The first caller of a metric computes it; concurrent callers wait for that metric only.
+        """
+        if not (sample_size and name in SAMPLED_NODE_METRICS):
+            sample_size = None
+        key = (name, sample_size)
+        with self._lock:
+            if self._version != version:
+                self._version, self._values = version, {}
+            future = self._values.get(key)
+            owner = future is None
+            if owner:
+                future = self._values[key] = Future()
+        if owner:
+            try:
+                if sample_size is None:
+                    future.set_result((NODE_METRICS[name](graph), None))
+                else:
+                    future.set_result(SAMPLED_NODE_METRICS[name](graph, sample_size))
+            except Exception as e:
+                # Not kept, so the next caller tries again
+                with self._lock:
+                    if self._values.get(key) is future:
+                        del self._values[key]
+                future.set_exception(e)
+        return future.result()
+
+    def lookup(self, graph, version, node, sample_size=None):
+        """
+        Return every stored metric for a single node
+        :param graph: The CSRGraph the metrics are computed on
+        :param version: A token that changes whenever the graph changes
+        :param node: The node id
+        :param sample_size: Sample size of the approximate centralities, None for exact values
+        :return: A dict mapping metric name to value
+        """
+        i = graph.index[node]
+        return {name: self._metric(graph, version, name, sample_size)[0][i].item() for name in NODE_METRICS}
+
+    def as_dict(self, graph, version, metric, sample_size=None):
+        """
+        Return one metric for all nodes, in the {node: value} form NetworkX uses
+        """
+        values = self._metric(graph, version, metric, sample_size)[0]
+        return dict(zip(graph.node_ids, values.tolist()))
+
+    def errors(self, graph, version, sample_size=None):
+        """
+        Return the estimated error of each sampled metric, empty for exact values
+        """
+        errors = {}
+        if not sample_size:
+            return errors
+        for name in SAMPLED_NODE_METRICS:
+            error = self._metric(graph, version, name, sample_size)[1]
+            if error is not None:
+                errors[name] = error
+        return errors
+
+
+NODE_METRIC_STORE = NodeMetricStore()
+
+
+# Edge metrics shown by the tap inspector, keyed by (source, target)
+EDGE_METRICS = {
+    "betweenness_centrality": nx.edge_betweenness_centrality,
+}
+
+
+class EdgeMetricIndex:
+    """
+    Edge-keyed index of whole-graph edge metrics, filled once per graph version.
+    The index can be filled on a background thread, lookups return None until it is ready.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._version = None
+        self._index = None
+        self._arrays = None
+
+    def start(self, graph, version, background=True):
+        """
+        Start filling the index for a graph version, unless it is already filled or filling
+        """
+        with self._lock:
+            if self._version == version:
+                return
+            self._version = version
+            self._index = None
+            self._arrays = None
+        if background:
+            threading.Thread(target=self._fill, args=(graph, version), daemon=True).start()
+        else:
+            self._fill(graph, version)
+
+    def _fill(self, graph, version):
+        graph = graph.to_networkx()
+        edges = list(graph.edges())
+        index = {edge: i for i, edge in enumerate(edges)}
+        arrays = {}
+        for name, compute in EDGE_METRICS.items():
+            values = compute(graph)
+            arrays[name] = np.array([values[edge] for edge in edges])
+        with self._lock:
+            # A newer graph version may have been started while this one was computing
+            if self._version == version:
+                self._index, self._arrays = index, arrays
+
+    def lookup(self, graph, version, source, target):
+        """
+        Return every stored metric for a single edge
+        :return: A dict mapping metric name to value, or None while the index is being computed
+        """
+        self.start(graph, version)
+        with self._lock:
+            if self._version != version or self._index is None:
+                return None
+            i = self._index[(source, target)]
+            return {name: values[i].item() for name, values in self._arrays.items()}
+
+
+EDGE_METRIC_INDEX = EdgeMetricIndex()
@@ -4,15 +4,20 @@
 # Now with dynamic attribute checklist generation based on the data.
 
 import os
+import shutil
+import time
 
 import dash
 import dash_bootstrap_components as dbc
 import numpy as np
 import pandas as pd
-import rpy2.robjects as robjects
-from dash import dcc, html
+from dash import dash_table, dcc, html
 from dash.dependencies import Input, Output, State
-from rpy2.robjects import pandas2ri
+
+from pages.ergm_cache import ERGM_CACHE, MODEL_FILE, cache_key, submit_fit
+from pages.ergm_jobs import CANCELLED, DONE, ERGM_JOBS, FAILED, QUEUED, RUNNING, write_json
+from pages.mple import UnsupportedTerm, fit_mple
+from pages.network_io import read_table
 
 # For Windows Users
 # Set R_HOME
@@ -33,7 +38,7 @@ dash.register_page(
 )
 
 # Read, extract, and generate the options for the attribute checklist
-attr_data = pd.read_csv("pages/data/network_data.csv")
+attr_data = read_table("pages/data/network_data.csv")
 attr_names = attr_data.columns.tolist()[2:]
 def generate_attr_options(attr_names):
     options = []
@@ -106,7 +111,37 @@ def layout():
             )
         ]),
         
+        html.Details([
+            html.Summary('Performance Settings'),
+            html.Label('Parallel MCMC chains'),
+            dcc.Input(id='ergm-chains', type='number', value=1, min=1, max=os.cpu_count(), step=1),
+            html.Label('MCMC sample size'),
+            dcc.Input(id='ergm-samplesize', type='number', min=100, step=100, placeholder='ergm default'),
+            html.Label('MCMC burn-in'),
+            dcc.Input(id='ergm-burnin', type='number', min=0, step=1000, placeholder='ergm default'),
+            html.Label('GOF simulations'),
+            dcc.Input(id='ergm-gof-nsim', type='number', min=10, step=10, placeholder='ergm default'),
+            dcc.Checklist(id='ergm-warm-start', options=[{'label': ' Start from the closest earlier fit', 'value': 'warm'}],
+                          value=['warm']),
+            html.P('Chains run in parallel R processes on this server, for both the fit and the goodness-of-fit. '
+                   'Starting from an earlier fit of the same data reuses its coefficients, or its MCMC sample when '
+                   'terms were only removed, so small changes to the terms converge faster.',
+                   style={'fontSize': '12px', 'color': '#666'})
+        ], style={'marginTop': '10px'}),
+
+        html.Button('Preview (MPLE)', id='preview-button', n_clicks=0, style={'marginTop': '10px', 'marginRight': '10px'}),
         html.Button('Run ERGM', id='run-button', n_clicks=0, style={'marginTop': '10px'}),
+        html.Button('Cancel fit', id='cancel-button', n_clicks=0, style={'marginTop': '10px', 'marginLeft': '10px'}),
+        html.Div(id='ergm-job-status', style={'marginTop': '10px'}),
+        # Last lines of the R console output of the running fit
+        html.Pre(id='ergm-job-log', style={'fontSize': '12px', 'maxHeight': '200px', 'overflowY': 'auto'}),
+        html.Div(id='ergm-cache-stats', style={'marginTop': '5px', 'fontSize': '12px', 'color': '#666'}),
+        # Id of the submitted fit, polled until its results are ready
+        dcc.Store(id='ergm-job'),
+        dcc.Interval(id='ergm-job-poll', interval=2000, disabled=True),
+        # Job id of an MPLE preview handed to the R worker, polled like the full fit
+        dcc.Store(id='ergm-preview-job'),
+        dcc.Interval(id='ergm-preview-poll', interval=1000, disabled=True),
         html.Div([
         html.H3('ERGM Term Descriptions'),
         dcc.Dropdown(
@@ -261,321 +296,473 @@ def update_term_description(selected_term):
         return ''
     
 
-# Function to generate explanations for each coefficient
+# Function to generate explanations for each coefficient. The sentences are assembled column-wise,
+# so models with hundreds of terms render quickly.
 def generate_coefficient_explanations(coef_df):
-    # Generate explanations for each coefficient
-    detailed_explanation_list = []
-    for index, row in coef_df.iterrows():
-        term = row['Term']
-        estimate = row['Estimate']
-        error = row['Std. Error']
-        z_value = row['Z-value']
-        attr_name = term.split('.')[-1] if '.' in term else term
-        sign = 'positive' if estimate > 0 else 'negative'
-
-        # Skip coefficients with NaN estimates
-        if error == 0:
-            continue
-
-        explanation = ""
-
-        # Handle edge cases
-        if term == 'edges':
-            explanation = (f"The {sign} estimation value of {estimate:.4f} for edges indicates a {'higher' if sign == 'positive' else 'lower'} likelihood of additional ties forming "
-                           f"as the number of edges in the network increases. "
-                           f"This finding is {'statistically significant' if abs(z_value) > 1.96 else 'not statistically significant'}, "
-                           f"with a Z-value of {z_value:.2f}.")
-
-        # Handle node covariates
-        elif 'nodecov' in term:
-            explanation =(f"The {sign} coefficient ({estimate:.4f}) with a Z-value of {z_value:.2f} suggests that '{attr_name}' is "
-                          f"{'statistically significant' if abs(z_value) > 1.96 else 'not statistically significant associated with the degree. '} "
-                          f"Specially, for every unit increase in '{attr_name}', the log odds of having an additional tie increase by ({estimate:.4f}), when "
-                          f"holding everything else constant.")
-            
-        elif 'nodefactor' in term:
-            explanation = (f"Individuals with attribute '{attr_name}' are {'more' if sign == 'positive' else 'less'} likely "
-                           f"to form connections, with an estimate of {estimate:.4f}. "
-                           f"This effect is {'statistically significant' if abs(z_value) > 1.96 else 'not statistically significant'}, "
-                           f"with a Z-value of {z_value:.2f}.")
-                    # Handle node factors and node matches, which have similar explanations
-        elif 'nodematch' in term:
-            explanation = (f"Individuals with attribute '{attr_name}' are {'more' if sign == 'positive' else 'less'} likely "
-                           f"to form connections with each other, with an estimate of {estimate:.4f}. "
-                           f"This effect is {'statistically significant' if abs(z_value) > 1.96 else 'not statistically significant'}, "
-                           f"with a Z-value of {z_value:.2f}.")
-        elif 'mix' in term:
-            # Split attributes for nodemix terms if applicable
-            attrs = term.split('.')
-            if len(attrs) > 1:
-                explanation = (f"The interaction between '{attrs[1]}' and '{attrs[2]}' has a {sign} effect on the likelihood of forming connections, with an estimate of {estimate:.4f}. "
-                               f"This indicates that different groups based on '{attrs[1]}' and '{attrs[2]}' interact {'more frequently' if sign == 'positive' else 'less frequently'} in forming ties. "
-                               f"This effect is {'statistically significant' if abs(z_value) > 1.96 else 'not statistically significant'}, "
-                               f"with a Z-value of {z_value:.2f}.")
-
-        # Append the detailed explanation to the list
-        detailed_explanation_list.append(html.Li(f"'{term}': {explanation}"))
-
-    return html.Ul(detailed_explanation_list)
+    # Skip coefficients with NaN estimates
+    coef_df = coef_df[coef_df['Std. Error'] != 0]
+    term = coef_df['Term'].astype(str)
+    positive = (coef_df['Estimate'] > 0).to_numpy()
+    significant = (coef_df['Z-value'].abs() > 1.96).to_numpy()
+    sign = pd.Series(np.where(positive, 'positive', 'negative'), index=term.index)
+    estimate = coef_df['Estimate'].map('{:.4f}'.format)
+    z_value = coef_df['Z-value'].map('{:.2f}'.format)
+    significance = pd.Series(np.where(significant, 'statistically significant', 'not statistically significant'),
+                             index=term.index)
+    more = pd.Series(np.where(positive, 'more', 'less'), index=term.index)
+    parts = term.str.split('.')
+    attr_name = parts.str[-1]
+
+    # Handle edge cases
+    edges = ("The " + sign + " estimation value of " + estimate + " for edges indicates a "
+             + np.where(positive, 'higher', 'lower') + " likelihood of additional ties forming "
+             "as the number of edges in the network increases. "
+             "This finding is " + significance + ", with a Z-value of " + z_value + ".")
+    # Handle node covariates
+    nodecov = ("The " + sign + " coefficient (" + estimate + ") with a Z-value of " + z_value + " suggests that '"
+               + attr_name + "' is "
+               + np.where(significant, 'statistically significant', 'not statistically significant associated with the degree. ')
+               + " Specially, for every unit increase in '" + attr_name + "', the log odds of having an additional tie "
+               "increase by (" + estimate + "), when holding everything else constant.")
+    # Handle node factors and node matches, which have similar explanations
+    nodefactor = ("Individuals with attribute '" + attr_name + "' are " + more + " likely to form connections, "
+                  "with an estimate of " + estimate + ". "
+                  "This effect is " + significance + ", with a Z-value of " + z_value + ".")
+    nodematch = ("Individuals with attribute '" + attr_name + "' are " + more + " likely to form connections with each other, "
+                 "with an estimate of " + estimate + ". "
+                 "This effect is " + significance + ", with a Z-value of " + z_value + ".")
+    # Split attributes for nodemix terms
+    first, second = parts.str[1].fillna(''), parts.str[2].fillna('')
+    mix = ("The interaction between '" + first + "' and '" + second + "' has a " + sign + " effect on the likelihood of "
+           "forming connections, with an estimate of " + estimate + ". "
+           "This indicates that different groups based on '" + first + "' and '" + second + "' interact "
+           + np.where(positive, 'more frequently', 'less frequently') + " in forming ties. "
+           "This effect is " + significance + ", with a Z-value of " + z_value + ".")
+
+    explanation = np.select(
+        [term == 'edges', term.str.contains('nodecov', regex=False), term.str.contains('nodefactor', regex=False),
+         term.str.contains('nodematch', regex=False), term.str.contains('mix', regex=False) & (parts.str.len() > 1)],
+        [edges, nodecov, nodefactor, nodematch, mix],
+        default=''
+    )
+    return html.Ul([html.Li(line) for line in ("'" + term + "': " + explanation)])
+
+# Goodness-of-fit of the model statistics as one table, converted from the R matrices in bulk
+def gof_frame(model_gof, term_names):
+    rows = len(term_names)
+    return pd.DataFrame({
+        'Statistic': term_names,
+        'obs': model_gof['obs.model'][:rows],
+        'min': model_gof['summary.model'][:rows, 1],
+        'mean': model_gof['summary.model'][:rows, 2],
+        'max': model_gof['summary.model'][:rows, 3],
+        'MC p-value': model_gof['pval.model'][:rows, 4],
+    }).round(2)
 
 # Function to generate explanations for each GOF measure
-def generate_gof_explanations(gof_data, term_names):
-    explanations = []
-    for i, term in enumerate(term_names):
-        obs = round(gof_data['obs.model'][i], 2)
-        mean = round(gof_data['summary.model'][i, 2], 2)
-        min_val = round(gof_data['summary.model'][i, 1], 2)
-        max_val = round(gof_data['summary.model'][i, 3], 2)
-        mc_p_value = round(gof_data['pval.model'][i, 4], 2)
-
-         # Skip terms where observed values are zero
-        if obs == 0:
-            continue
-
-        explanation = f"For the term '{term}', the observed value is {obs}, with an expected simulation mean of {mean} and a range of {min_val} to {max_val}. "
-        # Adjust explanation based on the Monte Carlo p-value
-        if mc_p_value >= 0.05:
-            explanation += f"This suggests the model fits the observed data well, as the Monte Carlo p-value of {mc_p_value} indicates a statistically insignificant difference."
-        else:
-            explanation += f"This suggests a potential model fit issue, as the Monte Carlo p-value of {mc_p_value} indicates a statistically significant difference."
-
-        # explanation += " Generally, p-values closer to 0.5 indicate a better fit, with values near 0 or 1 highlighting more significant discrepancies."
-
-        explanations.append(html.Li(explanation))
-
-    return html.Ul(explanations)
+def generate_gof_explanations(gof_df):
+    # Skip terms where observed values are zero
+    gof_df = gof_df[gof_df['obs'] != 0]
+    text = gof_df.astype(str)
+    explanation = ("For the term '" + text['Statistic'] + "', the observed value is " + text['obs']
+                   + ", with an expected simulation mean of " + text['mean'] + " and a range of " + text['min']
+                   + " to " + text['max'] + ". ")
+    # Adjust explanation based on the Monte Carlo p-value
+    explanation += np.where(
+        gof_df['MC p-value'] >= 0.05,
+        "This suggests the model fits the observed data well, as the Monte Carlo p-value of " + text['MC p-value']
+        + " indicates a statistically insignificant difference.",
+        "This suggests a potential model fit issue, as the Monte Carlo p-value of " + text['MC p-value']
+        + " indicates a statistically significant difference."
+    )
+    return html.Ul([html.Li(line) for line in explanation])
+
+# Table of a results DataFrame. Long tables are virtualized, so only the visible rows are rendered.
+def results_table(df):
+    virtualize = len(df) > VIRTUALIZE_ROWS
+    return dash_table.DataTable(
+        data=df.to_dict('records'),
+        columns=[{'name': column, 'id': column} for column in df.columns],
+        virtualization=virtualize,
+        fixed_rows={'headers': True} if virtualize else None,
+        page_action='none',
+        style_table={'overflowX': 'auto', 'maxHeight': '500px', 'overflowY': 'auto'},
+        style_cell={'padding': '10px', 'border': '1px solid #ddd', 'textAlign': 'left', 'minWidth': '100px'},
+        style_header={'backgroundColor': '#f2f2f2', 'fontWeight': 'bold'},
+        style_data={'backgroundColor': '#f9f9f9'},
+        style_data_conditional=[{'if': {'row_index': 'odd'}, 'backgroundColor': 'white'}]
+    )
 
-# Callback function to run the R script and update the output
-@dash.callback(Output('output-container', 'children'),
+# Build the model formula from the selected terms
+def build_formula(selected_terms, selected_indegree_terms, selected_outdegree_terms, selected_attrs, additional_terms):
+    formula_components = selected_terms + selected_indegree_terms + selected_outdegree_terms + selected_attrs
+
+    # Include additional terms from the textbox
+    if additional_terms:
+        additional_terms_list = [term.strip() for term in additional_terms.split(',')]
+        formula_components.extend(additional_terms_list)
+
+    # An empty formula string if no terms or attributes are selected
+    return ' + '.join(formula_components)
+
+# MCMC control settings of a fit, leaving out the ones kept at the ergm default
+def build_control(chains, samplesize, burnin, gof_nsim):
+    settings = {'chains': chains, 'samplesize': samplesize, 'burnin': burnin, 'gof_nsim': gof_nsim}
+    control = {name: int(value) for name, value in settings.items() if value is not None}
+    # A single chain is the default
+    if control.get('chains') == 1:
+        del control['chains']
+    return control
+
+# Hit/miss counters and size of the ERGM result cache
+def cache_stats_message():
+    stats = ERGM_CACHE.stats()
+    return (f"Result cache: {stats['hits']} hits, {stats['misses']} misses, "
+            f"{stats['entries']} stored fits ({stats['bytes'] / 1024 / 1024:.1f} MB)")
+
+# Callback function to show a cached fit at once, or queue the ERGM fit in an R worker process.
+# The job folder holding the fitted model becomes the session's current model, used by the simulation page.
+@dash.callback([Output('ergm-job', 'data'),
+                Output('ergm-job-poll', 'disabled'),
+                Output('ergm-job-status', 'children'),
+                Output('output-container', 'children', allow_duplicate=True),
+                Output('ergm-cache-stats', 'children'),
+                Output('current-model', 'data', allow_duplicate=True),
+                Output('ergm-job-log', 'children', allow_duplicate=True)],
               [Input('run-button', 'n_clicks')],
               [State('term-checklist', 'value'),
                State('indegree-dropdown', 'value'),
                State('outdegree-dropdown', 'value'),
                State('attr-checklist', 'value'),
-               State('additional-terms', 'value')])
-def run_ergm(n_clicks, selected_terms, selected_indegree_terms, selected_outdegree_terms, selected_attrs, additional_terms):
+               State('additional-terms', 'value'),
+               State('ergm-chains', 'value'),
+               State('ergm-samplesize', 'value'),
+               State('ergm-burnin', 'value'),
+               State('ergm-gof-nsim', 'value'),
+               State('ergm-warm-start', 'value')],
+              prevent_initial_call=True)
+def run_ergm(n_clicks, selected_terms, selected_indegree_terms, selected_outdegree_terms, selected_attrs, additional_terms,
+             chains=1, samplesize=None, burnin=None, gof_nsim=None, warm_start=None):
     if n_clicks == 0:
+        return (dash.no_update,) * 7
+    formula_str = build_formula(selected_terms, selected_indegree_terms, selected_outdegree_terms, selected_attrs, additional_terms)
+    print("Formula string submitted:", formula_str)
+
+    control = build_control(chains, samplesize, burnin, gof_nsim)
+
+    # Same terms, data and settings as an earlier fit: reuse its results and fitted model
+    key = cache_key(formula_str, control)
+    model_id, model_dir = ERGM_JOBS.new_job_dir()
+    cached = ERGM_CACHE.get(key, model_path=os.path.join(model_dir, MODEL_FILE))
+    if cached is not None:
+        # Kept with the model like a fitted job's result, for the Python simulation engine
+        write_json(os.path.join(model_dir, "result.json"), {'result': cached})
+        return None, True, '', render_results(cached), cache_stats_message(), model_id, ''
+    shutil.rmtree(model_dir, ignore_errors=True)
+
+    # Otherwise fit it, starting from the stored fit closest to this one if any
+    job_id = submit_fit(formula_str, control, warm_start=bool(warm_start))
+    return (job_id, False, job_status_message(ERGM_JOBS.status(job_id)), dash.no_update, cache_stats_message(),
+            dash.no_update, '')
+
+# Callback function to show maximum pseudo-likelihood estimates at once. Supported terms are fitted here
+# as a logistic regression on their change statistics, other formulas by the R worker; a full fit
+# started with Run ERGM replaces the preview when it is done.
+@dash.callback([Output('output-container', 'children', allow_duplicate=True),
+                Output('ergm-job-status', 'children', allow_duplicate=True),
+                Output('ergm-preview-job', 'data'),
+                Output('ergm-preview-poll', 'disabled')],
+              [Input('preview-button', 'n_clicks')],
+              [State('term-checklist', 'value'),
+               State('indegree-dropdown', 'value'),
+               State('outdegree-dropdown', 'value'),
+               State('attr-checklist', 'value'),
+               State('additional-terms', 'value')],
+              prevent_initial_call=True)
+def preview_ergm(n_clicks, selected_terms, selected_indegree_terms, selected_outdegree_terms, selected_attrs, additional_terms):
+    formula_str = build_formula(selected_terms, selected_indegree_terms, selected_outdegree_terms, selected_attrs, additional_terms)
+    try:
+        results = fit_mple(formula_str)
+    except UnsupportedTerm as e:
+        print("MPLE preview handed to R:", e)
+        job_id = ERGM_JOBS.submit('fit_mple', {'formula': formula_str})
+        return dash.no_update, preview_status_message(ERGM_JOBS.status(job_id)), job_id, False
+    return render_results(results), dash.no_update, None, True
+
+# Progress line of an MPLE preview computed by the R worker
+def preview_status_message(state):
+    if state['status'] == QUEUED:
+        return "MPLE preview queued for an R worker…"
+    if state['status'] == RUNNING:
+        return "Computing the MPLE preview in R…"
+    return ''
+
+# Callback function to poll an MPLE preview handed to the R worker and show it once done
+@dash.callback([Output('output-container', 'children', allow_duplicate=True),
+                Output('ergm-job-status', 'children', allow_duplicate=True),
+                Output('ergm-preview-poll', 'disabled', allow_duplicate=True)],
+              [Input('ergm-preview-poll', 'n_intervals')],
+              [State('ergm-preview-job', 'data')],
+              prevent_initial_call=True)
+def poll_preview(n_intervals, job_id):
+    state = ERGM_JOBS.status(job_id)
+    if state is None:
+        return render_error("The MPLE preview could not be found, please run it again."), '', True
+    if state['status'] == DONE:
+        return render_results(state['result']), '', True
+    if state['status'] == FAILED:
+        return render_error(state['error']), '', True
+    if state['status'] == CANCELLED:
+        return dash.no_update, '', True
+    return dash.no_update, preview_status_message(state), False
+
+# Progress line shown under the run button while a fit is queued or running
+def job_status_message(state, progress=None):
+    if state['status'] == QUEUED:
+        position = f" (position {state['position']} in the queue)" if 'position' in state else ''
+        return f"ERGM fit queued{position}…"
+    if state['status'] == RUNNING:
+        message = f"Fitting the ERGM model… {time.time() - state['started']:.0f} s elapsed"
+        # MCMC-MLE iterations as reported in the R console output
+        if progress and progress['iteration'] is not None:
+            message += f", iteration {progress['iteration']} of at most {progress['max_iterations']}"
+        if progress and progress['loglik_change'] is not None:
+            message += f", log-likelihood improvement {progress['loglik_change']:.4g}"
+        return message
+    return ''
+
+# Callback function to poll the queued fit and show its results once done
+@dash.callback([Output('output-container', 'children'),
+                Output('ergm-job-poll', 'disabled', allow_duplicate=True),
+                Output('ergm-job-status', 'children', allow_duplicate=True),
+                Output('ergm-cache-stats', 'children', allow_duplicate=True),
+                Output('current-model', 'data'),
+                Output('ergm-job-log', 'children')],
+              [Input('ergm-job-poll', 'n_intervals')],
+              [State('ergm-job', 'data')],
+              prevent_initial_call=True)
+def poll_ergm(n_intervals, job_id):
+    state = ERGM_JOBS.status(job_id)
+    if state is None:
+        return render_error("The ERGM job could not be found, please run the model again."), True, '', dash.no_update, dash.no_update, ''
+    if state['status'] == DONE:
+        return render_results(state['result']), True, '', cache_stats_message(), job_id, ''
+    if state['status'] == FAILED:
+        return render_error(state['error']), True, '', dash.no_update, dash.no_update, dash.no_update
+    if state['status'] == CANCELLED:
+        return dash.no_update, True, 'Fit cancelled.', dash.no_update, dash.no_update, dash.no_update
+    progress = ERGM_JOBS.progress(job_id)
+    return dash.no_update, False, job_status_message(state, progress), dash.no_update, dash.no_update, progress['log']
+
+# Callback function to cancel the queued or running fit; polling reports when it has stopped
+@dash.callback(Output('ergm-job-status', 'children', allow_duplicate=True),
+              [Input('cancel-button', 'n_clicks')],
+              [State('ergm-job', 'data')],
+              prevent_initial_call=True)
+def cancel_ergm(n_clicks, job_id):
+    state = ERGM_JOBS.status(job_id)
+    if state is None or state['status'] not in (QUEUED, RUNNING):
         return dash.no_update
+    ERGM_JOBS.cancel(job_id)
+    return "Cancelling the ERGM fit…"
+
+# Result tables longer than this are virtualized
+VIRTUALIZE_ROWS = 50
+
+# How a fit was started from an earlier one, by the warm_start value of its results
+WARM_START_NOTES = {
+    'fit': "The model of an earlier fit of the same terms was reused; only the goodness-of-fit was recomputed.",
+    'sample': "Started from the MCMC sample of an earlier fit that also had the terms removed since.",
+    'coefficients': "Started from the coefficients of an earlier fit sharing some of the terms.",
+}
+
+# How the coefficients were estimated, shown under the formula
+def estimation_note(results):
+    if results.get('estimate') == 'MPLE':
+        if results.get('dyad_independent'):
+            return ("Preview: every term is dyad-independent, so these maximum pseudo-likelihood estimates "
+                    "are also the maximum likelihood estimates.")
+        return ("Preview: maximum pseudo-likelihood estimates, whose standard errors are too small for dyad-dependent "
+                "terms. Run ERGM for the MCMC-MLE fit with goodness-of-fit, which replaces this preview when done.")
+    return WARM_START_NOTES.get(results.get('warm_start'), '')
+
+# Render the fitted model: formula, coefficients, explanations and goodness-of-fit
+def render_results(results):
+    # Extract relevant information from the results
+    model_formula = results['model_formula']
+    model_coefficients = np.array(results['model_coefficients'])
+    term_names = results['term_names']
+    model_gof = {name: np.array(values) for name, values in (results['model_gof'] or {}).items()}
+
+    # Convert model coefficients to a DataFrame
+    coef_df = pd.DataFrame(model_coefficients, columns=['Estimate', 'Std. Error', 'MCMC%', 'Z-value', 'Pr(>|z|)'])
+    coef_df.insert(0, 'Term', term_names)
+
+    # Goodness-of-fit of the model statistics and its explanations
+    gof_df = None
+    gof_explanations = None
+    if 'summary.model' in model_gof:
+        gof_df = gof_frame(model_gof, term_names)
+        gof_explanations = generate_gof_explanations(gof_df)
+
+    # Create the coefficient table
+    coef_table = results_table(coef_df)
+
+    # Generate explanations for each coefficient
+    coefficient_explanations = generate_coefficient_explanations(coef_df)
+
+    # Create tables for each GOF measure
+    gof_tables = []
+
+    #     # In-degree GOF table
+    # if 'summary.ideg' in model_gof:
+    #     gof_tables.append(html.Div([
+    #         html.H3('Goodness-of-fit for in-degree'),
+    #         html.Table([
+    #             html.Thead(html.Tr([html.Th(col) for col in ['', 'obs', 'min', 'mean', 'max', 'MC p-value']])),
+    #             html.Tbody([
+    #                 html.Tr([
+    #                     html.Td('idegree' + str(i)),
+    #                     html.Td(round(model_gof['summary.ideg'][i, 0], 2)),
+    #                     html.Td(round(model_gof['summary.ideg'][i, 1], 2)),
+    #                     html.Td(round(model_gof['summary.ideg'][i, 2], 2)),
+    #                     html.Td(round(model_gof['summary.ideg'][i, 3], 2)),
+    #                     html.Td(round(model_gof['summary.ideg'][i, 4], 2))
+    #                 ]) for i in range(model_gof['summary.ideg'].shape[0])
+    #             ])
+    #         ])
+    #     ]))
+
+    # # Out-degree GOF table
+    # if 'summary.odeg' in model_gof:
+    #     gof_tables.append(html.Div([
+    #         html.H3('Goodness-of-fit for out-degree'),
+    #         html.Table([
+    #             html.Thead(html.Tr([html.Th(col) for col in ['', 'obs', 'min', 'mean', 'max', 'MC p-value']])),
+    #             html.Tbody([
+    #                 html.Tr([
+    #                     html.Td('odegree' + str(i)),
+    #                     html.Td(round(model_gof['summary.odeg'][i, 0], 2)),
+    #                     html.Td(round(model_gof['summary.odeg'][i, 1], 2)),
+    #                     html.Td(round(model_gof['summary.odeg'][i, 2], 2)),
+    #                     html.Td(round(model_gof['summary.odeg'][i, 3], 2)),
+    #                     html.Td(round(model_gof['summary.odeg'][i, 4], 2))
+    #                 ]) for i in range(model_gof['summary.odeg'].shape[0])
+    #             ])
+    #         ])
+    #     ]))
+
+    # # Edgewise shared partner GOF table
+    # if 'summary.espart' in model_gof:
+    #     gof_tables.append(html.Div([
+    #         html.H3('Goodness-of-fit for edgewise shared partner'),
+    #         html.Table([
+    #             html.Thead(html.Tr([html.Th(col) for col in ['', 'obs', 'min', 'mean', 'max', 'MC p-value']])),
+    #             html.Tbody([
+    #                 html.Tr([
+    #                     html.Td('esp.OTP' + str(i)),
+    #                     html.Td(round(model_gof['summary.espart'][i, 0], 2)),
+    #                     html.Td(round(model_gof['summary.espart'][i, 1], 2)),
+    #                     html.Td(round(model_gof['summary.espart'][i, 2], 2)),
+    #                     html.Td(round(model_gof['summary.espart'][i, 3], 2)),
+    #                     html.Td(round(model_gof['summary.espart'][i, 4], 2))
+    #                 ]) for i in range(model_gof['summary.espart'].shape[0])
+    #             ])
+    #         ])
+    #     ]))
+
+    # # Minimum geodesic distance GOF table
+    # if 'summary.dist' in model_gof:
+    #     gof_tables.append(html.Div([
+    #         html.H3('Goodness-of-fit for minimum geodesic distance'),
+    #         html.Table([
+    #             html.Thead(html.Tr([html.Th(col) for col in ['', 'obs', 'min', 'mean', 'max', 'MC p-value']])),
+    #             html.Tbody([
+    #                 html.Tr([
+    #                     html.Td(str(i+1)),
+    #                     html.Td(round(model_gof['summary.dist'][i, 0], 2)),
+    #                     html.Td(round(model_gof['summary.dist'][i, 1], 2)),
+    #                     html.Td(round(model_gof['summary.dist'][i, 2], 2)),
+    #                     html.Td(round(model_gof['summary.dist'][i, 3], 2)),
+    #                     html.Td(round(model_gof['summary.dist'][i, 4], 2))
+    #                 ]) for i in range(model_gof['summary.dist'].shape[0]-1)
+    #             ] + [
+    #                 html.Tr([
+    #                     html.Td('Inf'),
+    #                     html.Td(round(model_gof['summary.dist'][-1, 0], 2)),
+    #                     html.Td(round(model_gof['summary.dist'][-1, 1], 2)),
+    #                     html.Td(round(model_gof['summary.dist'][-1, 2], 2)),
+    #                     html.Td(round(model_gof['summary.dist'][-1, 3], 2)),
+    #                     html.Td(round(model_gof['summary.dist'][-1, 4], 2))
+    #                 ])
+    #             ])
+    #         ])
+    #     ]))
+
+    # Model statistics GOF table
+    if gof_df is not None:
+        gof_tables.append(html.Div([
+            html.H3('Goodness-of-fit for model statistics'),
+            results_table(gof_df)
+        ]))
+
+    # Create the graph with term names on the x-axis
+    graph = dcc.Graph(
+        figure={
+            'data': [{'x': coef_df['Term'], 'y': coef_df['Estimate'], 'type': 'bar'}],
+            'layout': {
+                'title': 'Coefficient Estimates',
+                'xaxis': {
+                    'title': 'Model Statistic',
+                    'tickangle': -30,  # Rotate x-axis labels for better readability
+                    'automargin': True  # Automatically adjust margins to accommodate labels
+                },
+                'yaxis': {
+                    'title': 'Estimate',
+                    'automargin': True  # Automatically adjust margins to accommodate labels
+                },
+                'hovermode': 'closest',
+                'margin': {'b': 120}  # Increase bottom margin to make space for x-axis labels
+            }
+        },
+        style={'width': '100%', 'height': 'calc(500px + 20px * {})'.format(len(coef_df))},
+        responsive=True
+    )
+
+    # Return the results as HTML with CSS styles
+    return html.Div([
+        html.H2('ERGM Model Formula', style={'fontSize': '20px', 'marginBottom': '10px'}),
+        html.Pre(model_formula, style={'backgroundColor': '#f5f5f5', 'padding': '10px', 'borderRadius': '5px'}),
+        html.P(estimation_note(results), style={'fontSize': '12px', 'color': '#666'}),
+        html.H2('ERGM Model Coefficients', style={'fontSize': '20px', 'marginBottom': '10px', 'marginTop': '30px'}),
+        coef_table,
+        html.H3('Coefficient Explanations', style={'fontSize': '20px', 'marginBottom': '10px', 'marginTop': '30px'}),
+        coefficient_explanations,
+        graph,
+        html.Div(gof_tables),
+        html.H3('Goodness-of-Fit Explanations', style={'fontSize': '20px', 'marginBottom': '10px', 'marginTop': '30px'}),
+        gof_explanations
+    ])
+
+# Render an error reported by the R worker
+def render_error(error_message):
+    if "Illegal value of coef passed to simulate functions" in error_message:
+        return html.Div([
+            html.H3("Error: Illegal Coefficient Values", className="text-danger"),
+            html.P("The ERGM model encountered illegal coefficient values during the simulation process."),
+            html.P("Suggestions:"),
+            html.Ul([
+                html.Li("Check your network data to ensure that there are observations for all the combinations of the selected terms."),
+                html.Li("Simplify the model by removing or combining problematic terms that have non-varying statistics or are involved in linear combinations."),
+                html.Li("Increase the sample size or collect more diverse data to ensure sufficient variation in the observed statistics for all attribute combinations."),
+                html.Li("Consider using a different model specification or a simpler model with fewer terms to avoid nonidentifiability and improve model convergence.")
+            ]),
+            html.P("If the issue persists, please consult with a statistician or a subject matter expert for further assistance.")
+        ], className="alert alert-danger")
     else:
-        try:
-            # Construct the formula string
-            formula_components = selected_terms + selected_indegree_terms + selected_outdegree_terms + selected_attrs
-            
-            # Include additional terms from the textbox
-            if additional_terms:
-                additional_terms_list = [term.strip() for term in additional_terms.split(',')]
-                formula_components.extend(additional_terms_list)
-            
-            if formula_components:
-                formula_str = ' + '.join(formula_components)
-            else:
-                # Set an empty formula string if no terms or attributes are selected
-                formula_str = ''
-            
-            # Save the formula string to a file
-            with open("dump/formula.txt", "w") as file:
-                file.write(formula_str)
-            
-            print("Formula string saved to file:", formula_str)
-            
-            with robjects.conversion.localconverter(robjects.default_converter + pandas2ri.converter):
-                # Execute the R script
-                robjects.r.source("pages/ergm_script2.R")
-                
-                # Load the results from the RDS file
-                results = robjects.r.readRDS("dump/ergm_results.rds")
-
-                # Extract relevant information from the results
-                model_formula = str(results['model_formula'])
-                model_coefficients = np.array(results['model_coefficients'])
-                term_names = list(results['term_names'])
-                model_gof = results['model_gof']
-
-                # gof_explanations
-                if 'summary.model' in model_gof:
-                    gof_explanations = generate_gof_explanations(model_gof, term_names)
-
-                # Convert model coefficients to a DataFrame
-                coef_df = pd.DataFrame(model_coefficients, columns=['Estimate', 'Std. Error', 'MCMC%', 'Z-value', 'Pr(>|z|)'])
-                coef_df.insert(0, 'Term', term_names)
-
-                # Create the coefficient table
-                coef_table = html.Div([
-                    html.Table([
-                        html.Thead(html.Tr([html.Th(col, style={'padding': '10px', 'backgroundColor': '#f2f2f2', 'fontWeight': 'bold', 'border': '1px solid #ddd', 'textAlign': 'left'}) for col in coef_df.columns])),
-                        html.Tbody([
-                            html.Tr([
-                                html.Td(coef_df.iloc[i][col], style={'padding': '10px', 'border': '1px solid #ddd', 'textAlign': 'left'}) for col in coef_df.columns
-                            ], style={'backgroundColor': '#f9f9f9' if i % 2 == 0 else 'white'}) for i in range(len(coef_df))
-                        ])
-                    ], style={'width': '100%', 'borderCollapse': 'collapse', 'border': '1px solid #ddd'})
-                ], style={'overflowX': 'auto'})
-
-                # Generate explanations for each coefficient
-                coefficient_explanations = generate_coefficient_explanations(coef_df)
-
-                # Create tables for each GOF measure
-                gof_tables = []
-                
-            #     # In-degree GOF table
-            # if 'summary.ideg' in model_gof:
-            #     gof_tables.append(html.Div([
-            #         html.H3('Goodness-of-fit for in-degree'),
-            #         html.Table([
-            #             html.Thead(html.Tr([html.Th(col) for col in ['', 'obs', 'min', 'mean', 'max', 'MC p-value']])),
-            #             html.Tbody([
-            #                 html.Tr([
-            #                     html.Td('idegree' + str(i)),
-            #                     html.Td(round(model_gof['summary.ideg'][i, 0], 2)),
-            #                     html.Td(round(model_gof['summary.ideg'][i, 1], 2)),
-            #                     html.Td(round(model_gof['summary.ideg'][i, 2], 2)),
-            #                     html.Td(round(model_gof['summary.ideg'][i, 3], 2)),
-            #                     html.Td(round(model_gof['summary.ideg'][i, 4], 2))
-            #                 ]) for i in range(model_gof['summary.ideg'].shape[0])
-            #             ])
-            #         ])
-            #     ]))
-
-            # # Out-degree GOF table
-            # if 'summary.odeg' in model_gof:
-            #     gof_tables.append(html.Div([
-            #         html.H3('Goodness-of-fit for out-degree'),
-            #         html.Table([
-            #             html.Thead(html.Tr([html.Th(col) for col in ['', 'obs', 'min', 'mean', 'max', 'MC p-value']])),
-            #             html.Tbody([
-            #                 html.Tr([
-            #                     html.Td('odegree' + str(i)),
-            #                     html.Td(round(model_gof['summary.odeg'][i, 0], 2)),
-            #                     html.Td(round(model_gof['summary.odeg'][i, 1], 2)),
-            #                     html.Td(round(model_gof['summary.odeg'][i, 2], 2)),
-            #                     html.Td(round(model_gof['summary.odeg'][i, 3], 2)),
-            #                     html.Td(round(model_gof['summary.odeg'][i, 4], 2))
-            #                 ]) for i in range(model_gof['summary.odeg'].shape[0])
-            #             ])
-            #         ])
-            #     ]))
-
-            # # Edgewise shared partner GOF table
-            # if 'summary.espart' in model_gof:
-            #     gof_tables.append(html.Div([
-            #         html.H3('Goodness-of-fit for edgewise shared partner'),
-            #         html.Table([
-            #             html.Thead(html.Tr([html.Th(col) for col in ['', 'obs', 'min', 'mean', 'max', 'MC p-value']])),
-            #             html.Tbody([
-            #                 html.Tr([
-            #                     html.Td('esp.OTP' + str(i)),
-            #                     html.Td(round(model_gof['summary.espart'][i, 0], 2)),
-            #                     html.Td(round(model_gof['summary.espart'][i, 1], 2)),
-            #                     html.Td(round(model_gof['summary.espart'][i, 2], 2)),
-            #                     html.Td(round(model_gof['summary.espart'][i, 3], 2)),
-            #                     html.Td(round(model_gof['summary.espart'][i, 4], 2))
-            #                 ]) for i in range(model_gof['summary.espart'].shape[0])
-            #             ])
-            #         ])
-            #     ]))
-
-            # # Minimum geodesic distance GOF table
-            # if 'summary.dist' in model_gof:
-            #     gof_tables.append(html.Div([
-            #         html.H3('Goodness-of-fit for minimum geodesic distance'),
-            #         html.Table([
-            #             html.Thead(html.Tr([html.Th(col) for col in ['', 'obs', 'min', 'mean', 'max', 'MC p-value']])),
-            #             html.Tbody([
-            #                 html.Tr([
-            #                     html.Td(str(i+1)),
-            #                     html.Td(round(model_gof['summary.dist'][i, 0], 2)),
-            #                     html.Td(round(model_gof['summary.dist'][i, 1], 2)),
-            #                     html.Td(round(model_gof['summary.dist'][i, 2], 2)),
-            #                     html.Td(round(model_gof['summary.dist'][i, 3], 2)),
-            #                     html.Td(round(model_gof['summary.dist'][i, 4], 2))
-            #                 ]) for i in range(model_gof['summary.dist'].shape[0]-1)
-            #             ] + [
-            #                 html.Tr([
-            #                     html.Td('Inf'),
-            #                     html.Td(round(model_gof['summary.dist'][-1, 0], 2)),
-            #                     html.Td(round(model_gof['summary.dist'][-1, 1], 2)),
-            #                     html.Td(round(model_gof['summary.dist'][-1, 2], 2)),
-            #                     html.Td(round(model_gof['summary.dist'][-1, 3], 2)),
-            #                     html.Td(round(model_gof['summary.dist'][-1, 4], 2))
-            #                 ])
-            #             ])
-            #         ])
-            #     ]))
-
-            # Model statistics GOF table
-            if 'summary.model' in model_gof:
-                gof_tables.append(html.Div([
-                    html.H3('Goodness-of-fit for model statistics'),
-                    html.Table([
-                        html.Thead(html.Tr([html.Th(col) for col in ['Statistic', 'obs', 'min', 'mean', 'max', 'MC p-value']])),
-                        html.Tbody([
-                            html.Tr([
-                                html.Td(term),
-                                html.Td(round(model_gof['obs.model'][i], 2)),
-                                html.Td(round(model_gof['summary.model'][i, 1], 2)),
-                                html.Td(round(model_gof['summary.model'][i, 2], 2)),
-                                html.Td(round(model_gof['summary.model'][i, 3], 2)),
-                                html.Td(round(model_gof['pval.model'][i, 4], 2))
-                            ]) for i, term in enumerate(term_names)
-                        ])
-                    ])
-                ]))
-
-                # Create the graph with term names on the x-axis
-                graph = dcc.Graph(
-                    figure={
-                        'data': [{'x': coef_df['Term'], 'y': coef_df['Estimate'], 'type': 'bar'}],
-                        'layout': {
-                            'title': 'Coefficient Estimates',
-                            'xaxis': {
-                                'title': 'Model Statistic',
-                                'tickangle': -30,  # Rotate x-axis labels for better readability
-                                'automargin': True  # Automatically adjust margins to accommodate labels
-                            },
-                            'yaxis': {
-                                'title': 'Estimate',
-                                'automargin': True  # Automatically adjust margins to accommodate labels
-                            },
-                            'hovermode': 'closest',
-                            'margin': {'b': 120}  # Increase bottom margin to make space for x-axis labels
-                        }
-                    },
-                    style={'width': '100%', 'height': 'calc(500px + 20px * {})'.format(len(coef_df))},
-                    responsive=True
-                )
-
-                # Return the results as HTML with CSS styles
-                return html.Div([
-                    html.H2('ERGM Model Formula', style={'fontSize': '20px', 'marginBottom': '10px'}),
-                    html.Pre(model_formula, style={'backgroundColor': '#f5f5f5', 'padding': '10px', 'borderRadius': '5px'}),
-                    html.H2('ERGM Model Coefficients', style={'fontSize': '20px', 'marginBottom': '10px', 'marginTop': '30px'}),
-                    coef_table,
-                    html.H3('Coefficient Explanations', style={'fontSize': '20px', 'marginBottom': '10px', 'marginTop': '30px'}),
-                    coefficient_explanations,
-                    graph,
-                    html.Div(gof_tables),
-                    html.H3('Goodness-of-Fit Explanations', style={'fontSize': '20px', 'marginBottom': '10px', 'marginTop': '30px'}),
-                    gof_explanations
-                ])
-        except robjects.rinterface.embedded.RRuntimeError as e:
-            error_message = str(e)
-            if "Illegal value of coef passed to simulate functions" in error_message:
-                return html.Div([
-                    html.H3("Error: Illegal Coefficient Values", className="text-danger"),
-                    html.P("The ERGM model encountered illegal coefficient values during the simulation process."),
-                    html.P("Suggestions:"),
-                    html.Ul([
-                        html.Li("Check your network data to ensure that there are observations for all the combinations of the selected terms."),
-                        html.Li("Simplify the model by removing or combining problematic terms that have non-varying statistics or are involved in linear combinations."),
-                        html.Li("Increase the sample size or collect more diverse data to ensure sufficient variation in the observed statistics for all attribute combinations."),
-                        html.Li("Consider using a different model specification or a simpler model with fewer terms to avoid nonidentifiability and improve model convergence.")
-                    ]),
-                    html.P("If the issue persists, please consult with a statistician or a subject matter expert for further assistance.")
-                ], className="alert alert-danger")
-            else:
-                # Handle other types of errors
-                return html.Div([
-                    html.H3("Error Occurred", className="text-danger"),
-                    html.P(f"An error occurred while running the ERGM model: {error_message}"),
-                    html.P("Please check your model specification and input data.")
-                ], className="alert alert-danger")
\ No newline at end of file
+        # Handle other types of errors
+        return html.Div([
+            html.H3("Error Occurred", className="text-danger"),
+            html.P(f"An error occurred while running the ERGM model: {error_message}"),
+            html.P("Please check your model specification and input data.")
+        ], className="alert alert-danger")
\ No newline at end of file
@@ -0,0 +1,231 @@
+import hashlib
+import json
+import os
+import shutil
+import threading
+
+from pages.network_io import file_digest
+from pages.ergm_jobs import ERGM_JOBS, read_json, write_json
+
+# One folder per cached fit, named after its key, holding result.json and the fitted model
+CACHE_DIR = "dump/ergm_cache"
+# Least recently used fits are removed once the cache grows past this size
+MAX_CACHE_BYTES = int(os.environ.get("STATNET33_ERGM_CACHE_MB", "512")) * 1024 * 1024
+
+EDGES_PATH = "pages/data/network_edges.csv"
+ATTRIBUTES_PATH = "pages/data/network_data.csv"
+SCRIPT_PATH = "pages/ergm_functions.R"
+# File name of the fitted model the simulation page reads
+MODEL_FILE = "ergm_results.rds"
+# MCMC controls that change the fitted model; the others only change the goodness-of-fit or parallelism
+FIT_SETTINGS = ('samplesize', 'burnin')
+
+
+def split_terms(formula):
+    """
+    Split a formula's right-hand side into its terms, in formula order and without whitespace
+    :param formula: e.g. 'edges + nodematch("gender") + mutual'
+    :return: List of terms
+    """
+    terms = []
+    depth = 0
+    term = ''
+    for char in formula:
+        if char == '+' and depth == 0:
+            terms.append(term)
+            term = ''
+            continue
+        depth += char in '(['
+        depth -= char in ')]'
+        term += char
+    terms.append(term)
+    return [term for term in (''.join(term.split()) for term in terms) if term]
+
+
+def formula_terms(formula):
+    """Terms of a formula ignoring whitespace, order and repeats, as a sorted list"""
+    return sorted(set(split_terms(formula)))
+
+
+def cache_fields(formula, control=None):
+    """
+    What a fit depends on: the normalised terms, the data files, the fitting script and the MCMC controls
+    """
+    return {
+        'terms': formula_terms(formula),
+        'edges': file_digest(EDGES_PATH),
+        'attributes': file_digest(ATTRIBUTES_PATH),
+        'script': file_digest(SCRIPT_PATH),
+        'control': control or {},
+    }
+
+
+def cache_key(formula, control=None):
+    """Content address of a fit, the hash of its cache_fields"""
+    return hashlib.sha1(json.dumps(cache_fields(formula, control), sort_keys=True).encode('utf-8')).hexdigest()
+
+
+def fit_settings(control):
+    return {name: value for name, value in (control or {}).items() if name in FIT_SETTINGS}
+
+
+def _folder_size(path):
+    return sum(entry.stat().st_size for entry in os.scandir(path) if entry.is_file())
+
+
+class ResultCache:
+    """
+    Persistent cache of ERGM results, addressed by cache_key, with LRU eviction
+    and hit/miss counters that are kept across restarts
+    """
+
+    def __init__(self, cache_dir=CACHE_DIR, max_bytes=MAX_CACHE_BYTES):
+        self.cache_dir = cache_dir
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+
+    def _entry(self, key):
+        return os.path.join(self.cache_dir, key)
+
+    def _count(self, counter):
+        path = os.path.join(self.cache_dir, "stats.json")
+        with self._lock:
+            stats = self._read_stats()
+            stats[counter] += 1
+            os.makedirs(self.cache_dir, exist_ok=True)
+            write_json(path, stats)
+
+    def _read_stats(self):
+        try:
+            with open(os.path.join(self.cache_dir, "stats.json")) as file:
+                return json.load(file)
+        except (OSError, ValueError):
+            return {'hits': 0, 'misses': 0}
+
+    def get(self, key, model_path=None):
+        """
+        Look up a fit and count the hit or miss
+        :param key: Key from cache_key
+        :param model_path: Where to copy the cached fitted model, if anywhere
+        :return: The stored result, or None
+        """
+        result_path = os.path.join(self._entry(key), "result.json")
+        try:
+            with open(result_path) as file:
+                result = json.load(file)
+            if model_path is not None:
+                shutil.copyfile(os.path.join(self._entry(key), MODEL_FILE), model_path)
+        except (OSError, ValueError):
+            self._count('misses')
+            return None
+        # The modification time of result.json records the last use
+        os.utime(result_path)
+        self._count('hits')
+        return result
+
+    def put(self, key, result, model_path=None, fields=None):
+        """
+        Store a fit, then evict the least recently used fits beyond the size limit
+        :param model_path: Fitted model file to keep alongside the result
+        :param fields: The cache_fields of the fit, which find_warm_start compares new fits against
+        """
+        entry = self._entry(key)
+        tmp_entry = f"{entry}.{threading.get_ident()}.tmp"
+        shutil.rmtree(tmp_entry, ignore_errors=True)
+        os.makedirs(tmp_entry)
+        if model_path is not None and os.path.exists(model_path):
+            shutil.copyfile(model_path, os.path.join(tmp_entry, MODEL_FILE))
+        if fields is not None:
+            write_json(os.path.join(tmp_entry, "fields.json"), fields)
+        write_json(os.path.join(tmp_entry, "result.json"), result)
+        with self._lock:
+            shutil.rmtree(entry, ignore_errors=True)
+            os.replace(tmp_entry, entry)
+            self._evict()
+
+    def find_warm_start(self, formula, control=None):
+        """
+        The stored fit a new fit of the same data is best started from: one with the same terms and
+        fit settings, whose model only needs a new goodness-of-fit, or else the one sharing the most
+        terms, the most recently used first
+        :return: Dict with the entry 'key', its 'terms' and whether it is a 'gof_only' refit, or None
+        """
+        fields = cache_fields(formula, control)
+        best = None
+        with self._lock:
+            entries = self._entries() if os.path.isdir(self.cache_dir) else []
+        for last_use, _, path in sorted(entries, reverse=True):
+            stored = read_json(os.path.join(path, "fields.json"))
+            if stored is None or any(stored[name] != fields[name] for name in ('edges', 'attributes', 'script')):
+                continue
+            if stored['terms'] == fields['terms']:
+                if fit_settings(stored['control']) == fit_settings(fields['control']):
+                    return {'key': os.path.basename(path), 'terms': stored['terms'], 'gof_only': True}
+                shared = len(fields['terms'])
+            else:
+                shared = len(set(stored['terms']) & set(fields['terms']))
+            if shared and (best is None or shared > best[0]):
+                best = (shared, {'key': os.path.basename(path), 'terms': stored['terms'], 'gof_only': False})
+        return best[1] if best else None
+
+    def copy_model(self, key, model_path):
+        """
+        Copy the fitted model of a stored fit, which counts as a use but not as a hit
+        :return: Whether the fit was still stored
+        """
+        try:
+            shutil.copyfile(os.path.join(self._entry(key), MODEL_FILE), model_path)
+            os.utime(os.path.join(self._entry(key), "result.json"))
+        except OSError:
+            return False
+        return True
+
+    def _entries(self):
+        """(last use, size, path) of every stored fit"""
+        entries = []
+        for item in os.scandir(self.cache_dir):
+            result_path = os.path.join(item.path, "result.json")
+            if item.is_dir() and not item.name.endswith(".tmp") and os.path.exists(result_path):
+                entries.append((os.path.getmtime(result_path), _folder_size(item.path), item.path))
+        return entries
+
+    def _evict(self):
+        entries = sorted(self._entries())
+        total = sum(size for _, size, _ in entries)
+        # Always keep the newest fit, even when it is larger than the limit on its own
+        for _, size, path in entries[:-1]:
+            if total <= self.max_bytes:
+                break
+            shutil.rmtree(path, ignore_errors=True)
+            total -= size
+
+    def stats(self):
+        """Hit and miss counters with the number and total size of stored fits"""
+        with self._lock:
+            stats = self._read_stats()
+            entries = self._entries() if os.path.isdir(self.cache_dir) else []
+        stats['entries'] = len(entries)
+        stats['bytes'] = sum(size for _, size, _ in entries)
+        return stats
+
+
+ERGM_CACHE = ResultCache()
+
+
+def submit_fit(formula, control=None, warm_start=True):
+    """
+    Queue an ERGM fit whose result is stored in ERGM_CACHE when it succeeds
+    :param formula: Right-hand side of the model formula
+    :param control: MCMC settings, as for the fit_ergm task
+    :param warm_start: Whether to start from the closest stored fit of the same data
+    :return: The job id
+    """
+    control = control or {}
+    key = cache_key(formula, control)
+    fields = cache_fields(formula, control)
+    start = ERGM_CACHE.find_warm_start(formula, control) if warm_start else None
+    return ERGM_JOBS.submit(
+        'fit_ergm', {'formula': formula, 'control': control, 'warm_start': start},
+        on_done=lambda result, job_dir: ERGM_CACHE.put(key, result, model_path=os.path.join(job_dir, MODEL_FILE),
+                                                       fields=fields)
+    )
@@ -0,0 +1,144 @@
+import math
+
+import dash
+from dash import dash_table, dcc, html
+from dash.dependencies import Input, Output, State
+
+from pages.ergm_cache import ERGM_CACHE, cache_key, split_terms, submit_fit
+from pages.ergm_jobs import CANCELLED, DONE, ERGM_JOBS, FAILED
+
+dash.register_page(
+    __name__,
+    path='/ergm-compare',
+    name='Model Comparison',
+    title='StatNet33 - Model Comparison',
+    order=5
+)
+
+# Columns shown before the coefficients of the compared models
+FIXED_COLUMNS = ['Formula', 'Status', 'AIC', 'BIC']
+
+
+def parse_formulas(text):
+    """One formula per line in the term syntax of the ERGM page, blank lines and repeats skipped"""
+    formulas = []
+    for line in (text or '').splitlines():
+        formula = ' + '.join(split_terms(line))
+        if formula and formula not in formulas:
+            formulas.append(formula)
+    return formulas
+
+
+def _number(value):
+    # NaN (e.g. an AIC R could not compute) is not valid JSON for the table
+    return None if value is None or math.isnan(value) else round(value, 4)
+
+
+def comparison_row(formula, status, result=None, error=None):
+    """
+    Table row of one model: its information criteria and one column per coefficient estimate
+    """
+    row = {'Formula': formula, 'Status': error or status, 'AIC': None, 'BIC': None}
+    if result is not None:
+        row['AIC'] = _number(result.get('aic'))
+        row['BIC'] = _number(result.get('bic'))
+        for term, coefficients in zip(result['term_names'], result['model_coefficients']):
+            row[term] = _number(coefficients[0])
+    return row
+
+
+def table_columns(rows):
+    terms = []
+    for row in rows:
+        terms.extend(name for name in row if name not in FIXED_COLUMNS and name not in terms)
+    columns = [{'name': name, 'id': name, 'type': 'numeric' if name in ('AIC', 'BIC') else 'text'}
+               for name in FIXED_COLUMNS]
+    return columns + [{'name': term, 'id': term, 'type': 'numeric'} for term in terms]
+
+
+def layout():
+    return html.Div([
+        html.Div(style={'display': 'flex', 'justifyContent': 'center'}, children=[
+            html.H1('Model Comparison')
+        ]),
+        html.P('Enter one model per line, using the terms of the ERGM page, e.g. edges + mutual + nodematch("gender"). '
+               'Models are fitted in parallel by the R workers; fits already in the result cache are reused.'),
+        dcc.Textarea(id='compare-formulas', placeholder='edges\nedges + mutual\nedges + mutual + ttriple',
+                     style={'width': '100%', 'height': '150px'}),
+        html.Button('Compare Models', id='compare-button', n_clicks=0, style={'marginTop': '10px'}),
+        html.Div(id='compare-status', style={'marginTop': '10px'}),
+        dash_table.DataTable(
+            id='compare-table',
+            sort_action='native',
+            sort_by=[{'column_id': 'AIC', 'direction': 'asc'}],
+            style_table={'overflowX': 'auto', 'marginTop': '10px'},
+            style_cell={'textAlign': 'left', 'padding': '5px'},
+            style_header={'backgroundColor': '#f2f2f2', 'fontWeight': 'bold'}
+        ),
+        # One entry per model: its formula, job id (None when cached) and table row once known
+        dcc.Store(id='compare-batch'),
+        dcc.Interval(id='compare-poll', interval=2000, disabled=True),
+    ])
+
+
+def batch_message(batch):
+    finished = sum(item['row'] is not None for item in batch)
+    if finished == len(batch):
+        return f"{len(batch)} models compared."
+    return f"{finished} of {len(batch)} models fitted…"
+
+
+# Callback function to queue every model of the batch, taking the ones in the result cache straight from it
+@dash.callback([Output('compare-batch', 'data'),
+                Output('compare-poll', 'disabled'),
+                Output('compare-status', 'children'),
+                Output('compare-table', 'data'),
+                Output('compare-table', 'columns')],
+               [Input('compare-button', 'n_clicks')],
+               [State('compare-formulas', 'value')],
+               prevent_initial_call=True)
+def run_comparison(n_clicks, text):
+    formulas = parse_formulas(text)
+    if not formulas:
+        return None, True, "Enter at least one model.", [], []
+    batch = []
+    for formula in formulas:
+        cached = ERGM_CACHE.get(cache_key(formula))
+        if cached is not None:
+            batch.append({'formula': formula, 'job_id': None, 'row': comparison_row(formula, 'cached', cached)})
+        else:
+            batch.append({'formula': formula, 'job_id': submit_fit(formula), 'row': None})
+    return poll_result(batch)
+
+
+def poll_result(batch):
+    rows = [item['row'] or comparison_row(item['formula'], 'fitting…') for item in batch]
+    done = all(item['row'] is not None for item in batch)
+    return batch, done, batch_message(batch), rows, table_columns(rows)
+
+
+# Callback function to collect finished fits and refresh the table
+@dash.callback([Output('compare-batch', 'data', allow_duplicate=True),
+                Output('compare-poll', 'disabled', allow_duplicate=True),
+                Output('compare-status', 'children', allow_duplicate=True),
+                Output('compare-table', 'data', allow_duplicate=True),
+                Output('compare-table', 'columns', allow_duplicate=True)],
+               [Input('compare-poll', 'n_intervals')],
+               [State('compare-batch', 'data')],
+               prevent_initial_call=True)
+def poll_comparison(n_intervals, batch):
+    if not batch:
+        return (dash.no_update,) * 5
+    for item in batch:
+        if item['row'] is not None:
+            continue
+        state = ERGM_JOBS.status(item['job_id'])
+        if state is None:
+            item['row'] = comparison_row(item['formula'], None, error="job not found")
+        elif state['status'] == DONE:
+            item['row'] = comparison_row(item['formula'], 'fitted', state['result'])
+        elif state['status'] == FAILED:
+            item['row'] = comparison_row(item['formula'], None, error=f"failed: {state['error']}")
+        elif state['status'] == CANCELLED:
+            item['row'] = comparison_row(item['formula'], None, error="cancelled")
+    return poll_result(batch)
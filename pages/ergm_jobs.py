@@ -0,0 +1,235 @@
+import hashlib
+import json
+import logging
+import os
+import re
+import shutil
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+
+from pages.r_pool import R_POOL, RWorkerError
+
+logger = logging.getLogger(__name__)
+
+# Every job gets a folder here holding its request, state, R console log and result
+JOBS_DIR = "dump/jobs"
+# Number of fits that may run at the same time, each in a warm R worker of pages/r_pool.py
+MAX_CONCURRENT_FITS = int(os.environ.get("STATNET33_ERGM_WORKERS", "2"))
+# Job folders older than this are removed when new jobs are created
+JOB_RETENTION_SECONDS = int(os.environ.get("STATNET33_JOB_RETENTION_HOURS", "24")) * 3600
+# How often a running job checks whether it was cancelled
+CANCEL_POLL_SECONDS = 1
+# Size of the end of the R console log read for progress
+LOG_TAIL_BYTES = 64 * 1024
+LOG_TAIL_LINES = 15
+
+# Progress lines printed by ergm during MCMC-MLE
+ITERATION_PATTERN = re.compile(r"Iteration (\d+) of at most (\d+)")
+LOGLIK_PATTERN = re.compile(r"log-likelihood improvement is (-?[\d.]+(?:e[-+]?\d+)?)")
+
+QUEUED = "queued"
+RUNNING = "running"
+DONE = "done"
+FAILED = "failed"
+CANCELLED = "cancelled"
+
+
+def job_key(task, args):
+    """Key under which identical requests are deduplicated"""
+    return hashlib.sha1(json.dumps([task, args], sort_keys=True).encode('utf-8')).hexdigest()
+
+
+def write_json(path, data):
+    # Write next to the target and rename, so readers never see a partial file
+    tmp_path = path + '.tmp'
+    with open(tmp_path, 'w') as file:
+        json.dump(data, file)
+    os.replace(tmp_path, path)
+
+
+def read_json(path):
+    try:
+        with open(path) as file:
+            return json.load(file)
+    except (OSError, ValueError):
+        return None
+
+
+class JobQueue:
+    """
+    Runs R tasks in the warm R worker pool, at most max_workers at a time.
+    Submitting returns a job id straight away; the state of each job is written to its
+    folder, so the page can poll it from any web worker process.
+    """
+
+    def __init__(self, max_workers=MAX_CONCURRENT_FITS, jobs_dir=JOBS_DIR):
+        self.jobs_dir = jobs_dir
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="r-job")
+        self._lock = threading.Lock()
+        # Key -> id of the queued or running job for that request
+        self._active = {}
+        # Ids of queued jobs, oldest first
+        self._queued = []
+
+    def job_dir(self, job_id):
+        return os.path.join(self.jobs_dir, job_id)
+
+    def new_job_dir(self):
+        """
+        Create an empty job folder, also used for work done outside the queue such as simulations
+        :return: (job id, folder path)
+        """
+        self.prune()
+        job_id = uuid.uuid4().hex
+        os.makedirs(self.job_dir(job_id))
+        return job_id, self.job_dir(job_id)
+
+    def find_job_dir(self, job_id):
+        """Folder of an existing job, or None"""
+        # Job ids come back from the browser, only look up ids this queue could have made
+        if not isinstance(job_id, str) or not re.fullmatch(r"[0-9a-f]{32}", job_id):
+            return None
+        path = self.job_dir(job_id)
+        return path if os.path.isdir(path) else None
+
+    def prune(self):
+        """Remove finished job folders past the retention time"""
+        if not os.path.isdir(self.jobs_dir):
+            return
+        cutoff = time.time() - JOB_RETENTION_SECONDS
+        with self._lock:
+            active = set(self._active.values())
+        for item in os.scandir(self.jobs_dir):
+            if item.is_dir() and item.name not in active and item.stat().st_mtime < cutoff:
+                shutil.rmtree(item.path, ignore_errors=True)
+
+    def _update(self, job_id, **changes):
+        path = os.path.join(self.job_dir(job_id), "job.json")
+        state = read_json(path) or {}
+        state.update(changes)
+        write_json(path, state)
+
+    def submit(self, task, args, on_done=None):
+        """
+        Queue a task, or join the queued or running job of an identical request
+        :param task: Name of a task in pages.r_worker.TASKS
+        :param args: JSON-serialisable keyword arguments of the task
+        :param on_done: Function called with the result and the job folder when the job succeeds,
+                        in the runner thread
+        :return: The job id
+        """
+        key = job_key(task, args)
+        self.prune()
+        with self._lock:
+            if key in self._active:
+                return self._active[key]
+            job_id = uuid.uuid4().hex
+            os.makedirs(self.job_dir(job_id))
+            write_json(os.path.join(self.job_dir(job_id), "request.json"), {'task': task, 'args': args})
+            self._update(job_id, status=QUEUED, submitted=time.time())
+            self._active[key] = job_id
+            self._queued.append(job_id)
+        self._executor.submit(self._run, job_id, key, task, args, on_done)
+        return job_id
+
+    def _cancel_requested(self, job_id):
+        return os.path.exists(os.path.join(self.job_dir(job_id), "cancel"))
+
+    def cancel(self, job_id):
+        """
+        Stop a job: a queued job will not start and a running job has its R worker killed.
+        The request is left as a file in the job folder, so it works from any web worker process.
+        """
+        job_dir = self.find_job_dir(job_id)
+        if job_dir is None:
+            return
+        open(os.path.join(job_dir, "cancel"), "w").close()
+        with self._lock:
+            # New identical requests should start afresh rather than join this job
+            for key in [key for key, active_id in self._active.items() if active_id == job_id]:
+                del self._active[key]
+
+    def _watch_cancel(self, job_id, finished):
+        while not finished.wait(CANCEL_POLL_SECONDS):
+            if self._cancel_requested(job_id):
+                R_POOL.cancel(self.job_dir(job_id))
+                return
+
+    def _run(self, job_id, key, task, args, on_done):
+        with self._lock:
+            self._queued.remove(job_id)
+        job_dir = self.job_dir(job_id)
+        finished = threading.Event()
+        try:
+            if self._cancel_requested(job_id):
+                self._update(job_id, status=CANCELLED, finished=time.time())
+                return
+            self._update(job_id, status=RUNNING, started=time.time())
+            threading.Thread(target=self._watch_cancel, args=(job_id, finished), daemon=True).start()
+            result = R_POOL.call(task, args, job_dir, log_path=os.path.join(job_dir, "log.txt"))
+            write_json(os.path.join(job_dir, "result.json"), {'result': result})
+            if on_done is not None:
+                on_done(result, job_dir)
+            self._update(job_id, status=DONE, finished=time.time())
+        except Exception as e:
+            # Anything left uncaught would leave the job running forever for the polling page
+            if self._cancel_requested(job_id):
+                self._update(job_id, status=CANCELLED, finished=time.time())
+            else:
+                if not isinstance(e, (RWorkerError, OSError)):
+                    logger.exception("Job %s (%s) failed", job_id, task)
+                self._update(job_id, status=FAILED, finished=time.time(), error=str(e) or type(e).__name__)
+        finally:
+            finished.set()
+            with self._lock:
+                if self._active.get(key) == job_id:
+                    del self._active[key]
+
+    def progress(self, job_id):
+        """
+        MCMC-MLE progress of a running fit, read from the end of its R console log
+        :return: Dict with 'iteration' and 'max_iterations' (None before the first iteration),
+                 'loglik_change' (None until reported) and 'log' holding the last lines
+        """
+        progress = {'iteration': None, 'max_iterations': None, 'loglik_change': None, 'log': ''}
+        if self.find_job_dir(job_id) is None:
+            return progress
+        try:
+            with open(os.path.join(self.job_dir(job_id), "log.txt"), "rb") as file:
+                file.seek(max(0, os.fstat(file.fileno()).st_size - LOG_TAIL_BYTES))
+                text = file.read().decode("utf-8", errors="replace")
+        except OSError:
+            return progress
+        iterations = ITERATION_PATTERN.findall(text)
+        if iterations:
+            progress['iteration'], progress['max_iterations'] = map(int, iterations[-1])
+        changes = LOGLIK_PATTERN.findall(text)
+        if changes:
+            progress['loglik_change'] = float(changes[-1].rstrip('.'))
+        progress['log'] = "\n".join(text.splitlines()[-LOG_TAIL_LINES:])
+        return progress
+
+    def status(self, job_id):
+        """
+        Current state of a job
+        :return: Dict with 'status' and the times so far; 'position' in the queue when it
+                 is known to this process, 'error' when it failed and 'result' when it is done.
+                 None for an unknown job id.
+        """
+        if self.find_job_dir(job_id) is None:
+            return None
+        state = read_json(os.path.join(self.job_dir(job_id), "job.json"))
+        if state is None:
+            return None
+        if state['status'] == QUEUED:
+            with self._lock:
+                if job_id in self._queued:
+                    state['position'] = self._queued.index(job_id) + 1
+        elif state['status'] == DONE:
+            state['result'] = read_json(os.path.join(self.job_dir(job_id), "result.json"))['result']
+        return state
+
+
+ERGM_JOBS = JobQueue()
@@ -0,0 +1,382 @@
+# Description: Python simulation of networks from a fitted directed ERGM, an alternative to simulate() in R.
+# A Metropolis-Hastings sampler with ergm's tie/no-tie proposal toggles one dyad at a time on adjacency
+# bitsets, updating the change statistics of the proposed toggle incrementally. Independent chains run in
+# a process pool, either to the end or streaming each draw's statistics to the simulation's job folder
+# (see pages/sim_stream.py). Run `python -m pages.ergm_sim --benchmark JOB_DIR` to compare it with R.
+
+import argparse
+import math
+import os
+import random
+import re
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+from pages.ergm_jobs import read_json
+from pages.mple import Network, UnsupportedTerm
+from pages.sim_stream import append_draw, error_path, read_stream, stream_path, write_meta
+
+# Same MCMC defaults as ergm's control.simulate.ergm
+MCMC_INTERVAL = 1024
+MCMC_BURNIN = MCMC_INTERVAL * 16
+# Number of chains the draws are spread over
+SIMULATION_CHAINS = int(os.environ.get("STATNET33_SIM_CHAINS", str(min(4, os.cpu_count() or 1))))
+
+DEGREE_TERM = re.compile(r'([io])degree(\d+)')
+
+_executor = None
+_executor_lock = threading.Lock()
+
+
+def load_model(job_dir):
+    """
+    Coefficients of the fit in a job folder, from the result.json written next to its ergm_results.rds
+    :return: (term names, coefficients)
+    """
+    saved = read_json(os.path.join(job_dir, "result.json"))
+    if saved is None:
+        raise UnsupportedTerm("The coefficients of this model are not available to the Python sampler")
+    result = saved['result']
+    return result['term_names'], [row[0] for row in result['model_coefficients']]
+
+
+def term_data(term_names, network):
+    """
+    What the change statistics of each term need, in plain Python types so chains can be sent to other processes
+    :raises UnsupportedTerm: For terms the sampler does not implement
+    """
+    attributes = sorted(network.attrs.columns[1:], key=len, reverse=True)
+    terms = []
+    for name in term_names:
+        degree = DEGREE_TERM.fullmatch(name)
+        if name in ('edges', 'mutual', 'triangle', 'ttriple', 'ctriple', 'isolates'):
+            terms.append((name, None))
+        elif degree:
+            terms.append((name[0] + 'degree', int(degree.group(2))))
+        elif name.startswith('nodecov.') and name[8:] in attributes:
+            terms.append(('nodecov', network.attribute(name[8:]).astype(float).tolist()))
+        elif name.startswith('nodematch.') and name[10:] in attributes:
+            values = network.attribute(name[10:])
+            terms.append(('nodematch', np.unique(values, return_inverse=True)[1].tolist()))
+        elif name.startswith('nodefactor.'):
+            # nodefactor.<attribute>.<level>; attribute names may themselves contain dots
+            attribute = next((a for a in attributes if name.startswith(f'nodefactor.{a}.')), None)
+            if attribute is None:
+                raise UnsupportedTerm(name)
+            level = name[len(f'nodefactor.{attribute}.'):]
+            terms.append(('nodefactor', (network.attribute(attribute).astype(str) == level).astype(int).tolist()))
+        else:
+            raise UnsupportedTerm(f"The Python sampler does not support the term '{name}'")
+    return terms
+
+
+def change_functions(terms, out_bits, in_bits, out_degree, in_degree):
+    """
+    Change statistic of each term for adding the tie i -> j, given the rest of the network.
+    tie says whether i -> j is currently present; it is left out of the counts.
+    """
+    functions = []
+    for kind, data in terms:
+        if kind == 'edges':
+            f = lambda i, j, tie: 1
+        elif kind == 'mutual':
+            f = lambda i, j, tie: (out_bits[j] >> i) & 1
+        elif kind == 'ttriple':
+            f = lambda i, j, tie: ((out_bits[i] & in_bits[j]).bit_count() + (out_bits[i] & out_bits[j]).bit_count()
+                                   + (in_bits[i] & in_bits[j]).bit_count())
+        elif kind == 'ctriple':
+            f = lambda i, j, tie: (out_bits[j] & in_bits[i]).bit_count()
+        elif kind == 'triangle':
+            f = lambda i, j, tie: ((out_bits[i] & in_bits[j]).bit_count() + (out_bits[i] & out_bits[j]).bit_count()
+                                   + (in_bits[i] & in_bits[j]).bit_count() + (out_bits[j] & in_bits[i]).bit_count())
+        elif kind == 'isolates':
+            f = lambda i, j, tie: (-(in_degree[i] + out_degree[i] - tie == 0)
+                                   - (in_degree[j] + out_degree[j] - tie == 0))
+        elif kind == 'idegree':
+            f = lambda i, j, tie, k=data: (in_degree[j] - tie + 1 == k) - (in_degree[j] - tie == k)
+        elif kind == 'odegree':
+            f = lambda i, j, tie, k=data: (out_degree[i] - tie + 1 == k) - (out_degree[i] - tie == k)
+        elif kind == 'nodecov':
+            f = lambda i, j, tie, values=data: values[i] + values[j]
+        elif kind == 'nodematch':
+            f = lambda i, j, tie, values=data: values[i] == values[j]
+        elif kind == 'nodefactor':
+            f = lambda i, j, tie, values=data: values[i] + values[j]
+        functions.append(f)
+    return functions
+
+
+def empty_statistics(terms, size):
+    """Statistics of the network without ties"""
+    return [size if kind == 'isolates' or (kind in ('idegree', 'odegree') and data == 0) else 0
+            for kind, data in terms]
+
+
+class Chain:
+    """
+    One Markov chain started from the observed network. The same seed always gives the same draws,
+    so any draw can be regenerated instead of kept.
+    """
+
+    def __init__(self, terms, coefficients, size, edges, seed):
+        """
+        :param terms: Terms as returned by term_data
+        :param edges: Observed ties as (tail, head) pairs of node positions
+        """
+        self.coefficients = coefficients
+        self.size = size
+        self.uniform = random.Random(seed).random
+        self.out_bits = [0] * size
+        self.in_bits = [0] * size
+        self.out_degree = [0] * size
+        self.in_degree = [0] * size
+        self.functions = change_functions(terms, self.out_bits, self.in_bits, self.out_degree, self.in_degree)
+        self.statistics = empty_statistics(terms, size)
+        # Ties as codes tail * size + head, with the position of each code, so a tie can be drawn uniformly
+        self.tie_list = []
+        self.tie_position = {}
+        self.accepted = 0
+        self.steps = 0
+
+        # Statistics of the observed network, by adding its ties one at a time
+        for i, j in edges:
+            if i != j and not (self.out_bits[i] >> j) & 1:
+                self.toggle(i, j, 0, [f(i, j, 0) for f in self.functions])
+        self.observed = list(self.statistics)
+
+    def toggle(self, i, j, tie, changes):
+        code = i * self.size + j
+        self.out_bits[i] ^= 1 << j
+        self.in_bits[j] ^= 1 << i
+        step = -1 if tie else 1
+        self.out_degree[i] += step
+        self.in_degree[j] += step
+        for t, change in enumerate(changes):
+            self.statistics[t] += step * change
+        if tie:
+            last = self.tie_list.pop()
+            if last != code:
+                position = self.tie_position[code]
+                self.tie_list[position] = last
+                self.tie_position[last] = position
+            del self.tie_position[code]
+        else:
+            self.tie_position[code] = len(self.tie_list)
+            self.tie_list.append(code)
+
+    def ties(self):
+        """Current ties as sorted codes tail * size + head"""
+        return np.array(sorted(self.tie_list), dtype=np.int64)
+
+    def draws(self, nsim, burnin, interval):
+        """
+        Run the chain, yielding the statistics after the burn-in and then every interval steps;
+        ties() gives the network of the draw just yielded
+        """
+        uniform, size, tie_list, out_bits = self.uniform, self.size, self.tie_list, self.out_bits
+        functions, coefficients, statistics = self.functions, self.coefficients, self.statistics
+        dyads = size * (size - 1)
+        for step in range(1, burnin + nsim * interval + 1):
+            # Tie/no-tie proposal: half the time a present tie, otherwise any dyad
+            n_ties = len(tie_list)
+            if n_ties and uniform() < 0.5:
+                i, j = divmod(tie_list[int(uniform() * n_ties)], size)
+            else:
+                i = int(uniform() * size)
+                j = int(uniform() * (size - 1))
+                j += j >= i
+            tie = (out_bits[i] >> j) & 1
+            changes = [f(i, j, tie) for f in functions]
+            log_ratio = sum(c * theta for c, theta in zip(changes, coefficients))
+            # Proposal probabilities of this toggle and of the reverse one
+            if tie:
+                log_ratio = -log_ratio
+                forward = 0.5 / n_ties + 0.5 / dyads
+                backward = (0.5 if n_ties > 1 else 1) / dyads
+            else:
+                forward = (0.5 if n_ties else 1) / dyads
+                backward = 0.5 / (n_ties + 1) + 0.5 / dyads
+            log_ratio += math.log(backward / forward)
+            self.steps += 1
+            if log_ratio >= 0 or uniform() < math.exp(log_ratio):
+                self.toggle(i, j, tie, changes)
+                self.accepted += 1
+            if step > burnin and (step - burnin) % interval == 0:
+                yield list(statistics)
+
+
+def run_chain(terms, coefficients, size, edges, nsim, burnin, interval, seed):
+    """
+    Run a chain to the end
+    :return: Dict with the observed statistics, the statistics and ties of each draw and the acceptance rate
+    """
+    chain = Chain(terms, coefficients, size, edges, seed)
+    draws, ties = [], []
+    for statistics in chain.draws(nsim, burnin, interval):
+        draws.append(statistics)
+        ties.append(chain.ties())
+    return {'observed': chain.observed, 'statistics': draws, 'ties': ties,
+            'acceptance': chain.accepted / max(chain.steps, 1)}
+
+
+def _pool():
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = ProcessPoolExecutor(max_workers=SIMULATION_CHAINS)
+        return _executor
+
+
+def _prepare(job_dir, nsim, chains, seed):
+    term_names, coefficients = load_model(job_dir)
+    if not all(map(math.isfinite, coefficients)):
+        raise UnsupportedTerm("The model has infinite or missing coefficients")
+    network = Network()
+    terms = term_data(term_names, network)
+    # The sampler works on bitsets, so the dense adjacency matrix is never built
+    edges = np.column_stack(network.edges()).tolist()
+    chains = max(1, min(chains, nsim))
+    seeds = np.random.SeedSequence(seed).generate_state(chains).tolist()
+    # Draws per chain, as even as possible
+    counts = [nsim // chains + (c < nsim % chains) for c in range(chains)]
+    return term_names, coefficients, network, terms, edges, seeds, counts
+
+
+def simulate(job_dir, nsim, chains=SIMULATION_CHAINS, burnin=MCMC_BURNIN, interval=MCMC_INTERVAL, seed=None):
+    """
+    Simulate networks from the fit in a job folder, on the network of the current data files
+    :param nsim: Number of networks, spread over the chains
+    :param seed: Seed of the chains' random numbers, random when None
+    :return: Dict with the term names, the observed statistics, a draws x terms statistics array,
+             the ties of each draw and of the observed network as codes tail * size + head,
+             the node ids and the acceptance rate
+    :raises UnsupportedTerm: When the model has terms the sampler does not implement
+    """
+    term_names, coefficients, network, terms, edges, seeds, counts = _prepare(job_dir, nsim, chains, seed)
+    args = [(terms, coefficients, network.size, edges, count, burnin, interval, chain_seed)
+            for count, chain_seed in zip(counts, seeds)]
+    if len(args) == 1:
+        results = [run_chain(*args[0])]
+    else:
+        results = list(_pool().map(run_chain, *zip(*args)))
+
+    return {
+        'term_names': term_names,
+        'observed': np.array(results[0]['observed'], dtype=float),
+        'statistics': np.array([row for result in results for row in result['statistics']], dtype=float),
+        'ties': [ties for result in results for ties in result['ties']],
+        'observed_ties': network.ties,
+        'node_ids': network.attrs.iloc[:, 0].tolist(),
+        'acceptance': float(np.mean([result['acceptance'] for result in results])),
+    }
+
+
+def stream_chain(path, terms, coefficients, size, edges, nsim, burnin, interval, seed):
+    """Run a chain, appending the statistics of each draw to path as soon as it is drawn"""
+    chain = Chain(terms, coefficients, size, edges, seed)
+    with open(path, 'wb') as file:
+        for statistics in chain.draws(nsim, burnin, interval):
+            append_draw(file, statistics)
+
+
+def _record_error(simulation_dir, chain, future):
+    if future.exception() is not None:
+        with open(error_path(simulation_dir, chain), 'w') as file:
+            file.write(f"Chain {chain + 1} failed: {future.exception()}")
+
+
+def start_stream(job_dir, nsim, simulation_dir, chains=SIMULATION_CHAINS, burnin=MCMC_BURNIN,
+                 interval=MCMC_INTERVAL, seed=None):
+    """
+    Start simulating in the background, streaming the draws to simulation_dir; read them with
+    sim_stream.read_stream. Only statistics are written, regenerate_draw recreates any network.
+    :return: The stream's meta dict, which also holds the observed ties and the node ids
+    :raises UnsupportedTerm: When the model has terms the sampler does not implement
+    """
+    term_names, coefficients, network, terms, edges, seeds, counts = _prepare(job_dir, nsim, chains, seed)
+    meta = {
+        'engine': 'python',
+        'term_names': term_names,
+        'observed': Chain(terms, coefficients, network.size, edges, 0).observed,
+        'counts': counts,
+        'seeds': seeds,
+        'burnin': burnin,
+        'interval': interval,
+        # Everything a chain needs, so draws can be regenerated from this folder alone
+        'terms': terms,
+        'coefficients': coefficients,
+        'edges': edges,
+        'node_ids': [str(node) for node in network.attrs.iloc[:, 0]],
+        'observed_ties': network.ties.tolist(),
+    }
+    write_meta(simulation_dir, meta)
+    for chain, (count, chain_seed) in enumerate(zip(counts, seeds)):
+        future = _pool().submit(stream_chain, stream_path(simulation_dir, chain), terms, coefficients, network.size,
+                                edges, count, burnin, interval, chain_seed)
+        future.add_done_callback(lambda future, chain=chain: _record_error(simulation_dir, chain, future))
+    return meta
+
+
+def regenerate_draw(simulation_dir, chain, index):
+    """
+    Network of one draw of a streamed Python simulation, recreated by rerunning its chain from the
+    same seed and kept in the folder once asked for
+    :param index: Position of the draw in its chain, from 0
+    :return: (ties as codes tail * size + head, statistics)
+    """
+    path = os.path.join(simulation_dir, f"draw_{chain}_{index}.npy")
+    meta = read_stream(simulation_dir)
+    statistics = meta['statistics'][chain][index]
+    if os.path.exists(path):
+        return np.load(path), statistics
+    size = len(meta['node_ids'])
+    replay = Chain(meta['terms'], meta['coefficients'], size, meta['edges'], meta['seeds'][chain])
+    for _ in replay.draws(index + 1, meta['burnin'], meta['interval']):
+        pass
+    ties = replay.ties()
+    np.save(path, ties)
+    return ties, statistics
+
+
+def benchmark(job_dir, nsim, chains):
+    """Time the Python sampler and R's simulate() on the same model and compare their mean statistics"""
+    from pages.ergm_jobs import ERGM_JOBS
+    from pages.r_pool import R_POOL, RWorkerError
+
+    start = time.perf_counter()
+    python = simulate(job_dir, nsim, chains=chains)
+    python_seconds = time.perf_counter() - start
+    print(f"Python: {nsim} networks in {python_seconds:.2f} s with {chains} chain(s), "
+          f"acceptance rate {python['acceptance']:.3f}")
+
+    r_means = None
+    _, simulation_dir = ERGM_JOBS.new_job_dir()
+    start = time.perf_counter()
+    try:
+        r = R_POOL.call('simulate', {'model_path': os.path.join(job_dir, "ergm_results.rds"), 'num_simulations': nsim},
+                        simulation_dir, log_path=os.path.join(simulation_dir, "log.txt"))
+        r_seconds = time.perf_counter() - start
+        r_means = dict(zip(r['stats']['columns'], r['stats']['data'][r['stats']['index'].index('sim mean')]))
+        print(f"R: {nsim} networks in {r_seconds:.2f} s, {r_seconds / python_seconds:.1f}x the Python time")
+    except RWorkerError as e:
+        print("R could not be run:", e)
+
+    means = python['statistics'].mean(axis=0)
+    errors = python['statistics'].std(axis=0, ddof=1) / math.sqrt(nsim)
+    print(f"\n{'statistic':<30}{'observed':>12}{'Python mean':>14}{'std. error':>12}{'R mean':>12}")
+    for t, name in enumerate(python['term_names']):
+        r_mean = f"{r_means[name]:12.2f}" if r_means and name in r_means else f"{'':>12}"
+        print(f"{name:<30}{python['observed'][t]:12.2f}{means[t]:14.2f}{errors[t]:12.2f}{r_mean}")
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Benchmark the Python ERGM sampler against R's simulate()")
+    parser.add_argument('--benchmark', metavar='JOB_DIR', required=True,
+                        help="Job folder of a fitted model, holding result.json and ergm_results.rds")
+    parser.add_argument('--nsim', type=int, default=100)
+    parser.add_argument('--chains', type=int, default=SIMULATION_CHAINS)
+    arguments = parser.parse_args()
+    benchmark(arguments.benchmark, arguments.nsim, arguments.chains)
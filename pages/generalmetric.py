@@ -1,5 +1,8 @@
 import base64
 import io
+import json
+import os
+import threading
 
 import dash
 import matplotlib
@@ -7,10 +10,13 @@ import matplotlib
 matplotlib.use('Agg')  # Use Agg backend
 import matplotlib.pyplot as plt
 import networkx as nx
-import pandas as pd
 from dash import dcc, html
 from dash.dependencies import Input, Output
 
+from pages.csr_graph import CSRGraph
+from pages.network_io import file_digest, read_table
+from pages.path_estimates import estimate_average_path_length, estimate_diameter
+
 dash.register_page(
     __name__,
     path='/general-metrics',
@@ -19,110 +25,177 @@ dash.register_page(
     order=1
 )
 
-# Read CSV file containing edges and nodes data
-edges_df = pd.read_csv("pages/data/network_edges.csv")
-nodes_df = pd.read_csv("pages/data/network_data.csv")
-
-#Create a graph from the edge list
-G = nx.from_pandas_edgelist(edges_df, source="Source", target="Target")
-
-# Compute graph metrics
-density = nx.density(G)
-avg_degree = sum(dict(G.degree()).values()) / len(G)
-degree_distribution = dict(G.degree())
-num_nodes = len(G.nodes)
-num_edges = len(G.edges)
-try:
-    diameter = nx.diameter(G)
-except nx.NetworkXError:
-    diameter = "Graph is not connected."
-try:
-    avg_path_length = nx.average_shortest_path_length(G)
-except nx.NetworkXError:
-    avg_path_length = "Graph is not connected."
-clustering_coefficient = nx.average_clustering(G)
-avg_node_clustering = nx.clustering(G)
-transitivity = nx.transitivity(G)
-assortativity = nx.degree_assortativity_coefficient(G)
-
-# Draw the graph and convert to base64 for displaying in Dash
-buffer = io.BytesIO()
-plt.figure(figsize=(8, 6))
-nx.draw(G, with_labels=False, node_color='skyblue', node_size=100, edge_color='gray')
-plt.savefig(buffer, format='png')
-plt.close()
-graph_image = base64.b64encode(buffer.getvalue()).decode('utf-8')
+EDGES_PATH = "pages/data/network_edges.csv"
+# Computed metrics are memoised here, one folder per content hash of the edge file
+CACHE_DIR = "dump/metrics_cache"
+
+# Graphs of the current edge file built in this process, with the content hash they were built from
+_graphs = {}
+_csr_graphs = {}
+_graphs_lock = threading.Lock()
+
+
+def _cached_graph(graphs, digest, build):
+    """Graph built from the edge file with the given content hash, dropping graphs of older versions"""
+    with _graphs_lock:
+        if digest not in graphs:
+            graphs.clear()
+            graphs[digest] = build(read_table(EDGES_PATH))
+        return graphs[digest]
+
+
+def load_graph(digest):
+    """Build (once per process) the graph of the edge file with the given content hash"""
+    return _cached_graph(_graphs, digest,
+                         lambda edges_df: nx.from_pandas_edgelist(edges_df, source="Source", target="Target"))
+
+
+def load_csr_graph(digest):
+    """Build (once per process) the undirected CSR graph of the edge file with the given content hash"""
+    return _cached_graph(_csr_graphs, digest, lambda edges_df: CSRGraph.from_frames(edges_df).to_undirected())
+
+
+def memoised(name, compute, loader=load_graph):
+    """
+    Return the stored result of a metric for the current edge file, computing and storing it on first use.
+    The content hash is always taken on the server, never from the page, since it names a cache folder.
+    :param name: Name of the metric, used as the cache file name
+    :param compute: Function of the graph returning the text to display
+    :param loader: Function of the digest returning the graph passed to compute
+    """
+    digest = file_digest(EDGES_PATH)
+    path = os.path.join(CACHE_DIR, digest, f"{name}.json")
+    if os.path.exists(path):
+        with open(path) as file:
+            return json.load(file)
+    value = compute(loader(digest))
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp_path = f"{path}.{threading.get_ident()}.tmp"
+    with open(tmp_path, "w") as file:
+        json.dump(value, file)
+    os.replace(tmp_path, path)
+    return value
+
+
+def components_note(components):
+    if components == 1:
+        return ""
+    return f"\nThe graph has {components} connected components, paths are only measured within them."
+
+
+def compute_diameter(graph):
+    # Bounded number of BFS runs per component, the bounds meet on almost every real graph
+    estimate = estimate_diameter(graph)
+    if estimate['lower'] == estimate['upper']:
+        text = str(estimate['lower'])
+    else:
+        text = f"Between {estimate['lower']} and {estimate['upper']}"
+    return text + components_note(estimate['components'])
+
+
+def compute_avg_path_length(graph):
+    # Exact on small graphs, estimated from a sample of BFS sources otherwise
+    estimate = estimate_average_path_length(graph)
+    if estimate['error'] == 0:
+        text = str(estimate['mean'])
+    else:
+        text = f"{estimate['mean']:.4f} ± {estimate['error']:.4f} (95% CI, {estimate['sources']} sampled sources)"
+    return text + components_note(estimate['components'])
+
+
+def draw_graph(G):
+    # Draw the graph and convert to base64 for displaying in Dash
+    buffer = io.BytesIO()
+    plt.figure(figsize=(8, 6))
+    nx.draw(G, with_labels=False, node_color='skyblue', node_size=100, edge_color='gray')
+    plt.savefig(buffer, format='png')
+    plt.close()
+    return 'data:image/png;base64,{}'.format(base64.b64encode(buffer.getvalue()).decode('utf-8'))
+
+
+# Metric panels in display order: element id, title, description and how to compute the shown text.
+# Each panel is filled by its own callback, so it appears as soon as its metric is ready.
+METRIC_PANELS = [
+    ("density", "Density",
+     "Density quantifies the number of edges in the graph relative to the number of possible edges.",
+     lambda G: str(nx.density(G)), load_graph),
+    ("num-nodes", "Number of Nodes",
+     "Total number of nodes in the graph.",
+     lambda G: str(len(G.nodes)), load_graph),
+    ("num-edges", "Number of Edges",
+     "Total number of edges in the graph.",
+     lambda G: str(len(G.edges)), load_graph),
+    ("average-degree", "Average Degree",
+     "Average degree of the nodes in the graph.",
+     lambda G: str(sum(dict(G.degree()).values()) / len(G)), load_graph),
+    ("degree-distribution", "Degree Distribution",
+     "Distribution of degrees across all nodes in the graph.",
+     lambda G: str(dict(G.degree())), load_graph),
+    ("network-diameter", "Network Diameter",
+     "Longest shortest path between any pair of connected nodes in the graph.",
+     compute_diameter, load_csr_graph),
+    ("average-path-length", "Average Path Length",
+     "Average shortest path length between all pairs of connected nodes in the graph.",
+     compute_avg_path_length, load_csr_graph),
+    ("clustering-coefficient", "Global Clustering Coefficient",
+     "Average clustering coefficient over all nodes in the graph.",
+     lambda G: str(nx.average_clustering(G)), load_graph),
+    ("avg-node-clustering", "Average Node Clustering Coefficients",
+     "Clustering coefficient for each node averaged over all nodes.",
+     lambda G: str(nx.clustering(G)), load_graph),
+    ("transitivity", "Transitivity",
+     "Transitivity quantifies the tendency for nodes to cluster together.",
+     lambda G: str(nx.transitivity(G)), load_graph),
+    ("assortativity", "Assortativity Coefficient",
+     "Assortativity coefficient measures the similarity of connections in the graph with respect to the node degrees.",
+     lambda G: str(nx.degree_assortativity_coefficient(G)), load_graph),
+]
+
 
 def layout():
     return html.Div([
+        # Content hash of the edge file when the page was loaded, it only triggers the panel callbacks
+        dcc.Store(id="general-metrics-dataset", data=file_digest(EDGES_PATH)),
         html.Div(style={'display': 'flex', 'justifyContent': 'center'}, children=[
             html.H1("Graph Metrics and Visualization Dashboard")
         ]),
         html.Div(style={'display': 'flex', 'flexDirection': 'row', 'flexWrap': 'wrap'}, children=[
             html.Div(style={'flex': '0 0 60%', 'maxWidth': '60%'}, children=[
-                html.Img(src='data:image/png;base64,{}'.format(graph_image), style={'width': '100%'})
+                dcc.Loading(html.Img(id="graph-image", style={'width': '100%'}))
             ]),
             html.Div(style={'flex': '0 0 40%', 'maxWidth': '40%', 'height': '90vh', 'overflowY': 'auto'}, children=[
                 html.Div([
-                    html.H3("Density"),
-                    html.P("Density quantifies the number of edges in the graph relative to the number of possible edges."),
-                    html.Pre(id="density", children=str(density))
-                ]),
-                html.Div([
-                    html.H3("Number of Nodes"),
-                    html.P("Total number of nodes in the graph."),
-                    html.Pre(id="num-nodes", children=str(num_nodes))
-                ]),
-                html.Div([
-                    html.H3("Number of Edges"),
-                    html.P("Total number of edges in the graph."),
-                    html.Pre(id="num-edges", children=str(num_edges))
-                ]),
-                html.Div([
-                    html.H3("Average Degree"),
-                    html.P("Average degree of the nodes in the graph."),
-                    html.Pre(id="average-degree", children=str(avg_degree))
-                ]),
-                html.Div([
-                    html.H3("Degree Distribution"),
-                    html.P("Distribution of degrees across all nodes in the graph."),
-                    html.Pre(id="degree-distribution", children=str(degree_distribution))
-                ]),
-                html.Div([
-                    html.H3("Network Diameter"),
-                    html.P("Longest shortest path between any pair of nodes in the graph."),
-                    html.Pre(id="network-diameter", children=str(diameter))
-                ]),
-                html.Div([
-                    html.H3("Average Path Length"),
-                    html.P("Average shortest path length between all pairs of nodes in the graph."),
-                    html.Pre(id="average-path-length", children=str(avg_path_length))
-                ]),
-                html.Div([
-                    html.H3("Global Clustering Coefficient"),
-                    html.P("Average clustering coefficient over all nodes in the graph."),
-                    html.Pre(id="clustering-coefficient", children=str(clustering_coefficient))
-                ]),
-                html.Div([
-                    html.H3("Average Node Clustering Coefficients"),
-                    html.P("Clustering coefficient for each node averaged over all nodes."),
-                    html.Pre(id="avg-node-clustering", children=str(avg_node_clustering))
-                ]),
-                html.Div([
-                    html.H3("Transitivity"),
-                    html.P("Transitivity quantifies the tendency for nodes to cluster together."),
-                    html.Pre(id="transitivity", children=str(transitivity))
-                ]),
-                html.Div([
-                    html.H3("Assortativity Coefficient"),
-                    html.P("Assortativity coefficient measures the similarity of connections in the graph with respect to the node degrees."),
-                    html.Pre(id="assortativity", children=str(assortativity))
+                    html.H3(title),
+                    html.P(description),
+                    html.Pre(id=panel_id, children="Computing…")
                 ])
+                for panel_id, title, description, compute, loader in METRIC_PANELS
             ])
         ])
     ])
 
 
+def register_panel_callback(panel_id, compute, loader):
+    @dash.callback(
+        Output(panel_id, "children"),
+        Input("general-metrics-dataset", "data")
+    )
+    def update_panel(_digest):
+        return memoised(panel_id, compute, loader)
+
+
+for panel_id, title, description, compute, loader in METRIC_PANELS:
+    register_panel_callback(panel_id, compute, loader)
+
+
+@dash.callback(
+    Output("graph-image", "src"),
+    Input("general-metrics-dataset", "data")
+)
+def update_graph_image(_digest):
+    return memoised("graph-image", draw_graph)
+
+
 # Define the callback to switch pages
 @dash.callback(
     Output("page-content", "children"),
@@ -133,6 +206,3 @@ def display_page(pathname):
         return layout()
     else:
         return html.Div("Page not found")
-    
-
-
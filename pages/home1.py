@@ -1,8 +1,9 @@
 
 import base64
-import io
 import json
 import os
+import tempfile
+from contextlib import closing
 
 import dash
 import matplotlib
@@ -17,6 +18,8 @@ import matplotlib.pyplot as plt
 import pandas as pd
 from dash import Input, Output, State, callback, dash_table, dcc, html
 
+from pages.network_io import TableWriter
+
 dash.register_page(
     __name__,
     path='/',
@@ -69,6 +72,56 @@ def layout():
         
     ])
 
+# Uploads are decoded into memory up to this size, larger ones are spooled to a temporary file
+SPOOL_THRESHOLD_BYTES = 32 * 1024 * 1024
+# Number of rows parsed, processed and written at a time
+CHUNK_ROWS = 100_000
+# Base64 characters decoded at a time, a multiple of 4 so every block decodes on its own
+DECODE_BLOCK_CHARS = 4 * 1024 * 1024
+
+
+def decode_upload(contents):
+    """
+    Decode a dcc.Upload data URI block by block into a binary buffer,
+    without holding the decoded file as a second full copy in memory
+    :param contents: The 'data:<type>;base64,<data>' string from dcc.Upload
+    :return: A binary file object positioned at the start of the decoded file
+    """
+    buffer = tempfile.SpooledTemporaryFile(max_size=SPOOL_THRESHOLD_BYTES)
+    start = contents.index(',') + 1
+    for offset in range(start, len(contents), DECODE_BLOCK_CHARS):
+        buffer.write(base64.b64decode(contents[offset:offset + DECODE_BLOCK_CHARS]))
+    buffer.seek(0)
+    return buffer
+
+
+def is_json_lines(buffer):
+    """
+    Whether an upload is JSON Lines: its first line is a flat record on its own and more lines follow.
+    A single JSON document, even a compact one on one line, is not.
+    """
+    first_line = buffer.readline()
+    more_lines = any(line.strip() for line in iter(buffer.readline, b''))
+    buffer.seek(0)
+    try:
+        record = json.loads(first_line)
+    except ValueError:
+        return False
+    return (more_lines and isinstance(record, dict)
+            and not any(isinstance(value, (dict, list)) for value in record.values()))
+
+
+def read_json_chunks(buffer):
+    """
+    Yield DataFrames from a JSON upload: JSON Lines files are read in chunks,
+    a single JSON document (list of records or dict of columns) is read at once
+    """
+    if is_json_lines(buffer):
+        yield from pd.read_json(buffer, lines=True, chunksize=CHUNK_ROWS)
+    else:
+        yield pd.DataFrame(json.load(buffer))
+
+
 @callback(
     Output('output-file-upload', 'children'),
     Output('link-to-download', 'children'),
@@ -79,27 +132,23 @@ def update_output(contents, filename):
     if not contents:
         return (html.Div("No file uploaded."), html.Div())
 
-    content_type, content_string = contents.split(',')
-    decoded = base64.b64decode(content_string)
-
     # Process CSV files
     if filename.endswith('.csv'):
-        df = pd.read_csv(io.StringIO(decoded.decode('utf-8')))
+        read_chunks = lambda buffer: pd.read_csv(buffer, chunksize=CHUNK_ROWS)
     # Process JSON files
     elif filename.endswith('.json'):
-        df = pd.DataFrame(json.loads(decoded.decode('utf-8')))
+        read_chunks = read_json_chunks
     else:
         return (html.Div("Unsupported file type."), html.Div())
 
     try:
-        data_df, edgelist_df,message = process_dataframe(df)
-        
         base_filename = filename.split('.')[0]
         data_filepath = os.path.join('pages/data', f'{base_filename}_data.csv')
         edgelist_filepath = os.path.join('pages/data', f'{base_filename}_edgelist.csv')
-        
-        data_df.to_csv(data_filepath, index=False)
-        edgelist_df.to_csv(edgelist_filepath, index=False)
+
+        # The chunk reader is closed before the buffer, even when processing stops early
+        with decode_upload(contents) as buffer, closing(read_chunks(buffer)) as chunks:
+            message = process_chunks(chunks, data_filepath, edgelist_filepath)
 
         return (html.Div(["Files processed and saved.", html.P(message)]),
                 html.Div([
@@ -109,31 +158,65 @@ def update_output(contents, filename):
     except Exception as e:
         return (html.Div(f"Error processing file: {str(e)}"), html.Div())
 
-def process_dataframe(df):
-    duplicates_before = df.duplicated(subset=['ID']).sum()
-    df.drop_duplicates(subset=['ID'], keep='first', inplace=True)
-    duplicates_after = df.duplicated(subset=['ID']).sum()
-    null_ids_count = df['ID'].isnull().sum()
-    df.dropna(subset=['ID'], inplace=True)
-    null_other_count = df.drop(['ID', 'Relationship'], axis=1).isnull().any(axis=1).sum()
+
+def new_stats():
+    return {'duplicates': 0, 'null_ids': 0, 'null_other': 0, 'malformed': 0, 'malformed_examples': []}
+
+
+def process_chunks(chunks, data_filepath, edgelist_filepath):
+    """
+    Process an upload chunk by chunk, appending each chunk's rows to the output files
+    :return: The report messages for the whole upload
+    """
+    stats = new_stats()
+    # IDs kept so far, so duplicates are also caught across chunks
+    seen_ids = set()
+    # Each output is written as CSV and as a binary columnar copy the other pages load faster
+    with TableWriter(data_filepath) as data_writer, TableWriter(edgelist_filepath) as edgelist_writer:
+        for chunk in chunks:
+            data_df, edgelist_df = process_chunk(chunk, seen_ids, stats)
+            data_writer.append(data_df)
+            edgelist_writer.append(edgelist_df)
+    return build_messages(stats)
+
+
+def process_chunk(df, seen_ids, stats):
+    duplicated = df.duplicated(subset=['ID']) | df['ID'].isin(seen_ids)
+    stats['duplicates'] += duplicated.sum()
+    df = df[~duplicated]
+    stats['null_ids'] += df['ID'].isnull().sum()
+    df = df.dropna(subset=['ID'])
+    seen_ids.update(df['ID'])
+    stats['null_other'] += df.drop(['ID', 'Relationship'], axis=1).isnull().any(axis=1).sum()
 
     data_df = df.drop('Relationship', axis=1)  # Drop the 'Relationship' column for the data file
-    rows = []
-    for index, row in df.iterrows():
-        source_id = row['ID']
-        if pd.notna(row['Relationship']):
-            targets = str(row['Relationship']).split(';')
-            for target in targets:
-                rows.append({'Source': source_id, 'Target': int(target)})
-    edgelist_df = pd.DataFrame(rows)
 
+    # One row per (source, target) pair, built column-wise instead of row by row
+    targets = df.set_index('ID')['Relationship'].dropna().astype(str).str.split(';').explode().str.strip()
+    targets = targets[targets != '']
+    target_ids = pd.to_numeric(targets, errors='coerce')
+    # Targets that are not whole numbers are reported instead of aborting the upload
+    malformed = target_ids.isna() | (target_ids % 1 != 0)
+    stats['malformed'] += malformed.sum()
+    examples = stats['malformed_examples']
+    examples.extend(targets[malformed].unique()[:5 - len(examples)])
+    target_ids = target_ids[~malformed]
+    edgelist_df = pd.DataFrame({'Source': target_ids.index, 'Target': target_ids.astype('int64').to_numpy()})
+
+    return data_df, edgelist_df
+
+
+def build_messages(stats):
     messages = []
-    if null_ids_count > 0:
-        messages.append(f"Dropped {null_ids_count} row(s) with null 'ID'.")
-    if duplicates_before > duplicates_after:
-        messages.append(f"Dropped {duplicates_before - duplicates_after} duplicate row(s).")
-    if null_other_count > 0:
-        messages.append(f"{null_other_count} row(s) have null values in columns except 'ID' and 'Relationship'.")
+    if stats['null_ids'] > 0:
+        messages.append(f"Dropped {stats['null_ids']} row(s) with null 'ID'.")
+    if stats['duplicates'] > 0:
+        messages.append(f"Dropped {stats['duplicates']} duplicate row(s).")
+    if stats['null_other'] > 0:
+        messages.append(f"{stats['null_other']} row(s) have null values in columns except 'ID' and 'Relationship'.")
+    if stats['malformed'] > 0:
+        examples = ', '.join(repr(target) for target in stats['malformed_examples'])
+        messages.append(f"Skipped {stats['malformed']} malformed target ID(s) in 'Relationship', e.g. {examples}.")
     message_paragraphs = [html.P(msg) for msg in messages]
 
-    return data_df, edgelist_df, message_paragraphs
+    return message_paragraphs
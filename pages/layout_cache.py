@@ -0,0 +1,65 @@
+# Description: Node positions and original-network plot of each observed network, computed once and reused
+# by every simulation of that network. The positions are also passed to R's plot(coord = ...), so the
+# original network and all simulated draws are drawn with the nodes in the same places.
+
+import hashlib
+import os
+
+import networkx as nx
+import numpy as np
+
+# One positions file and one plot file per observed network, named after its key
+LAYOUT_DIR = "dump/layouts"
+# Seed of the spring layout, so a cleared cache gives the same positions again
+LAYOUT_SEED = 33
+
+
+def network_key(size, observed_ties):
+    """Key of an observed network, from its number of nodes and its ties as codes tail * size + head"""
+    ties = np.unique(np.asarray(observed_ties, dtype=np.int64))
+    return hashlib.sha1(np.int64(size).tobytes() + ties.tobytes()).hexdigest()
+
+
+def _path(key, extension):
+    return os.path.join(LAYOUT_DIR, key + extension)
+
+
+def observed_layout(size, observed_ties):
+    """
+    Spring layout of an observed network, read from the cache or computed and cached
+    :return: Array of the (x, y) position of each node, in node order
+    """
+    path = _path(network_key(size, observed_ties), ".npy")
+    try:
+        return np.load(path)
+    except (OSError, ValueError):
+        pass
+    graph = nx.DiGraph()
+    graph.add_nodes_from(range(size))
+    graph.add_edges_from(zip(*np.divmod(np.asarray(observed_ties, dtype=np.int64), size)))
+    layout_positions = nx.spring_layout(graph, seed=LAYOUT_SEED)
+    positions = np.array([layout_positions[node] for node in range(size)]).reshape(size, 2)
+
+    # Write next to the target and rename, so readers never see a partial file
+    os.makedirs(LAYOUT_DIR, exist_ok=True)
+    tmp_path = path + '.tmp.npy'
+    np.save(tmp_path, positions)
+    os.replace(tmp_path, path)
+    return positions
+
+
+def cached_plot(key):
+    """Base64 PNG data URI of the original network's plot, or None before it is drawn"""
+    try:
+        with open(_path(key, ".png.txt")) as file:
+            return file.read()
+    except OSError:
+        return None
+
+
+def save_plot(key, base64_plot):
+    os.makedirs(LAYOUT_DIR, exist_ok=True)
+    tmp_path = _path(key, ".png.txt.tmp")
+    with open(tmp_path, 'w') as file:
+        file.write(base64_plot)
+    os.replace(tmp_path, _path(key, ".png.txt"))
@@ -0,0 +1,195 @@
+import math
+import re
+
+import numpy as np
+import pandas as pd
+
+from pages.ergm_cache import split_terms
+from pages.r_worker import network_frames
+
+# Newton-Raphson settings of the logistic regression
+MAX_ITERATIONS = 50
+TOLERANCE = 1e-8
+# Coefficients beyond this size mean the pseudo-likelihood has no maximum (separation)
+MAX_COEFFICIENT = 30
+
+# Terms whose change statistics do not depend on the rest of the network; with only these the MPLE is the MLE
+DYAD_INDEPENDENT = {'edges', 'nodecov', 'nodematch', 'nodefactor'}
+
+TERM_PATTERN = re.compile(r'(\w+)(?:\((.*)\))?')
+NAME_ARGUMENT = re.compile(r'["\']([^"\']+)["\']')
+
+
+class UnsupportedTerm(ValueError):
+    """A formula term the change statistics are not computed for here, or an MPLE without a finite maximum"""
+
+
+class Network:
+    """
+    Dense directed adjacency matrix and attribute table of the current dataset, in the vertex order R uses.
+    The adjacency is float so its matrix products run in BLAS; NumPy multiplies integer matrices without it.
+    """
+
+    def __init__(self):
+        edges, attrs = network_frames()
+        index = pd.Index(attrs[attrs.columns[0]])
+        self.size = len(index)
+        # Ties as sorted unique codes tail * size + head, without loops
+        codes = index.get_indexer(edges.iloc[:, 0]).astype(np.int64) * self.size + index.get_indexer(edges.iloc[:, 1])
+        self.ties = np.unique(codes[codes // self.size != codes % self.size])
+        # Attribute names in lower case, as build_network in ergm_functions.R sets them
+        self.attrs = attrs.set_axis([str(column).lower() for column in attrs.columns], axis=1)
+        self._adjacency = None
+        self._two_paths = {}
+
+    @property
+    def adjacency(self):
+        """Dense adjacency matrix, built the first time a term needs it"""
+        if self._adjacency is None:
+            self._adjacency = np.zeros((self.size, self.size))
+            self._adjacency.flat[self.ties] = 1
+        return self._adjacency
+
+    def edges(self):
+        """Ties as (tail, head) arrays of node positions"""
+        return np.divmod(self.ties, self.size)
+
+    def two_paths(self, kind):
+        """
+        Two-path counts between every pair of nodes, computed once per network for all terms
+        :param kind: 'out_in' for i->k->j (y @ y), 'out_out' for i->k<-j (y @ y.T), 'in_in' for i<-k->j (y.T @ y)
+        """
+        if kind not in self._two_paths:
+            y = self.adjacency
+            self._two_paths[kind] = {'out_in': lambda: y @ y, 'out_out': lambda: y @ y.T, 'in_in': lambda: y.T @ y}[kind]()
+        return self._two_paths[kind]
+
+    def attribute(self, name):
+        if name not in self.attrs.columns[1:]:
+            raise UnsupportedTerm(f"Unknown node attribute '{name}'")
+        values = self.attrs[name]
+        if values.isna().any() or (values == '').any():
+            raise UnsupportedTerm(f"Node attribute '{name}' has missing values")
+        return values.to_numpy()
+
+
+def change_statistics(network, term, tails, heads):
+    """
+    Change statistics of one term for toggling each dyad tails[k] -> heads[k] on, given the rest of the network
+    :return: (coefficient names, matrix with one column per coefficient)
+    """
+    match = TERM_PATTERN.fullmatch(term)
+    if match is None:
+        raise UnsupportedTerm(term)
+    name, argument = match.groups()
+    y = network.adjacency
+    # The dyad's own tie, removed from the counts below that would include it
+    tie = y[tails, heads]
+
+    if name == 'edges' and argument is None:
+        return ['edges'], np.ones((len(tails), 1))
+    if name == 'mutual' and argument is None:
+        return ['mutual'], y[heads, tails][:, None]
+    if name in ('triangle', 'triangles', 'ttriple', 'ctriple') and argument is None:
+        # Cyclic triples i->j->k->i
+        cyclic = network.two_paths('out_in')[heads, tails]
+        if name == 'ctriple':
+            return ['ctriple'], cyclic[:, None]
+        # Transitive triples the tie closes, starts or ends: i->k->j, i->k<-j and i<-k->j
+        transitive = (network.two_paths('out_in')[tails, heads] + network.two_paths('out_out')[tails, heads]
+                      + network.two_paths('in_in')[tails, heads])
+        if name == 'ttriple':
+            return ['ttriple'], transitive[:, None]
+        return ['triangle'], (transitive + cyclic)[:, None]
+    if name in ('idegree', 'odegree') and argument is not None and argument.strip().isdigit():
+        k = int(argument)
+        degree = y.sum(axis=0)[heads] if name == 'idegree' else y.sum(axis=1)[tails]
+        degree = degree - tie
+        return [f'{name}{k}'], ((degree + 1 == k).astype(float) - (degree == k))[:, None]
+    if name == 'isolates' and argument is None:
+        degree = y.sum(axis=0) + y.sum(axis=1)
+        return ['isolates'], (-(degree[tails] - tie == 0).astype(float) - (degree[heads] - tie == 0))[:, None]
+
+    attribute = NAME_ARGUMENT.fullmatch(argument or '')
+    if attribute is None:
+        raise UnsupportedTerm(term)
+    attribute = attribute.group(1)
+    if name == 'nodecov':
+        values = network.attribute(attribute).astype(float)
+        return [f'nodecov.{attribute}'], (values[tails] + values[heads])[:, None]
+    if name == 'nodematch':
+        values = network.attribute(attribute)
+        return [f'nodematch.{attribute}'], (values[tails] == values[heads]).astype(float)[:, None]
+    if name == 'nodefactor':
+        values = network.attribute(attribute).astype(str)
+        # The first level in sorted order is the baseline, as with ergm's default levels
+        levels = np.unique(values)[1:]
+        stats = (values[tails][:, None] == levels).astype(float) + (values[heads][:, None] == levels)
+        return [f'nodefactor.{attribute}.{level}' for level in levels], stats
+    raise UnsupportedTerm(term)
+
+
+def logistic_regression(stats, successes, trials):
+    """
+    Logistic regression by Newton-Raphson on grouped data
+    :param stats: Matrix with one row per distinct change statistic vector
+    :param successes: Number of ties among the dyads of each row
+    :param trials: Number of dyads of each row
+    :return: (coefficients, standard errors)
+    """
+    coefficients = np.zeros(stats.shape[1])
+    for _ in range(MAX_ITERATIONS):
+        p = 1 / (1 + np.exp(-(stats @ coefficients)))
+        gradient = stats.T @ (successes - trials * p)
+        information = stats.T @ (stats * (trials * p * (1 - p))[:, None])
+        try:
+            step = np.linalg.solve(information, gradient)
+        except np.linalg.LinAlgError:
+            raise UnsupportedTerm("The terms are linearly dependent on this network")
+        coefficients += step
+        if np.abs(coefficients).max() > MAX_COEFFICIENT:
+            raise UnsupportedTerm("The pseudo-likelihood has no finite maximum on this network")
+        if np.abs(step).max() < TOLERANCE:
+            break
+    p = 1 / (1 + np.exp(-(stats @ coefficients)))
+    information = stats.T @ (stats * (trials * p * (1 - p))[:, None])
+    return coefficients, np.sqrt(np.diag(np.linalg.inv(information)))
+
+
+def fit_mple(formula):
+    """
+    Maximum pseudo-likelihood estimate of a directed ERGM on the current dataset, as a logistic
+    regression of every dyad's tie on its change statistics. Dyads with the same change statistics
+    are grouped first, so the regression runs on a few distinct rows.
+    :param formula: Right-hand side of the model formula
+    :return: Dict in the form of the R worker's fit_ergm result, without goodness-of-fit
+    :raises UnsupportedTerm: For terms not handled here, which the R worker can fit instead
+    """
+    terms = split_terms(formula)
+    if not terms:
+        raise UnsupportedTerm("The formula has no terms")
+    network = Network()
+    tails, heads = np.nonzero(~np.eye(network.size, dtype=bool))
+
+    names, columns = [], []
+    for term in terms:
+        term_names, stats = change_statistics(network, term, tails, heads)
+        names.extend(term_names)
+        columns.append(stats)
+    rows, groups = np.unique(np.hstack(columns), axis=0, return_inverse=True)
+    groups = groups.ravel()
+    successes = np.bincount(groups, weights=network.adjacency[tails, heads], minlength=len(rows))
+    trials = np.bincount(groups, minlength=len(rows)).astype(float)
+
+    coefficients, errors = logistic_regression(rows, successes, trials)
+    z = coefficients / errors
+    p_values = [math.erfc(abs(value) / math.sqrt(2)) for value in z]
+    table = np.column_stack([coefficients, errors, np.zeros(len(names)), z, p_values])
+    return {
+        'model_formula': f"sn_network ~ {' + '.join(terms)}",
+        'model_coefficients': table.tolist(),
+        'term_names': names,
+        'model_gof': None,
+        'estimate': 'MPLE',
+        'dyad_independent': all(TERM_PATTERN.fullmatch(term).group(1) in DYAD_INDEPENDENT for term in terms),
+    }
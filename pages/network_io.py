@@ -0,0 +1,192 @@
+import hashlib
+import os
+
+import numpy as np
+import pandas as pd
+
+# Arrow Feather is used when pyarrow is installed, NumPy .npz otherwise
+try:
+    import pyarrow as pa
+    import pyarrow.feather as feather
+except ImportError:
+    pa = None
+
+
+def binary_path(csv_path):
+    """Path of the binary copy written next to a CSV file"""
+    stem = os.path.splitext(csv_path)[0]
+    return stem + ('.feather' if pa is not None else '.npz')
+
+
+def _npz_arrays(df):
+    # String columns are stored as fixed-width unicode plus a null mask, so no pickling is needed
+    arrays = {'columns': np.array([str(column) for column in df.columns])}
+    for i, column in enumerate(df.columns):
+        values = df[column]
+        if pd.api.types.is_numeric_dtype(values) or pd.api.types.is_bool_dtype(values):
+            arrays[f'c{i}'] = values.to_numpy()
+        else:
+            arrays[f'c{i}'] = values.astype(str).where(values.notna(), '').to_numpy(dtype=str)
+            arrays[f'm{i}'] = values.isna().to_numpy()
+    return arrays
+
+
+def _read_npz(path):
+    with np.load(path) as npz:
+        data = {}
+        for i, column in enumerate(npz['columns']):
+            values = npz[f'c{i}']
+            if f'm{i}' in npz:
+                values = values.astype(object)
+                values[npz[f'm{i}']] = np.nan
+            data[str(column)] = values
+    return pd.DataFrame(data)
+
+
+def write_table(df, csv_path):
+    """
+    Write the binary columnar copy of a table that is (or will be) saved as csv_path
+    """
+    path = binary_path(csv_path)
+    # Write to a temporary name first so readers never see a half-written file
+    tmp_path = path + '.tmp' + os.path.splitext(path)[1]
+    if pa is not None:
+        feather.write_feather(df.reset_index(drop=True), tmp_path)
+    else:
+        np.savez(tmp_path, **_npz_arrays(df))
+    os.replace(tmp_path, path)
+
+
+def read_table(csv_path):
+    """
+    Read a table, preferring its binary copy when it is at least as new as the CSV.
+    When only the CSV is usable it is parsed once and the binary copy is written for next time.
+    """
+    path = binary_path(csv_path)
+    csv_exists = os.path.exists(csv_path)
+    if os.path.exists(path) and (not csv_exists or os.path.getmtime(path) >= os.path.getmtime(csv_path)):
+        if pa is not None:
+            return feather.read_table(path, memory_map=True).to_pandas()
+        return _read_npz(path)
+
+    df = pd.read_csv(csv_path)
+    try:
+        write_table(df, csv_path)
+    except OSError:
+        # A read-only data folder only loses the speed-up
+        pass
+    return df
+
+
+def _field_type(old, new):
+    """Type a column written as old and now arriving as new is stored as: the promoted type, or text"""
+    try:
+        return pa.unify_schemas([pa.schema([pa.field('c', old)]), pa.schema([pa.field('c', new)])],
+                                promote_options='permissive').field('c').type
+    except (pa.ArrowInvalid, pa.ArrowTypeError, pa.ArrowNotImplementedError):
+        return pa.string()
+
+
+def _arrow_table(df):
+    try:
+        return pa.Table.from_pandas(df, preserve_index=False)
+    except (pa.ArrowInvalid, pa.ArrowTypeError):
+        # Text columns holding mixed values, e.g. numbers and words, are stored as text
+        text = df.select_dtypes(include='object').columns
+        df = df.astype({column: str for column in text}).where(df.notna(), None)
+        return pa.Table.from_pandas(df, preserve_index=False)
+
+
+class TableWriter:
+    """
+    Write a table chunk by chunk as CSV and as its binary columnar copy.
+    Feather output is streamed as Arrow record batches; the .npz fallback
+    keeps the parsed chunks until close, as .npz cannot be appended to.
+    When a later chunk's column types differ from the batches written so far, those batches
+    are rewritten with the types promoted (e.g. int to float), or as text where they cannot be.
+    """
+
+    def __init__(self, csv_path):
+        self.csv_path = csv_path
+        self._chunks = 0
+        self._arrow_writer = None
+        self._schema = None
+        self._npz_chunks = []
+        self._tmp_path = binary_path(csv_path) + '.tmp' + os.path.splitext(binary_path(csv_path))[1]
+
+    def _promote(self, schema):
+        """Schema that holds both the batches written so far and a chunk with the given schema"""
+        fields = []
+        for field in self._schema:
+            new = schema.field(field.name).type
+            fields.append(field if new == field.type else pa.field(field.name, _field_type(field.type, new)))
+        return pa.schema(fields)
+
+    def _rewrite(self, schema):
+        """Rewrite the batches written so far with a promoted schema"""
+        self._arrow_writer.close()
+        # Read into memory rather than memory-mapping, as the file is written over next
+        with pa.OSFile(self._tmp_path, 'rb') as source:
+            written = pa.ipc.open_file(source).read_all()
+        written = written.cast(schema)
+        self._arrow_writer = pa.ipc.new_file(self._tmp_path, schema)
+        self._arrow_writer.write_table(written)
+        self._schema = schema
+
+    def append(self, df):
+        mode, header = ('w', True) if self._chunks == 0 else ('a', False)
+        df.to_csv(self.csv_path, mode=mode, header=header, index=False)
+        if pa is not None:
+            table = _arrow_table(df)
+            if self._arrow_writer is None:
+                self._schema = table.schema
+                self._arrow_writer = pa.ipc.new_file(self._tmp_path, self._schema)
+            else:
+                table = table.select(self._schema.names)
+                schema = self._promote(table.schema)
+                if not schema.equals(self._schema):
+                    # The first chunk's pandas metadata no longer describes the promoted columns
+                    self._rewrite(schema.remove_metadata())
+                table = table.cast(self._schema)
+            self._arrow_writer.write_table(table)
+        else:
+            self._npz_chunks.append(df)
+        self._chunks += 1
+
+    def close(self):
+        if pa is not None:
+            if self._arrow_writer is None:
+                return
+            self._arrow_writer.close()
+            os.replace(self._tmp_path, binary_path(self.csv_path))
+        elif self._npz_chunks:
+            write_table(pd.concat(self._npz_chunks, ignore_index=True), self.csv_path)
+            self._npz_chunks = []
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        if exc_type is None:
+            self.close()
+        elif self._arrow_writer is not None:
+            self._arrow_writer.close()
+            os.remove(self._tmp_path)
+
+
+_digests = {}
+
+
+def file_digest(path):
+    """
+    SHA-1 of a file's content, remembered per (path, size, mtime) so unchanged files are hashed once
+    """
+    stat = os.stat(path)
+    key = (path, stat.st_size, stat.st_mtime_ns)
+    if key not in _digests:
+        digest = hashlib.sha1()
+        with open(path, 'rb') as file:
+            for block in iter(lambda: file.read(1 << 20), b''):
+                digest.update(block)
+        _digests[key] = digest.hexdigest()
+    return _digests[key]
@@ -0,0 +1,69 @@
+# Description: Compact storage of simulated networks. Each network is kept as the sorted int32 codes
+# tail * size + head of the dyads where it differs from the observed network, and all draws of a
+# simulation share one .npy file that is memory-mapped on reading, so one draw loads without reading
+# the others and without R.
+#
+# File layout, one int32 array: [size, observed ties, draws], the draws + 1 offsets of each draw's
+# changes, the observed ties, then the changes of every draw one after the other.
+
+import numpy as np
+
+# Store of a simulation's draws, in its job folder
+DRAWS_FILE = "simulated_networks.npy"
+
+HEADER = 3
+
+
+def delta(observed, ties):
+    """Dyads where a network differs from the observed one, both given as sorted unique codes"""
+    return np.setxor1d(observed, ties, assume_unique=True)
+
+
+def save_draws(path, size, observed, draws):
+    """
+    :param size: Number of nodes
+    :param observed: Ties of the observed network as codes tail * size + head
+    :param draws: Ties of each simulated network, as the same codes
+    """
+    if size * size > np.iinfo(np.int32).max:
+        raise ValueError(f"A network of {size} nodes is too large for the draw store")
+    observed = np.unique(np.asarray(observed, dtype=np.int64))
+    changes = [delta(observed, np.unique(np.asarray(ties, dtype=np.int64))) for ties in draws]
+    offsets = np.cumsum([0] + [len(change) for change in changes])
+    if offsets[-1] > np.iinfo(np.int32).max:
+        raise ValueError("Too many simulated ties for the draw store")
+    np.save(path, np.concatenate([
+        [size, len(observed), len(changes)], offsets, observed, *changes
+    ]).astype(np.int32))
+
+
+class DrawStore:
+    """Read-only view of the draws saved by save_draws; nothing is read until a draw is asked for"""
+
+    def __init__(self, path):
+        self._data = np.load(path, mmap_mode='r')
+        self.size, n_observed, self.draws = (int(value) for value in self._data[:HEADER])
+        self._offsets = self._data[HEADER:HEADER + self.draws + 1]
+        start = HEADER + self.draws + 1
+        self.observed = np.asarray(self._data[start:start + n_observed], dtype=np.int64)
+        self._changes = self._data[start + n_observed:]
+
+    def __len__(self):
+        return self.draws
+
+    def changes(self, index):
+        """Codes of the dyads where draw index, from 0, differs from the observed network"""
+        return np.asarray(self._changes[self._offsets[index]:self._offsets[index + 1]], dtype=np.int64)
+
+    def ties(self, index):
+        """Ties of draw index as sorted codes tail * size + head"""
+        return delta(self.observed, self.changes(index))
+
+    def summary(self, index):
+        """
+        :return: Dict with the number of ties of a draw and of ties added to and removed from the observed network
+        """
+        changes = self.changes(index)
+        removed = np.isin(changes, self.observed, assume_unique=True).sum()
+        return {'ties': len(self.observed) + len(changes) - 2 * int(removed),
+                'added': len(changes) - int(removed), 'removed': int(removed)}
@@ -0,0 +1,132 @@
+import math
+
+import numpy as np
+
+# z-score of the reported confidence intervals
+Z_95 = 1.96
+
+
+def connected_components(graph):
+    """
+    Connected component label of every node of an undirected CSRGraph, computed
+    with vectorized min-label propagation and pointer jumping over the edge arrays
+    :return: Array holding the smallest node position of each node's component
+    """
+    labels = np.arange(graph.num_nodes)
+    sources = graph.sources()
+    while True:
+        new_labels = labels.copy()
+        np.minimum.at(new_labels, sources, labels[graph.indices])
+        new_labels = new_labels[new_labels]
+        if np.array_equal(new_labels, labels):
+            return labels
+        labels = new_labels
+
+
+def _eccentricity(graph, node):
+    distances = graph.bfs_distances(node)
+    return distances, int(distances.max())
+
+
+def component_diameter(graph, start, max_bfs=50):
+    """
+    Diameter bounds of the component containing start, using a double sweep for the
+    first bounds and iFUB to close the gap while the BFS budget lasts
+    :param graph: Undirected CSRGraph
+    :param start: A node of the component, ideally of high degree
+    :param max_bfs: Maximum number of BFS runs
+    :return: (lower bound, upper bound), equal when the diameter is exact
+    """
+    # Double sweep: the farthest node from the start, then the farthest node from that one
+    distances, ecc_start = _eccentricity(graph, start)
+    a = int(np.argmax(distances))
+    dist_a, ecc_a = _eccentricity(graph, a)
+    b = int(np.argmax(dist_a))
+    dist_b, ecc_b = _eccentricity(graph, b)
+    lower = max(ecc_start, ecc_a, ecc_b)
+    upper = min(2 * ecc_start, 2 * ecc_a, 2 * ecc_b)
+    bfs_runs = 3
+
+    # iFUB from a node in the middle of the a-b path, which has a small eccentricity
+    half = ecc_a // 2
+    middle = np.flatnonzero((dist_a == half) & (dist_b == ecc_a - half))
+    root = int(middle[0]) if len(middle) else start
+    levels, ecc_root = _eccentricity(graph, root)
+    bfs_runs += 1
+    upper = min(upper, 2 * ecc_root)
+    lower = max(lower, ecc_root)
+
+    level = ecc_root
+    while lower < upper and level > 0:
+        for node in np.flatnonzero(levels == level):
+            if bfs_runs >= max_bfs:
+                return lower, upper
+            lower = max(lower, _eccentricity(graph, int(node))[1])
+            bfs_runs += 1
+        # Every node below this level has eccentricity at most 2 * (level - 1)
+        upper = min(upper, max(lower, 2 * (level - 1)))
+        level -= 1
+    return lower, max(lower, upper)
+
+
+def estimate_diameter(graph, max_bfs=50):
+    """
+    Largest finite shortest path length over all connected components of an undirected CSRGraph
+    :return: Dict with the lower and upper bound and the number of components
+    """
+    labels = connected_components(graph)
+    component_ids, sizes = np.unique(labels, return_counts=True)
+    # Nodes grouped by component, in the order of component_ids
+    members_by_component = np.split(np.argsort(labels, kind='stable'), np.cumsum(sizes)[:-1])
+    degree = graph.out_degree()
+    lower = upper = 0
+    for i in np.argsort(-sizes, kind='stable'):
+        # A component cannot have a longer path than it has nodes
+        if sizes[i] - 1 <= lower:
+            break
+        members = members_by_component[i]
+        start = int(members[np.argmax(degree[members])])
+        component_lower, component_upper = component_diameter(graph, start, max_bfs)
+        lower = max(lower, component_lower)
+        upper = max(upper, min(component_upper, sizes[i] - 1))
+    return {'lower': lower, 'upper': max(lower, upper), 'components': len(component_ids)}
+
+
+def estimate_average_path_length(graph, samples=200, seed=33):
+    """
+    Average shortest path length over all connected pairs of an undirected CSRGraph.
+    BFS sources are drawn with probability proportional to the number of other nodes in
+    their component, so every connected pair is equally likely to be counted. When there
+    are no more candidate sources than samples, every source is used and the result is exact.
+    :param samples: Number of BFS sources
+    :return: Dict with the estimate, the half width of its 95% confidence interval,
+             the number of BFS sources used and the number of components
+    """
+    labels = connected_components(graph)
+    component_ids, inverse, sizes = np.unique(labels, return_inverse=True, return_counts=True)
+    others = (sizes - 1)[inverse]
+    candidates = np.flatnonzero(others > 0)
+    if len(candidates) == 0:
+        return {'mean': 0.0, 'error': 0.0, 'sources': 0, 'components': len(component_ids)}
+
+    exact = len(candidates) <= samples
+    if exact:
+        sources = candidates
+    else:
+        weights = others[candidates] / others[candidates].sum()
+        sources = np.random.default_rng(seed).choice(candidates, samples, replace=True, p=weights)
+
+    # Mean distance from each source to the other nodes of its component
+    source_means = np.empty(len(sources))
+    for i, source in enumerate(sources):
+        distances = graph.bfs_distances(int(source))
+        source_means[i] = distances[distances > 0].sum() / others[source]
+
+    if exact:
+        mean = np.average(source_means, weights=others[sources])
+        error = 0.0
+    else:
+        mean = source_means.mean()
+        error = Z_95 * source_means.std(ddof=1) / math.sqrt(len(sources))
+    return {'mean': float(mean), 'error': float(error), 'sources': len(sources),
+            'components': len(component_ids)}
@@ -0,0 +1,193 @@
+import collections
+import json
+import os
+import queue
+import signal
+import subprocess
+import sys
+import threading
+
+# Number of warm R worker processes, shared by queued fits and interactive simulation calls
+R_WORKERS = int(os.environ.get("STATNET33_R_WORKERS", "3"))
+# R console lines kept per worker for error messages
+STDERR_TAIL_LINES = 20
+
+
+class RWorkerError(Exception):
+    """An R task failed, or its worker process could not start or died"""
+
+
+class WarmWorker:
+    """
+    One `python -m pages.r_worker` process. The statnet libraries are loaded when it
+    starts, then it serves requests one at a time for as long as it lives.
+    """
+
+    def __init__(self):
+        self.process = subprocess.Popen(
+            [sys.executable, "-m", "pages.r_worker"],
+            stdin=subprocess.PIPE, stdout=subprocess.PIPE, stderr=subprocess.PIPE,
+            text=True, bufsize=1,
+            # Own process group, so stopping the worker also stops the R processes it started
+            start_new_session=True
+        )
+        self._log = None
+        self._log_lock = threading.Lock()
+        self._stderr_tail = collections.deque(maxlen=STDERR_TAIL_LINES)
+        threading.Thread(target=self._drain_stderr, daemon=True).start()
+        # Wait until the R session is ready
+        self._read_reply()
+
+    def _drain_stderr(self):
+        # R console output is appended to the log of the request being served
+        for line in self.process.stderr:
+            self._stderr_tail.append(line)
+            with self._log_lock:
+                if self._log is not None:
+                    self._log.write(line)
+                    self._log.flush()
+
+    def _read_reply(self):
+        line = self.process.stdout.readline()
+        if not line:
+            self.process.wait()
+            raise RWorkerError(f"R worker exited with code {self.process.returncode}:\n"
+                               + "".join(self._stderr_tail))
+        reply = json.loads(line)
+        if 'error' in reply:
+            raise RWorkerError(reply['error'])
+        return reply
+
+    def alive(self):
+        return self.process.poll() is None
+
+    def call(self, request, log_path=None):
+        """
+        Serve one request
+        :param request: Dict with the task name, its job folder and arguments
+        :param log_path: File the R console output of this request is appended to
+        :return: The task's result
+        """
+        with self._log_lock:
+            self._log = open(log_path, "a") if log_path else None
+        try:
+            try:
+                self.process.stdin.write(json.dumps(request) + "\n")
+                self.process.stdin.flush()
+            except OSError:
+                # The worker died, the reply read below reports how
+                pass
+            return self._read_reply()['result']
+        finally:
+            with self._log_lock:
+                if self._log is not None:
+                    self._log.close()
+                self._log = None
+
+    def stop(self):
+        """Kill the worker along with any R processes it started, such as PSOCK cluster nodes"""
+        if hasattr(os, "killpg"):
+            try:
+                os.killpg(self.process.pid, signal.SIGKILL)
+            except ProcessLookupError:
+                pass
+        else:
+            self.process.kill()
+
+
+class WorkerPool:
+    """
+    Pool of warm R workers. Workers are started on first use (or by warm_up) and
+    replaced when they die; call blocks until a worker is free.
+    """
+
+    def __init__(self, size=R_WORKERS):
+        self.size = size
+        self._idle = queue.Queue()
+        self._lock = threading.Lock()
+        self._started = 0
+        # Job folder -> worker currently serving it
+        self._busy = {}
+
+    def _reserve(self):
+        # Claim a slot for a new worker, if the pool is not full yet
+        with self._lock:
+            if self._started < self.size:
+                self._started += 1
+                return True
+            return False
+
+    def _spawn(self):
+        try:
+            return WarmWorker()
+        except (RWorkerError, OSError):
+            with self._lock:
+                self._started -= 1
+            raise
+
+    def _acquire(self):
+        while True:
+            try:
+                return self._idle.get_nowait()
+            except queue.Empty:
+                pass
+            if self._reserve():
+                return self._spawn()
+            try:
+                # Check again now and then, a dead worker frees its slot without returning
+                return self._idle.get(timeout=1)
+            except queue.Empty:
+                continue
+
+    def _release(self, worker):
+        if worker.alive():
+            self._idle.put(worker)
+        else:
+            with self._lock:
+                self._started -= 1
+
+    def call(self, task, args, job_dir, log_path=None):
+        """
+        Run a task of pages.r_worker.TASKS in a warm worker
+        :param task: Task name
+        :param args: JSON-serialisable keyword arguments of the task
+        :param job_dir: Folder the task reads and writes its files in
+        :param log_path: File the R console output is appended to
+        :return: The task's result
+        :raises RWorkerError: When the task fails in R or the worker dies
+        """
+        worker = self._acquire()
+        with self._lock:
+            self._busy[job_dir] = worker
+        try:
+            return worker.call({'task': task, 'job_dir': job_dir, 'args': args}, log_path)
+        finally:
+            with self._lock:
+                self._busy.pop(job_dir, None)
+            self._release(worker)
+
+    def cancel(self, job_dir):
+        """
+        Stop the task running for a job folder by killing its worker, which the pool then replaces
+        :return: Whether a task was running for it in this process
+        """
+        with self._lock:
+            worker = self._busy.get(job_dir)
+        if worker is None:
+            return False
+        worker.stop()
+        return True
+
+    def warm_up(self):
+        """Start the missing workers in the background, so the first requests find them ready"""
+        def start_one():
+            try:
+                self._idle.put(self._spawn())
+            except (RWorkerError, OSError) as e:
+                print("R worker could not be started:", e)
+
+        while self._reserve():
+            threading.Thread(target=start_one, daemon=True).start()
+
+
+R_POOL = WorkerPool()
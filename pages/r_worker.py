@@ -0,0 +1,292 @@
+# Description: Long-lived worker process holding a warm R session for the Dash pages.
+# Started by pages/r_pool.py as `python -m pages.r_worker`. It sources pages/ergm_functions.R once,
+# so the statnet libraries are loaded once per worker, then answers one JSON request per line on
+# stdin with one JSON line on stdout. R console output goes to stderr, which the pool logs per job.
+# Results hold plain lists only; every file of a request stays inside its job directory.
+
+import json
+import os
+import sys
+
+import numpy as np
+import pandas as pd
+
+from pages.ergm_cache import ERGM_CACHE
+from pages.layout_cache import cached_plot, network_key, observed_layout, save_plot
+from pages.network_io import file_digest, read_table
+from pages.network_store import DRAWS_FILE, save_draws
+from pages.sim_stream import write_meta
+
+EDGES_PATH = "pages/data/network_edges.csv"
+ATTRIBUTES_PATH = "pages/data/network_data.csv"
+
+
+def to_list(value):
+    return np.array(value).tolist()
+
+
+def vertex_ids(values):
+    """Node ids as strings, with whole numbers such as 3.0 written as 3 so both tables agree"""
+    if pd.api.types.is_numeric_dtype(values) and (values.dropna() % 1 == 0).all():
+        values = values.astype('Int64')
+    return values.astype(str).astype(object)
+
+
+def network_frames():
+    """
+    Edge list and node attribute table of the current dataset, ready to be converted to R
+    :return: (edges, attributes) DataFrames; the first attribute column holds the node ids
+    """
+    edges = read_table(EDGES_PATH)
+    attrs = read_table(ATTRIBUTES_PATH)
+
+    source, target = edges.columns[:2]
+    edges = pd.DataFrame({source: vertex_ids(edges[source]), target: vertex_ids(edges[target])})
+    id_column = attrs.columns[0]
+    attrs[id_column] = vertex_ids(attrs[id_column])
+    attrs = attrs.drop_duplicates(subset=id_column, keep='last')
+
+    # Nodes that only appear in the edge list get missing attributes
+    endpoints = pd.unique(edges.to_numpy().ravel())
+    missing = endpoints[~np.isin(endpoints, attrs[id_column].to_numpy())]
+    if len(missing):
+        attrs = pd.concat([attrs, pd.DataFrame({id_column: missing})], ignore_index=True)
+
+    # Text columns go over as strings, missing text as empty strings like read.csv gives
+    for column in attrs.columns[1:]:
+        if not pd.api.types.is_numeric_dtype(attrs[column]):
+            attrs[column] = attrs[column].fillna('').astype(str).astype(object)
+    return edges, attrs
+
+
+def current_network():
+    """
+    The network of the current data files. The R session builds it once per dataset from
+    DataFrames passed in memory, so the CSV files are never parsed by R.
+    """
+    import rpy2.robjects as robjects
+    from rpy2.robjects import pandas2ri
+
+    key = file_digest(EDGES_PATH) + file_digest(ATTRIBUTES_PATH)
+    sn_network = robjects.globalenv['cached_network'](key)
+    if sn_network is not robjects.NULL:
+        return sn_network
+    edges, attrs = network_frames()
+    with robjects.conversion.localconverter(robjects.default_converter + pandas2ri.converter):
+        r_edgelist = pandas2ri.py2rpy(edges)
+        r_attr = pandas2ri.py2rpy(attrs)
+    return robjects.globalenv['cache_network'](key, r_edgelist, r_attr)
+
+
+def fit_ergm(job_dir, formula, control=None, warm_start=None):
+    """
+    Fit an ERGM and collect the parts shown on the ERGM page.
+    The fitted model is saved as ergm_results.rds in the job directory.
+    :param job_dir: Folder of the job
+    :param formula: Right-hand side of the model formula, e.g. 'edges + mutual'
+    :param control: MCMC settings, any of 'chains', 'samplesize', 'burnin' and 'gof_nsim'
+    :param warm_start: Cached fit to start from, as returned by ResultCache.find_warm_start.
+                       The fit starts cold when it has been evicted in the meantime.
+    :return: Dict with the formula, coefficient table, term names, GOF summary (None without GOF),
+             how the fit was warm-started (None when it was not) and the AIC and BIC
+    """
+    import rpy2.robjects as robjects
+    from rpy2.robjects import pandas2ri
+
+    settings = {name: int(value) for name, value in (control or {}).items()}
+    if warm_start is not None:
+        warm_start_path = os.path.join(job_dir, "warm_start.rds")
+        if ERGM_CACHE.copy_model(warm_start['key'], warm_start_path):
+            settings.update(warm_start=warm_start_path, gof_only=warm_start['gof_only'])
+
+    sn_network = current_network()
+    with robjects.conversion.localconverter(robjects.default_converter + pandas2ri.converter):
+        results = robjects.globalenv['fit_ergm'](sn_network, formula, job_dir, **settings)
+
+        model_gof = results['model_gof']
+        gof = None
+        if 'summary.model' in model_gof:
+            gof = {name: to_list(model_gof[name]) for name in ('obs.model', 'summary.model', 'pval.model')}
+
+        return {
+            'model_formula': str(results['model_formula']),
+            'model_coefficients': to_list(results['model_coefficients']),
+            'term_names': [str(term) for term in results['term_names']],
+            'model_gof': gof,
+            'warm_start': None if results['warm_start'] is robjects.NULL else str(results['warm_start'][0]),
+            'aic': float(results['aic'][0]),
+            'bic': float(results['bic'][0]),
+        }
+
+
+def fit_mple(job_dir, formula):
+    """
+    Maximum pseudo-likelihood estimate for formulas pages/mple.py cannot fit itself
+    :return: Dict in the form of fit_ergm's result, without goodness-of-fit
+    """
+    import rpy2.robjects as robjects
+    from rpy2.robjects import pandas2ri
+
+    sn_network = current_network()
+    with robjects.conversion.localconverter(robjects.default_converter + pandas2ri.converter):
+        results = robjects.globalenv['fit_mple'](sn_network, formula)
+        return {
+            'model_formula': str(results['model_formula']),
+            'model_coefficients': to_list(results['model_coefficients']),
+            'term_names': [str(term) for term in results['term_names']],
+            'model_gof': None,
+            'estimate': 'MPLE',
+        }
+
+
+def original_network(model_path):
+    """
+    The network a model was fitted to, with its node positions and original plot from the layout cache
+    :return: Dict with the node ids, the observed ties as codes tail * size + head, the cache key,
+             the positions as an R matrix for plot(coord = ...) and the cached plot (None before it is drawn)
+    """
+    import rpy2.robjects as robjects
+
+    network = robjects.globalenv['observed_network'](model_path)
+    node_ids = [str(node) for node in network.rx2('node_ids')]
+    observed_ties = np.asarray(network.rx2('observed_ties'), dtype=np.int64)
+    key = network_key(len(node_ids), observed_ties)
+    positions = observed_layout(len(node_ids), observed_ties)
+    return {
+        'node_ids': node_ids,
+        'observed_ties': observed_ties,
+        'key': key,
+        'coord': robjects.r['matrix'](robjects.FloatVector(positions.ravel(order='F').tolist()), ncol=2),
+        'plot': cached_plot(key),
+    }
+
+
+def simulate(job_dir, model_path, num_simulations):
+    """
+    Simulate networks from a fitted model, saved in the draw store of pages/network_store.py in the job directory
+    :return: Dict with the summary lines, the observed vs simulated statistics, the original network plot,
+             the node ids and the statistics of each draw
+    """
+    import rpy2.robjects as robjects
+    from rpy2.robjects import pandas2ri
+
+    original = original_network(model_path)
+    with robjects.conversion.localconverter(robjects.default_converter + pandas2ri.converter):
+        simulation = robjects.globalenv['simulate_ergm'](model_path, int(num_simulations), job_dir,
+                                                         coord=original['coord'],
+                                                         plot_original=original['plot'] is None)
+        stats_df = robjects.r['as.data.frame'](simulation['stats_df'])
+        node_ids = original['node_ids']
+        save_draws(os.path.join(job_dir, DRAWS_FILE), len(node_ids), original['observed_ties'],
+                   [np.asarray(ties) for ties in simulation['simulated_ties']])
+        if original['plot'] is None:
+            original['plot'] = str(simulation['base64_original_plot'][0])
+            save_plot(original['key'], original['plot'])
+        return {
+            'summary_output': [str(line) for line in simulation['summary_output']],
+            'stats': {
+                'index': [str(name) for name in stats_df.index],
+                'columns': [str(name) for name in stats_df.columns],
+                'data': to_list(stats_df),
+            },
+            'original_plot': original['plot'],
+            'node_ids': node_ids,
+            'statistics': to_list(simulation['statistics']),
+        }
+
+
+def simulate_stream(job_dir, model_path, num_simulations, seed):
+    """
+    Simulate networks one at a time, streaming the statistics of each draw to the job directory
+    for pages/sim_stream.py to read. The networks are not kept; plot_streamed_network regenerates them.
+    :param seed: Seed of R's random numbers, below 2^31 - 1
+    :return: Dict with the number of networks drawn
+    """
+    import rpy2.robjects as robjects
+    from rpy2.robjects import pandas2ri
+
+    original = original_network(model_path)
+    with robjects.conversion.localconverter(robjects.default_converter + pandas2ri.converter):
+        setup = robjects.globalenv['stream_setup'](model_path, coord=original['coord'],
+                                                   plot_original=original['plot'] is None)
+        if original['plot'] is None:
+            original['plot'] = str(setup['base64_original_plot'][0])
+            save_plot(original['key'], original['plot'])
+        write_meta(job_dir, {
+            'engine': 'r',
+            'term_names': [str(term) for term in setup['term_names']],
+            'observed': to_list(setup['observed']),
+            'counts': [int(num_simulations)],
+            'seeds': [int(seed)],
+            'model_path': model_path,
+            'original_plot': original['plot'],
+            'node_ids': original['node_ids'],
+            'observed_ties': original['observed_ties'].tolist(),
+        })
+        robjects.globalenv['simulate_stream'](model_path, int(num_simulations), job_dir, int(seed))
+    return {'drawn': int(num_simulations)}
+
+
+def plot_streamed_network(job_dir, model_path, seed, draw, plot=True):
+    """
+    Summary and plot of one network of a streamed simulation
+    :param draw: Number of the draw, from 1
+    :param plot: False when the page draws the network from its ties
+    :return: Dict with the summary lines, the ties as codes tail * size + head and the base64 PNG plot
+             (None without plot)
+    """
+    import rpy2.robjects as robjects
+    from rpy2.robjects import pandas2ri
+
+    # The draw is plotted at the positions of the original network
+    coord = original_network(model_path)['coord'] if plot else robjects.NULL
+    with robjects.conversion.localconverter(robjects.default_converter + pandas2ri.converter):
+        output = robjects.globalenv['plot_streamed_network'](model_path, int(seed), int(draw), job_dir,
+                                                             plot=bool(plot), coord=coord)
+        return {
+            'summary_output': [str(line) for line in output['summary_output']],
+            'ties': to_list(output['ties']),
+            'plot': str(output['base64_plot'][0]) if plot else None,
+        }
+
+
+# Tasks a request can ask for, by name
+TASKS = {
+    'fit_ergm': fit_ergm,
+    'fit_mple': fit_mple,
+    'simulate': simulate,
+    'simulate_stream': simulate_stream,
+    'plot_streamed_network': plot_streamed_network,
+}
+
+
+def serve():
+    # Keep the real stdout for replies and send everything else written to it, R included, to stderr
+    replies = os.fdopen(os.dup(1), 'w')
+    os.dup2(2, 1)
+    sys.stdout = sys.stderr
+
+    def reply(message):
+        replies.write(json.dumps(message) + '\n')
+        replies.flush()
+
+    try:
+        import rpy2.robjects as robjects
+        robjects.r.source("pages/ergm_functions.R")
+    except Exception as e:
+        reply({'error': f"The R session could not be started: {e}"})
+        return
+    reply({'ready': True})
+
+    for line in sys.stdin:
+        request = json.loads(line)
+        try:
+            output = {'result': TASKS[request['task']](request['job_dir'], **request['args'])}
+        except Exception as e:
+            # R errors are reported to the page, which explains the common ones
+            output = {'error': str(e)}
+        reply(output)
+
+
+if __name__ == '__main__':
+    serve()
@@ -0,0 +1,59 @@
+import os
+
+import numpy as np
+
+from pages.ergm_jobs import read_json, write_json
+
+# Description of a streamed simulation, written to its job folder before the first draw
+STREAM_META = "stream.json"
+
+
+def stream_path(simulation_dir, chain):
+    """File the statistics of one chain's draws are appended to, one row of float64 per draw"""
+    return os.path.join(simulation_dir, f"stats_{chain}.bin")
+
+
+def error_path(simulation_dir, chain):
+    return os.path.join(simulation_dir, f"error_{chain}.txt")
+
+
+def write_meta(simulation_dir, meta):
+    """
+    :param meta: Dict with at least the 'engine', the 'term_names', the 'observed' statistics,
+                 the number of draws of each chain as 'counts' and the chains' 'seeds'
+    """
+    write_json(os.path.join(simulation_dir, STREAM_META), meta)
+
+
+def append_draw(file, statistics):
+    file.write(np.asarray(statistics, dtype=np.float64).tobytes())
+    file.flush()
+
+
+def read_stream(simulation_dir):
+    """
+    Draws of a streamed simulation so far
+    :return: The meta dict with 'statistics', a list holding each chain's draws x terms array,
+             'drawn', 'done' and 'error' (None without errors) added; None before the meta is written
+    """
+    meta = read_json(os.path.join(simulation_dir, STREAM_META))
+    if meta is None:
+        return None
+    terms = len(meta['term_names'])
+    meta['statistics'] = []
+    errors = []
+    for chain in range(len(meta['counts'])):
+        try:
+            values = np.fromfile(stream_path(simulation_dir, chain), dtype=np.float64)
+        except OSError:
+            values = np.empty(0)
+        # A row being written is left for the next read
+        rows = len(values) // terms if terms else 0
+        meta['statistics'].append(values[:rows * terms].reshape(rows, terms))
+        if os.path.exists(error_path(simulation_dir, chain)):
+            with open(error_path(simulation_dir, chain)) as file:
+                errors.append(file.read())
+    meta['drawn'] = sum(len(rows) for rows in meta['statistics'])
+    meta['done'] = meta['drawn'] >= sum(meta['counts'])
+    meta['error'] = '\n'.join(errors) or None
+    return meta
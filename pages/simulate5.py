@@ -1,13 +1,26 @@
 import base64
+import os
+import random
 from io import BytesIO
 
 import dash
+import dash_cytoscape as cyto
+import numpy as np
+import pandas as pd
 import plotly.express as px
-import rpy2.robjects as robjects
+import plotly.graph_objects as go
 from dash import dcc, html
 from dash.dependencies import Input, Output, State
 from PIL import Image
-from rpy2.robjects import pandas2ri
+
+from pages.ergm_cache import MODEL_FILE
+from pages.ergm_jobs import CANCELLED, ERGM_JOBS, FAILED
+from pages.ergm_sim import MCMC_BURNIN, MCMC_INTERVAL, SIMULATION_CHAINS, regenerate_draw, simulate, start_stream
+from pages.layout_cache import observed_layout
+from pages.mple import UnsupportedTerm
+from pages.network_store import DRAWS_FILE, DrawStore, save_draws
+from pages.r_pool import R_POOL, RWorkerError
+from pages.sim_stream import read_stream
 
 dash.register_page(
     __name__,
@@ -17,6 +30,32 @@ dash.register_page(
     order=4
 )
 
+# Model shipped with the app, simulated until the session has fitted its own
+DEFAULT_MODEL_PATH = "dump/ergm_results.rds"
+# Statistics and node ids of a simulation's draws, next to their draw store
+DRAWS_INFO_FILE = "simulated_networks_info.npz"
+
+# Size in pixels of the preset Cytoscape layout, which scales the spring layout's positions
+CYTOSCAPE_SCALE = 300
+CYTOSCAPE_STYLESHEET = [
+    {'selector': 'node', 'style': {'width': 8, 'height': 8, 'background-color': 'lightblue',
+                                   'border-width': 0.5, 'border-color': 'black'}},
+    {'selector': 'node:selected', 'style': {'label': 'data(label)', 'font-size': 10}},
+    {'selector': 'edge', 'style': {'width': 0.7, 'line-color': 'gray', 'curve-style': 'straight',
+                                   'target-arrow-shape': 'triangle', 'target-arrow-color': 'gray',
+                                   'arrow-scale': 0.5}},
+]
+SHOWN = {'height': '600px', 'width': '100%'}
+HIDDEN = {'display': 'none'}
+
+
+# Message shown in place of the results when the R worker reports an error
+def render_error(message):
+    return html.Div([
+        html.H3("Error Occurred", className="text-danger"),
+        html.P(f"An error occurred while running the simulation: {message}")
+    ], className="alert alert-danger")
+
 # Define the layout of the app
 def layout():
     return html.Div([
@@ -27,7 +66,23 @@ def layout():
             html.Label('Number of Simulations'),
             dcc.Input(id='num-simulations', type='number', value=10, min=1, step=1),
             html.Button('Run Simulation', id='simulate-button', n_clicks=0),
-            dcc.Dropdown(id='simulated-network-dropdown')
+            dcc.RadioItems(
+                id='simulation-engine',
+                options=[{'label': ' R (ergm simulate)', 'value': 'r'},
+                         {'label': ' Python sampler', 'value': 'python'}],
+                value='r', inline=True, style={'marginTop': '5px'}
+            ),
+            dcc.Checklist(
+                id='simulation-stream',
+                options=[{'label': ' Show each network as it is drawn, keeping only the ones selected',
+                          'value': 'stream'}],
+                value=['stream'], style={'marginTop': '5px'}
+            ),
+            dcc.Dropdown(id='simulated-network-dropdown'),
+            # Job id of the folder holding this page's simulated networks
+            dcc.Store(id='simulation-job'),
+            # Reads the draws of a streamed simulation until it is done
+            dcc.Interval(id='simulation-poll', interval=1000, disabled=True)
         ]),
         html.Div(id='observed-vs-simulated'),
         html.Div([
@@ -38,7 +93,15 @@ def layout():
             ], style={'width': '50%', 'display': 'inline-block', 'vertical-align': 'top'}),
             html.Div([
                 html.H3('Simulated Network'),
-                dcc.Graph(id='individual-network-plot', style={'height': '600px'}),
+                dcc.RadioItems(
+                    id='network-render',
+                    options=[{'label': ' Interactive (Cytoscape)', 'value': 'cytoscape'},
+                             {'label': ' Plot', 'value': 'figure'}],
+                    value='cytoscape', inline=True
+                ),
+                dcc.Graph(id='individual-network-plot', style=HIDDEN),
+                cyto.Cytoscape(id='individual-network-cytoscape', layout={'name': 'preset'}, elements=[],
+                               stylesheet=CYTOSCAPE_STYLESHEET, style=SHOWN),
                 html.Div(id='individual-network-summary')
             ], style={'width': '50%', 'display': 'inline-block', 'vertical-align': 'top'})
         ])
@@ -49,29 +112,53 @@ def layout():
     [Output('observed-vs-simulated', 'children'),
      Output('original-network-plot', 'figure'),
      Output('simulation-summary', 'children'),
-     Output('simulated-network-dropdown', 'options')],
+     Output('simulated-network-dropdown', 'options'),
+     Output('simulation-job', 'data'),
+     Output('simulation-poll', 'disabled')],
     [Input('simulate-button', 'n_clicks')],
-    [State('num-simulations', 'value')]
+    [State('num-simulations', 'value'),
+     State('current-model', 'data'),
+     State('simulation-engine', 'value'),
+     State('simulation-stream', 'value')]
 )
-def run_simulation(n_clicks, num_simulations):
+def run_simulation(n_clicks, num_simulations, model_id, engine='r', stream=None):
     if n_clicks == 0:
-        return dash.no_update, dash.no_update, dash.no_update, dash.no_update
-
-    # Write the number of simulations to a text file
-    with open('dump/num_simulations.txt', 'w') as file:
-        file.write(str(num_simulations))
-
-    with robjects.conversion.localconverter(robjects.default_converter + pandas2ri.converter):
-        # Source the R script to run the simulation
-        robjects.r.source("pages/simulate_model.R")
-        
-        # Read the simulated networks and summary from the RDS file
-        simulated_data = robjects.r.readRDS('dump/simulated_networks.rds')
-        summary_output = simulated_data["summary_output"]
-        stats_df = robjects.r['as.data.frame'](simulated_data["stats_df"])
-        
-        # Get the base64-encoded original network plot from the R script
-        base64_original_plot = robjects.r('base64_original_plot')[0]
+        return (dash.no_update,) * 6
+
+    # Simulate from the session's last fit, each run in its own folder
+    model_dir = ERGM_JOBS.find_job_dir(model_id)
+    model_path = os.path.join(model_dir, MODEL_FILE) if model_dir else DEFAULT_MODEL_PATH
+
+    if engine == 'python' and model_dir is None:
+        return (render_error("The Python sampler simulates models fitted in this session, please run an ERGM fit first."),
+                *(dash.no_update,) * 5)
+    if stream and engine == 'python':
+        return start_python_stream(model_dir, num_simulations)
+    if stream:
+        # The R job's folder is the simulation's folder; the seed lets any draw be regenerated
+        simulation_id = ERGM_JOBS.submit('simulate_stream', {'model_path': model_path,
+                                                             'num_simulations': num_simulations,
+                                                             'seed': random.randrange(1, 2 ** 31 - 1)})
+        return (html.P("Waiting for an R worker…"), go.Figure(), None, [], simulation_id, False)
+
+    simulation_id, simulation_dir = ERGM_JOBS.new_job_dir()
+    if engine == 'python':
+        return (*run_python_simulation(model_dir, num_simulations, simulation_id, simulation_dir), True)
+
+    # Run the simulation in a warm R worker
+    try:
+        simulation = R_POOL.call('simulate', {'model_path': model_path, 'num_simulations': num_simulations},
+                                 simulation_dir, log_path=os.path.join(simulation_dir, 'log.txt'))
+    except RWorkerError as e:
+        return render_error(str(e)), *(dash.no_update,) * 4, True
+    summary_output = simulation['summary_output']
+    stats_df = pd.DataFrame(simulation['stats']['data'], index=simulation['stats']['index'],
+                            columns=simulation['stats']['columns'])
+    save_draws_info(simulation_dir, stats_df.columns, simulation['node_ids'], stats_df.loc['obs'],
+                    simulation['statistics'])
+
+    # Get the base64-encoded original network plot from the R worker
+    base64_original_plot = simulation['original_plot']
 
     # Decode the base64-encoded original network plot
     original_img_data = base64.b64decode(base64_original_plot.split(',')[1])
@@ -98,82 +185,271 @@ def run_simulation(n_clicks, num_simulations):
     options = [{'label': f'Simulated Network {i}', 'value': i} for i in range(1, num_simulations + 1)]
 
     return [
-        html.Div([
-            html.H3('Observed vs Simulated Mean Statistics'),
-            html.Table([
-                html.Thead(
-                    html.Tr([
-                        html.Th('Statistic'),  # Column for row names
-                        *[html.Th(col) for col in stats_df.columns]
-                    ])
-                ),
-                html.Tbody([
-                    html.Tr([
-                        html.Td(stats_df.index[i]),  # Row name
-                        *[html.Td(stats_df.iloc[i][col]) for col in stats_df.columns]
-                    ])
-                    for i in range(len(stats_df))
-                ])
-            ])
-        ]),
+        render_statistics(stats_df),
         original_fig,
         html.Div([
             html.H3('Simulation Summary'),
             html.Pre('\n'.join(summary_output))
         ]),
-        options
+        options,
+        simulation_id,
+        True
     ]
 
-# Callback to update the individual network summary and plot
-@dash.callback(
-    [Output('individual-network-summary', 'children'),
-     Output('individual-network-plot', 'figure')],
-    [Input('simulated-network-dropdown', 'value')],
-    prevent_initial_call=True
-)
-def update_individual_network(selected_network):
-    if selected_network is None:
-        return dash.no_update, dash.no_update
-    
-    with robjects.conversion.localconverter(robjects.default_converter + pandas2ri.converter):
-        # Get the summary of the selected individual simulated network
-        summary_output = robjects.r(f"capture.output(simulated_networks[[{selected_network}]])")
-        
-        # Write the number of simulations to a text file
-        with open('dump/selected_network.txt', 'w') as file:
-            file.write(str(selected_network))
-        
-        # Run the R script to generate the individual simulated network plot
-        robjects.r.source("pages/plot_network.R")
-        
-        # Get the base64-encoded individual simulated network plot from the R script
-        base64_simulated_plot = robjects.r('base64_plot')[0]
-    
-    # Decode the base64-encoded individual simulated network plot
-    simulated_img_data = base64.b64decode(base64_simulated_plot.split(',')[1])
-    
-    # Open the individual simulated network image using PIL
-    simulated_img = Image.open(BytesIO(simulated_img_data))
-    
-    # Convert the individual simulated network image to RGB mode if needed
-    if simulated_img.mode != "RGB":
-        simulated_img = simulated_img.convert("RGB")
-    
-    # Create a figure with the individual simulated network plot image
-    simulated_fig = px.imshow(simulated_img)
-    
-    # Customize the simulated figure layout
-    simulated_fig.update_layout(
+# Table of the observed and simulated mean statistics
+def render_statistics(stats_df):
+    return html.Div([
+        html.H3('Observed vs Simulated Mean Statistics'),
+        html.Table([
+            html.Thead(
+                html.Tr([
+                    html.Th('Statistic'),  # Column for row names
+                    *[html.Th(col) for col in stats_df.columns]
+                ])
+            ),
+            html.Tbody([
+                html.Tr([
+                    html.Td(stats_df.index[i]),  # Row name
+                    *[html.Td(stats_df.iloc[i][col]) for col in stats_df.columns]
+                ])
+                for i in range(len(stats_df))
+            ])
+        ])
+    ])
+
+# Plotly figure of a network drawn with fixed node positions
+def network_figure(ties, node_ids, positions, title):
+    size = len(node_ids)
+    tails, heads = np.divmod(np.asarray(ties, dtype=np.int64), size)
+    # One line trace for all ties, segments separated by gaps
+    x = np.full(len(ties) * 3, np.nan)
+    y = np.full(len(ties) * 3, np.nan)
+    x[0::3], x[1::3] = positions[tails, 0], positions[heads, 0]
+    y[0::3], y[1::3] = positions[tails, 1], positions[heads, 1]
+    figure = go.Figure([
+        go.Scatter(x=x, y=y, mode='lines', line={'color': 'gray', 'width': 0.7}, hoverinfo='skip'),
+        go.Scatter(x=positions[:, 0], y=positions[:, 1], mode='markers', text=[str(node) for node in node_ids],
+                   hoverinfo='text', marker={'size': 8, 'color': 'lightblue', 'line': {'color': 'black', 'width': 0.5}})
+    ])
+    figure.update_layout(
+        title=title, height=600, showlegend=False,
+        xaxis=dict(showticklabels=False, showgrid=False, zeroline=False),
+        yaxis=dict(showticklabels=False, showgrid=False, zeroline=False),
+        margin=dict(l=0, r=0, t=50, b=0)
+    )
+    return figure
+
+# Decode a base64 PNG plot from the R worker into a figure
+def image_figure(base64_plot):
+    image = Image.open(BytesIO(base64.b64decode(base64_plot.split(',')[1])))
+    if image.mode != "RGB":
+        image = image.convert("RGB")
+    figure = px.imshow(image)
+    figure.update_layout(
         height=600,
         xaxis=dict(showticklabels=False),
         yaxis=dict(showticklabels=False),
         margin=dict(l=0, r=0, t=50, b=0)
     )
-    
+    return figure
+
+# Start the Python sampler in the background; poll_simulation shows its draws as they come
+def start_python_stream(model_dir, num_simulations):
+    simulation_id, simulation_dir = ERGM_JOBS.new_job_dir()
+    try:
+        meta = start_stream(model_dir, num_simulations, simulation_dir)
+    except UnsupportedTerm as e:
+        return render_error(f"{e}. Use the R engine for this model."), *(dash.no_update,) * 4, True
+    return (html.P("Simulating…"), network_figure(meta['observed_ties'], meta['node_ids'], stream_positions(meta),
+                                                  'Original Network'),
+            None, [], simulation_id, False)
+
+# Running observed vs simulated means, summary and dropdown options of a streamed simulation so far
+def stream_view(stream):
+    statistics = np.concatenate(stream['statistics'])
+    total = sum(stream['counts'])
+    stats_df = pd.DataFrame([stream['observed'], statistics.mean(axis=0) if len(statistics) else
+                             np.full(len(stream['term_names']), np.nan)],
+                            index=['obs', 'sim mean'], columns=stream['term_names']).round(2)
+    if stream['engine'] == 'python':
+        method = (f"Python tie/no-tie sampler: {len(stream['counts'])} chain(s), "
+                  f"burn-in {stream['burnin']}, interval {stream['interval']}")
+    else:
+        method = "R ergm simulate, one network at a time"
+    summary_output = [method, f"{stream['drawn']} of {total} networks drawn"]
+    if stream['done'] and len(statistics):
+        summary_output += ['', pd.DataFrame(statistics, columns=stream['term_names']).describe().round(2).to_string()]
+
+    # Draws are numbered chain after chain; the value says where to find each one
+    options = []
+    for chain, rows in enumerate(stream['statistics']):
+        first = sum(stream['counts'][:chain])
+        options.extend({'label': f'Simulated Network {first + index + 1}', 'value': f'{chain}:{index}'}
+                       for index in range(len(rows)))
+    return (render_statistics(stats_df),
+            html.Div([html.H3('Simulation Summary'), html.Pre('\n'.join(summary_output))]),
+            options)
+
+# Callback to show the draws of a streamed simulation as they come in
+@dash.callback(
+    [Output('observed-vs-simulated', 'children', allow_duplicate=True),
+     Output('original-network-plot', 'figure', allow_duplicate=True),
+     Output('simulation-summary', 'children', allow_duplicate=True),
+     Output('simulated-network-dropdown', 'options', allow_duplicate=True),
+     Output('simulation-poll', 'disabled', allow_duplicate=True)],
+    [Input('simulation-poll', 'n_intervals')],
+    [State('simulation-job', 'data')],
+    prevent_initial_call=True
+)
+def poll_simulation(n_intervals, simulation_id):
+    simulation_dir = ERGM_JOBS.find_job_dir(simulation_id)
+    if simulation_dir is None:
+        return render_error("The simulation was not found."), *(dash.no_update,) * 3, True
+    stream = read_stream(simulation_dir)
+    # R simulations run as jobs, which may fail before or while drawing
+    job = ERGM_JOBS.status(simulation_id)
+    if job is not None and job['status'] in (FAILED, CANCELLED):
+        return render_error(job.get('error', 'The simulation was cancelled.')), *(dash.no_update,) * 3, True
+    if stream is None:
+        return (dash.no_update,) * 5
+    if stream['error']:
+        return render_error(stream['error']), *(dash.no_update,) * 3, True
+
+    statistics, summary, options = stream_view(stream)
+    # The R plot of the original network is sent once, with the last draws
+    original = image_figure(stream['original_plot']) if stream['done'] and stream['engine'] == 'r' else dash.no_update
+    return statistics, original, summary, options, stream['done']
+
+# Cytoscape elements of a network at fixed positions, nodes named by their position so edges stay small
+def cytoscape_elements(ties, node_ids, positions):
+    tails, heads = np.divmod(np.asarray(ties, dtype=np.int64), len(node_ids))
+    nodes = [{'data': {'id': str(i), 'label': str(node)}, 'position': {'x': x, 'y': y}}
+             for i, (node, (x, y)) in enumerate(zip(node_ids, np.round(positions * CYTOSCAPE_SCALE, 1).tolist()))]
+    edges = [{'data': {'source': str(tail), 'target': str(head)}} for tail, head in zip(tails.tolist(), heads.tolist())]
+    return nodes + edges
+
+# Outputs of update_individual_network for a network drawn from its ties, in the selected render mode
+def network_view(summary, ties, node_ids, positions, title, render):
+    if render == 'cytoscape':
+        return summary, dash.no_update, cytoscape_elements(ties, node_ids, positions), HIDDEN, SHOWN
+    return summary, network_figure(ties, node_ids, positions, title), [], SHOWN, HIDDEN
+
+# Node positions of a streamed simulation's observed network, from the layout cache
+def stream_positions(stream):
+    return observed_layout(len(stream['node_ids']), stream['observed_ties'])
+
+# Summary and plot of one draw of a streamed simulation, regenerated on demand
+def streamed_network_view(simulation_dir, stream, value, render):
+    chain, index = map(int, value.split(':'))
+    number = sum(stream['counts'][:chain]) + index + 1
+    title = f'Simulated Network {number}'
+    if stream['engine'] == 'python':
+        ties, statistics = regenerate_draw(simulation_dir, chain, index)
+        statistics = pd.Series(statistics, index=stream['term_names'])
+        summary = html.Div([
+            html.H3(f'{title} Summary'),
+            html.Pre(f"{len(ties)} ties\n\n{statistics.to_string()}")
+        ])
+        return network_view(summary, ties, stream['node_ids'], stream_positions(stream), title, render)
+    try:
+        plot = R_POOL.call('plot_streamed_network', {'model_path': stream['model_path'], 'seed': stream['seeds'][0],
+                                                     'draw': index + 1, 'plot': render != 'cytoscape'},
+                           simulation_dir, log_path=os.path.join(simulation_dir, 'log.txt'))
+    except RWorkerError as e:
+        return render_error(str(e)), *(dash.no_update,) * 4
+    summary = html.Div([
+        html.H3(f'{title} Summary'),
+        html.Pre('\n'.join(plot['summary_output']))
+    ])
+    if render == 'cytoscape':
+        return network_view(summary, plot['ties'], stream['node_ids'], stream_positions(stream),
+                            title, render)
+    return summary, image_figure(plot['plot']), [], SHOWN, HIDDEN
+
+# Simulate with the Python sampler and save the draws for the network dropdown
+def run_python_simulation(model_dir, num_simulations, simulation_id, simulation_dir):
+    try:
+        simulation = simulate(model_dir, num_simulations)
+    except UnsupportedTerm as e:
+        return render_error(f"{e}. Use the R engine for this model."), dash.no_update, dash.no_update, dash.no_update, dash.no_update
+    term_names = simulation['term_names']
+    node_ids = simulation['node_ids']
+    positions = observed_layout(len(node_ids), simulation['observed_ties'])
+
+    save_draws(os.path.join(simulation_dir, DRAWS_FILE), len(node_ids), simulation['observed_ties'], simulation['ties'])
+    save_draws_info(simulation_dir, term_names, node_ids, simulation['observed'], simulation['statistics'])
+
+    stats_df = pd.DataFrame([simulation['observed'], simulation['statistics'].mean(axis=0)],
+                            index=['obs', 'sim mean'], columns=term_names)
+    summary_output = [
+        f"Python tie/no-tie sampler: {num_simulations} networks from {min(SIMULATION_CHAINS, num_simulations)} chain(s), "
+        f"burn-in {MCMC_BURNIN}, interval {MCMC_INTERVAL}, acceptance rate {simulation['acceptance']:.3f}",
+        '',
+        pd.DataFrame(simulation['statistics'], columns=term_names).describe().round(2).to_string()
+    ]
+    options = [{'label': f'Simulated Network {i}', 'value': i} for i in range(1, num_simulations + 1)]
+
     return [
+        render_statistics(stats_df),
+        network_figure(simulation['observed_ties'], node_ids, positions, 'Original Network'),
         html.Div([
-            html.H3(f'Simulated Network {selected_network} Summary'),
+            html.H3('Simulation Summary'),
             html.Pre('\n'.join(summary_output))
         ]),
-        simulated_fig
-    ]
\ No newline at end of file
+        options,
+        simulation_id
+    ]
+
+# Save what the network dropdown shows besides the ties, for draws saved in the draw store
+def save_draws_info(simulation_dir, term_names, node_ids, observed, statistics):
+    np.savez(os.path.join(simulation_dir, DRAWS_INFO_FILE),
+             term_names=np.array([str(term) for term in term_names]), node_ids=np.array([str(node) for node in node_ids]),
+             observed=np.asarray(observed, dtype=float),
+             statistics=np.asarray(statistics, dtype=float).reshape(-1, len(term_names)))
+
+# Summary and plot of one network of the draw store, without R
+def stored_network_view(simulation_dir, selected_network, render):
+    store = DrawStore(os.path.join(simulation_dir, DRAWS_FILE))
+    index = selected_network - 1
+    ties = store.ties(index)
+    summary = store.summary(index)
+    with np.load(os.path.join(simulation_dir, DRAWS_INFO_FILE)) as info:
+        statistics = pd.Series(info['statistics'][index], index=info['term_names'])
+        node_ids = info['node_ids']
+    # Every draw is shown at the positions of the observed network, cached per network
+    positions = observed_layout(store.size, store.observed)
+    return network_view(
+        html.Div([
+            html.H3(f'Simulated Network {selected_network} Summary'),
+            html.Pre(f"{summary['ties']} ties, {summary['added']} added to and {summary['removed']} removed from "
+                     f"the observed network\n\n{statistics.to_string()}")
+        ]),
+        ties, node_ids, positions, f'Simulated Network {selected_network}', render
+    )
+
+# Callback to update the individual network summary and plot, or its Cytoscape elements
+@dash.callback(
+    [Output('individual-network-summary', 'children'),
+     Output('individual-network-plot', 'figure'),
+     Output('individual-network-cytoscape', 'elements'),
+     Output('individual-network-plot', 'style'),
+     Output('individual-network-cytoscape', 'style')],
+    [Input('simulated-network-dropdown', 'value'),
+     Input('network-render', 'value')],
+    [State('simulation-job', 'data')],
+    prevent_initial_call=True
+)
+def update_individual_network(selected_network, render, simulation_id):
+    simulation_dir = ERGM_JOBS.find_job_dir(simulation_id)
+    if selected_network is None or simulation_dir is None:
+        return (dash.no_update,) * 5
+
+    # Streamed draws are named chain:index and regenerated when selected
+    stream = read_stream(simulation_dir)
+    if stream is not None and isinstance(selected_network, str):
+        return streamed_network_view(simulation_dir, stream, selected_network, render)
+
+    # Networks of a simulation run to the end are read from its draw store
+    if not os.path.exists(os.path.join(simulation_dir, DRAWS_FILE)):
+        return render_error("The networks of this simulation are no longer available."), *(dash.no_update,) * 4
+    return stored_network_view(simulation_dir, selected_network, render)
\ No newline at end of file
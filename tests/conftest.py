@@ -0,0 +1,12 @@
+import os
+import sys
+
+import dash
+
+# The pages use paths relative to the repository root
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+os.chdir(ROOT)
+sys.path.insert(0, ROOT)
+
+# Page modules call dash.register_page on import, which needs an app using pages
+app = dash.Dash(__name__, use_pages=True, pages_folder='')
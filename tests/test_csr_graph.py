@@ -0,0 +1,44 @@
+import networkx as nx
+import numpy as np
+import pandas as pd
+
+from pages.csr_graph import CSRGraph
+
+
+def edge_frame():
+    return pd.DataFrame({'Source': [1, 1, 2, 3, 1], 'Target': [2, 3, 3, 1, 2], 'Weight': [0.1, 0.2, 0.3, 0.7, 0.9]})
+
+
+def test_construction_and_degrees():
+    graph = CSRGraph.from_frames(edge_frame())
+    assert list(graph.node_ids) == ['1', '2', '3']
+    assert graph.num_edges == 4
+    assert graph.out_degree().tolist() == [2, 1, 1]
+    assert graph.in_degree().tolist() == [1, 1, 2]
+    assert graph.degree().tolist() == [3, 2, 3]
+    # Repeated edges keep the last weight, as NetworkX does
+    assert graph.edge_weight(graph.index['1'], graph.index['2']) == 0.9
+
+    expected = nx.DiGraph()
+    expected.add_weighted_edges_from(
+        edge_frame().astype({'Source': str, 'Target': str}).itertuples(index=False))
+    assert nx.utils.graphs_equal(graph.to_networkx(), expected)
+
+
+def test_weights_are_not_rounded():
+    elements = CSRGraph.from_frames(edge_frame()).cytoscape_elements()
+    assert sorted(edge['data']['weight'] for edge in elements['edges']) == [0.2, 0.3, 0.7, 0.9]
+
+
+def test_missing_attribute_row_keeps_dtypes():
+    nodes = pd.DataFrame({'ID': [1, 2, 4], 'Age': [30, 41, 25], 'Member': [True, False, True],
+                          'Name': ['a', 'b', 'd']})
+    graph = CSRGraph.from_frames(edge_frame(), nodes)
+    assert list(graph.node_ids) == ['1', '2', '3', '4']
+
+    assert graph.node_attributes(graph.index['1']) == {'ID': 1, 'Age': 30, 'Member': True, 'Name': 'a'}
+    assert type(graph.node_attributes(graph.index['2'])['Age']) is int
+    # Node 3 only appears in the edges
+    assert graph.node_attributes(graph.index['3']) == {}
+    assert graph.cytoscape_elements()['nodes'][3]['data']['Age'] == 25
+    assert graph.to_networkx().nodes['4'] == {'ID': 4, 'Age': 25, 'Member': True, 'Name': 'd'}
@@ -0,0 +1,47 @@
+import os
+
+import pages.ergm_cache as ergm_cache
+from pages.ergm_cache import ResultCache, cache_key
+
+
+def set_last_use(cache, key, timestamp):
+    os.utime(os.path.join(cache.cache_dir, key, "result.json"), (timestamp, timestamp))
+
+
+def test_least_recently_used_fit_is_evicted(tmp_path):
+    cache = ResultCache(cache_dir=str(tmp_path))
+    cache.put('a', {'value': 'a' * 100})
+    cache.put('b', {'value': 'b' * 100})
+    set_last_use(cache, 'a', 1)
+    set_last_use(cache, 'b', 2)
+    # Reading a fit makes it the most recently used
+    assert cache.get('a') == {'value': 'a' * 100}
+
+    cache.max_bytes = 2 * os.path.getsize(tmp_path / 'a' / 'result.json')
+    cache.put('c', {'value': 'c' * 100})
+    assert sorted(os.listdir(tmp_path)) == ['a', 'c', 'stats.json']
+    assert cache.get('b') is None
+    assert ergm_cache.read_json(str(tmp_path / 'stats.json')) == {'hits': 1, 'misses': 1}
+
+
+def test_newest_fit_is_kept_beyond_the_limit(tmp_path):
+    cache = ResultCache(cache_dir=str(tmp_path), max_bytes=1)
+    cache.put('a', {'value': 1})
+    cache.put('b', {'value': 2})
+    assert cache.get('a') is None
+    assert cache.get('b') == {'value': 2}
+
+
+def test_cache_key_stability(tmp_path, monkeypatch):
+    key = cache_key('edges + nodematch("gender") + mutual', {'samplesize': 100, 'burnin': 10})
+    assert cache_key('mutual+edges +  nodematch( "gender" )+edges', {'burnin': 10, 'samplesize': 100}) == key
+    assert cache_key('edges + mutual', {'samplesize': 100, 'burnin': 10}) != key
+    assert cache_key('edges + nodematch("gender") + mutual', {'samplesize': 200, 'burnin': 10}) != key
+
+    edges_path = tmp_path / 'edges.csv'
+    edges_path.write_text('Source,Target\n1,2\n')
+    monkeypatch.setattr(ergm_cache, 'EDGES_PATH', str(edges_path))
+    before = cache_key('edges')
+    assert cache_key('edges') == before
+    edges_path.write_text('Source,Target\n1,2\n2,3\n')
+    assert cache_key('edges') != before
@@ -0,0 +1,46 @@
+import time
+
+import pages.ergm_jobs as ergm_jobs
+from pages.ergm_jobs import DONE, FAILED, JobQueue
+
+
+class ResultPool:
+    """Stands in for the R worker pool, answering every call with a fixed result"""
+
+    def __init__(self, result):
+        self.result = result
+
+    def call(self, task, args, job_dir, log_path=None):
+        return self.result
+
+    def cancel(self, job_dir):
+        pass
+
+
+def wait(queue, job_id):
+    for _ in range(100):
+        state = queue.status(job_id)
+        if state['status'] in (DONE, FAILED):
+            return state
+        time.sleep(0.05)
+    raise AssertionError("the job did not finish")
+
+
+def test_job_done(tmp_path, monkeypatch):
+    monkeypatch.setattr(ergm_jobs, 'R_POOL', ResultPool({'value': 1}))
+    queue = JobQueue(max_workers=1, jobs_dir=str(tmp_path))
+    state = wait(queue, queue.submit('fit_ergm', {'formula': 'edges'}))
+    assert state['status'] == DONE
+    assert state['result'] == {'value': 1}
+
+
+def test_failing_on_done_marks_the_job_failed(tmp_path, monkeypatch):
+    monkeypatch.setattr(ergm_jobs, 'R_POOL', ResultPool({'value': 1}))
+    queue = JobQueue(max_workers=1, jobs_dir=str(tmp_path))
+
+    def on_done(result, job_dir):
+        raise ValueError("unexpected result")
+
+    state = wait(queue, queue.submit('fit_ergm', {'formula': 'edges'}, on_done=on_done))
+    assert state['status'] == FAILED
+    assert state['error'] == "unexpected result"
@@ -0,0 +1,61 @@
+import itertools
+
+import numpy as np
+
+from pages.ergm_sim import Chain
+
+SIZE = 10
+GROUPS = [0, 1, 2, 0, 1, 2, 0, 1, 2, 0]
+COVARIATE = [0.5, 1.0, 2.0, 0.0, 1.5, 3.0, 0.5, 2.5, 1.0, 0.0]
+FACTOR = [1, 0, 0, 1, 1, 0, 0, 0, 1, 0]
+TERMS = [('edges', None), ('mutual', None), ('triangle', None), ('ttriple', None), ('ctriple', None),
+         ('isolates', None), ('idegree', 1), ('odegree', 0), ('nodecov', COVARIATE),
+         ('nodematch', GROUPS), ('nodefactor', FACTOR)]
+COEFFICIENTS = [-1.0, 0.5, 0.1, -0.1, 0.2, 0.3, 0.2, -0.2, 0.1, 0.4, -0.3]
+
+
+def recount(ties):
+    """Every statistic of TERMS for a network given as (tail, head) ties, counted from scratch"""
+    ties = set(ties)
+    transitive = sum((a, b) in ties and (b, c) in ties for a, c in ties for b in range(SIZE))
+    cyclic = sum((a, b) in ties and (b, c) in ties and (c, a) in ties
+                 for a, b, c in itertools.permutations(range(SIZE), 3)) // 3
+    in_degree = [sum(head == node for _, head in ties) for node in range(SIZE)]
+    out_degree = [sum(tail == node for tail, _ in ties) for node in range(SIZE)]
+    return [
+        len(ties),
+        sum((b, a) in ties for a, b in ties) // 2,
+        transitive + cyclic,
+        transitive,
+        cyclic,
+        sum(i + o == 0 for i, o in zip(in_degree, out_degree)),
+        in_degree.count(1),
+        out_degree.count(0),
+        sum(COVARIATE[a] + COVARIATE[b] for a, b in ties),
+        sum(GROUPS[a] == GROUPS[b] for a, b in ties),
+        sum(FACTOR[a] + FACTOR[b] for a, b in ties),
+    ]
+
+
+def decode(codes):
+    return [tuple(divmod(int(code), SIZE)) for code in codes]
+
+
+def test_chain_statistics_match_recounts():
+    rng = np.random.default_rng(7)
+    edges = [(i, j) for i, j in itertools.permutations(range(SIZE), 2) if rng.random() < 0.2]
+    # Repeated ties and loops of the input are ignored
+    chain = Chain(TERMS, COEFFICIENTS, SIZE, edges + edges[:3] + [(4, 4)], seed=3)
+    assert chain.observed == recount(edges)
+
+    for statistics in chain.draws(nsim=25, burnin=100, interval=40):
+        assert statistics == recount(decode(chain.ties()))
+    assert 0 < chain.accepted < chain.steps
+
+
+def test_same_seed_gives_the_same_draws():
+    edges = [(0, 1), (1, 2), (2, 0), (3, 4)]
+    first = Chain(TERMS, COEFFICIENTS, SIZE, edges, seed=5)
+    second = Chain(TERMS, COEFFICIENTS, SIZE, edges, seed=5)
+    assert list(first.draws(5, 50, 20)) == list(second.draws(5, 50, 20))
+    assert np.array_equal(first.ties(), second.ties())
@@ -0,0 +1,28 @@
+import io
+import json
+
+import pandas as pd
+
+from pages.home1 import read_json_chunks
+
+
+def read_all(data):
+    return pd.concat(list(read_json_chunks(io.BytesIO(data))), ignore_index=True)
+
+
+def test_compact_columnar_json():
+    data = json.dumps({'ID': [1, 2, 3], 'Name': ['a', 'b', 'c'], 'Relationship': ['2', '3', '1']}).encode()
+    df = read_all(data)
+    assert df['ID'].tolist() == [1, 2, 3]
+    assert df['Name'].tolist() == ['a', 'b', 'c']
+
+
+def test_single_record_json():
+    df = read_all(json.dumps([{'ID': 1, 'Name': 'a', 'Relationship': ''}]).encode())
+    assert df['ID'].tolist() == [1]
+
+
+def test_json_lines():
+    lines = [{'ID': i, 'Name': f'n{i}', 'Relationship': str(i + 1)} for i in range(5)]
+    df = read_all('\n'.join(json.dumps(line) for line in lines).encode())
+    assert df['ID'].tolist() == list(range(5))
@@ -0,0 +1,39 @@
+import numpy as np
+
+from pages.csr_graph import CSRGraph
+from pages.demos.editor.metrics import (DEFAULT_SAMPLE_SIZE, EXACT_NODE_LIMIT, NODE_METRICS,
+                                        approximate_betweenness, approximate_closeness,
+                                        resolve_sample_size)
+
+
+def strongly_connected_graph(size, extra_edges, seed=1):
+    """Directed cycle through every node plus random chords, so every node reaches every other"""
+    rng = np.random.default_rng(seed)
+    src = np.concatenate([np.arange(size), rng.integers(0, size, extra_edges)])
+    dst = np.concatenate([(np.arange(size) + 1) % size, rng.integers(0, size, extra_edges)])
+    keep = src != dst
+    pairs = np.unique(np.column_stack([src[keep], dst[keep]]), axis=0)
+    return CSRGraph.from_arrays(np.arange(size).astype(str).astype(object), pairs[:, 0], pairs[:, 1])
+
+
+def test_resolve_sample_size():
+    assert resolve_sample_size(EXACT_NODE_LIMIT, 10) is None
+    assert resolve_sample_size(EXACT_NODE_LIMIT + 1) == DEFAULT_SAMPLE_SIZE
+    assert resolve_sample_size(EXACT_NODE_LIMIT + 1, 10) == 10
+    assert resolve_sample_size(10 ** 6, 10, tolerance=0.1) > 10
+    assert resolve_sample_size(EXACT_NODE_LIMIT + 1, EXACT_NODE_LIMIT + 1) is None
+
+
+def test_sampled_betweenness_within_error():
+    graph = strongly_connected_graph(300, 600)
+    exact = NODE_METRICS['betweenness_centrality'](graph)
+    estimate, error = approximate_betweenness(graph, 100)
+    assert np.abs(estimate - exact).max() <= error
+
+
+def test_sampled_closeness_within_error():
+    graph = strongly_connected_graph(300, 600)
+    exact = NODE_METRICS['closeness_centrality'](graph)
+    estimate, error = approximate_closeness(graph, 100)
+    # The bound is on each node's mean distance, the inverse of its closeness here
+    assert np.abs(1 / estimate - 1 / exact).max() <= error
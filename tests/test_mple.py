@@ -0,0 +1,88 @@
+import itertools
+import math
+
+import numpy as np
+import pandas as pd
+import pytest
+
+import pages.mple as mple
+from pages.mple import UnsupportedTerm, fit_mple, logistic_regression
+
+GROUPS = ['a', 'b', 'c'] * 4
+
+
+def use_network(monkeypatch, ties, groups):
+    """Make fit_mple read a network of len(groups) nodes with the given (tail, head) ties"""
+    edges = pd.DataFrame(ties, columns=['Source', 'Target'])
+    attrs = pd.DataFrame({'ID': range(len(groups)), 'Group': groups})
+    monkeypatch.setattr(mple, 'network_frames', lambda: (edges, attrs))
+
+
+def random_ties(size, density, seed):
+    rng = np.random.default_rng(seed)
+    return [(i, j) for i, j in itertools.permutations(range(size), 2) if rng.random() < density]
+
+
+def count(ties, term):
+    """Statistic of a network given as a set of (tail, head) ties, counted tie by tie"""
+    if term == 'edges':
+        return len(ties)
+    if term == 'mutual':
+        return sum((j, i) in ties for i, j in ties) // 2
+    if term == 'ttriple':
+        return sum((i, k) in ties and (k, j) in ties for i, j in ties for k in range(len(GROUPS)))
+    if term == 'nodematch("group")':
+        return sum(GROUPS[i] == GROUPS[j] for i, j in ties)
+
+
+def test_mple_matches_an_ungrouped_logistic_fit(monkeypatch):
+    ties = set(random_ties(12, 0.25, seed=2))
+    use_network(monkeypatch, sorted(ties), GROUPS)
+    terms = ['edges', 'mutual', 'ttriple', 'nodematch("group")']
+    fit = fit_mple(' + '.join(terms))
+
+    # One row per dyad, with change statistics from recounting the network with the tie and without it
+    dyads = list(itertools.permutations(range(12), 2))
+    stats = np.array([[count(ties | {dyad}, term) - count(ties - {dyad}, term) for term in terms]
+                      for dyad in dyads], dtype=float)
+    observed = np.array([dyad in ties for dyad in dyads], dtype=float)
+    coefficients, errors = logistic_regression(stats, observed, np.ones(len(dyads)))
+
+    table = np.array(fit['model_coefficients'])
+    assert fit['term_names'] == ['edges', 'mutual', 'ttriple', 'nodematch.group']
+    assert not fit['dyad_independent']
+    np.testing.assert_allclose(table[:, 0], coefficients, rtol=1e-6)
+    np.testing.assert_allclose(table[:, 1], errors, rtol=1e-6)
+
+
+def test_dyad_independent_mple_has_a_closed_form(monkeypatch):
+    ties = random_ties(12, 0.3, seed=3)
+    use_network(monkeypatch, ties, GROUPS)
+    fit = fit_mple('edges + nodematch("group")')
+
+    # Tie probabilities of the dyads between groups and within groups
+    match_ties = sum(GROUPS[i] == GROUPS[j] for i, j in ties)
+    match_dyads = 12 * 3
+    other_ties, other_dyads = len(ties) - match_ties, 12 * 11 - match_dyads
+
+    def logit(ties, dyads):
+        return math.log(ties / (dyads - ties))
+
+    table = np.array(fit['model_coefficients'])
+    assert fit['dyad_independent']
+    np.testing.assert_allclose(table[:, 0], [logit(other_ties, other_dyads),
+                                             logit(match_ties, match_dyads) - logit(other_ties, other_dyads)])
+
+
+def test_separation_is_unsupported(monkeypatch):
+    # Every dyad within a group is a tie and no other dyad is
+    ties = [(i, j) for i, j in itertools.permutations(range(12), 2) if GROUPS[i] == GROUPS[j]]
+    use_network(monkeypatch, ties, GROUPS)
+    with pytest.raises(UnsupportedTerm, match="no finite maximum"):
+        fit_mple('edges + nodematch("group")')
+
+
+def test_unknown_term_is_unsupported(monkeypatch):
+    use_network(monkeypatch, random_ties(12, 0.3, seed=4), GROUPS)
+    with pytest.raises(UnsupportedTerm):
+        fit_mple('edges + gwesp(0.5)')
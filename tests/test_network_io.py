@@ -0,0 +1,50 @@
+import numpy as np
+import pandas as pd
+
+from pages.network_io import TableWriter, read_table
+
+
+def write_chunks(tmp_path, chunks):
+    csv_path = str(tmp_path / 'table.csv')
+    with TableWriter(csv_path) as writer:
+        for chunk in chunks:
+            writer.append(chunk)
+    return csv_path
+
+
+def test_column_empty_in_first_chunk_then_text(tmp_path):
+    csv_path = write_chunks(tmp_path, [
+        pd.DataFrame({'ID': [1, 2], 'Note': [np.nan, np.nan]}),
+        pd.DataFrame({'ID': [3, 4], 'Note': ['x', 'y']}),
+    ])
+    df = read_table(csv_path)
+    assert df['ID'].tolist() == [1, 2, 3, 4]
+    assert df['Note'].tolist()[2:] == ['x', 'y']
+    assert df['Note'].isna().tolist()[:2] == [True, True]
+
+
+def test_int_column_then_text(tmp_path):
+    csv_path = write_chunks(tmp_path, [
+        pd.DataFrame({'ID': [1, 2], 'Age': [30, 41]}),
+        pd.DataFrame({'ID': [3, 4], 'Age': ['n/a', '25']}),
+    ])
+    assert read_table(csv_path)['Age'].tolist() == ['30', '41', 'n/a', '25']
+
+
+def test_int_column_then_float(tmp_path):
+    csv_path = write_chunks(tmp_path, [
+        pd.DataFrame({'ID': [1, 2], 'Age': [30, 41]}),
+        pd.DataFrame({'ID': [3, 4], 'Age': [np.nan, 25.5]}),
+        pd.DataFrame({'ID': [5], 'Age': [7]}),
+    ])
+    age = read_table(csv_path)['Age']
+    assert age.tolist()[:2] == [30.0, 41.0]
+    assert np.isnan(age[2])
+    assert age.tolist()[3:] == [25.5, 7.0]
+
+
+def test_same_types_across_chunks(tmp_path):
+    csv_path = write_chunks(tmp_path, [pd.DataFrame({'ID': [i], 'Name': [f'n{i}']}) for i in range(3)])
+    df = read_table(csv_path)
+    assert df['ID'].tolist() == [0, 1, 2]
+    assert df['Name'].tolist() == ['n0', 'n1', 'n2']
@@ -0,0 +1,35 @@
+import numpy as np
+import pytest
+
+from pages.network_store import DrawStore, save_draws
+
+
+def test_draws_round_trip(tmp_path):
+    path = str(tmp_path / "draws.npy")
+    observed = [12, 3, 7, 3]
+    draws = [[3, 7, 12], [7, 12, 20, 31], [], [1, 2, 3]]
+    save_draws(path, 6, observed, draws)
+
+    store = DrawStore(path)
+    assert store.size == 6
+    assert len(store) == len(draws)
+    assert store.observed.tolist() == [3, 7, 12]
+    for index, ties in enumerate(draws):
+        assert store.ties(index).tolist() == sorted(ties)
+    assert store.changes(0).tolist() == []
+    assert store.changes(1).tolist() == [3, 20, 31]
+    assert store.summary(1) == {'ties': 4, 'added': 2, 'removed': 1}
+    assert store.summary(2) == {'ties': 0, 'added': 0, 'removed': 3}
+
+
+def test_no_draws(tmp_path):
+    path = str(tmp_path / "draws.npy")
+    save_draws(path, 3, np.array([1, 5]), [])
+    store = DrawStore(path)
+    assert len(store) == 0
+    assert store.observed.tolist() == [1, 5]
+
+
+def test_network_too_large(tmp_path):
+    with pytest.raises(ValueError):
+        save_draws(str(tmp_path / "draws.npy"), 50000, [], [[]])
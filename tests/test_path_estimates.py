@@ -0,0 +1,67 @@
+import networkx as nx
+import numpy as np
+import pytest
+
+from pages.csr_graph import CSRGraph
+from pages.path_estimates import estimate_average_path_length, estimate_diameter
+
+GRAPHS = {
+    'path': nx.path_graph(12),
+    'cycle': nx.cycle_graph(15),
+    'barbell': nx.barbell_graph(6, 4),
+    'tree': nx.balanced_tree(2, 5),
+    # Several components and isolated nodes
+    'sparse': nx.gnp_random_graph(80, 0.03, seed=4),
+    'dense': nx.gnp_random_graph(60, 0.1, seed=5),
+}
+
+
+def undirected_csr(graph):
+    """Undirected CSRGraph with the nodes and edges of a NetworkX graph, isolated nodes included"""
+    position = {node: i for i, node in enumerate(graph.nodes)}
+    edges = np.array([(position[u], position[v]) for u, v in graph.edges], dtype=np.int64).reshape(-1, 2)
+    node_ids = np.array([str(node) for node in graph.nodes], dtype=object)
+    return CSRGraph.from_arrays(node_ids, edges[:, 0], edges[:, 1]).to_undirected()
+
+
+def component_paths(graph):
+    """Diameter and average shortest path length over all connected pairs, with NetworkX"""
+    diameter, total, pairs = 0, 0, 0
+    for nodes in nx.connected_components(graph):
+        component = graph.subgraph(nodes)
+        if len(nodes) > 1:
+            diameter = max(diameter, nx.diameter(component))
+            total += nx.average_shortest_path_length(component) * len(nodes) * (len(nodes) - 1)
+            pairs += len(nodes) * (len(nodes) - 1)
+    return diameter, total / pairs
+
+
+@pytest.mark.parametrize('name', GRAPHS)
+def test_diameter_matches_networkx(name):
+    graph = GRAPHS[name]
+    estimate = estimate_diameter(undirected_csr(graph), max_bfs=len(graph))
+    diameter, _ = component_paths(graph)
+    assert estimate['lower'] == estimate['upper'] == diameter
+    assert estimate['components'] == nx.number_connected_components(graph)
+
+
+def test_diameter_bounds_hold_on_a_small_budget():
+    graph = GRAPHS['dense']
+    estimate = estimate_diameter(undirected_csr(graph), max_bfs=4)
+    assert estimate['lower'] <= component_paths(graph)[0] <= estimate['upper']
+
+
+@pytest.mark.parametrize('name', GRAPHS)
+def test_exact_average_path_length(name):
+    graph = GRAPHS[name]
+    estimate = estimate_average_path_length(undirected_csr(graph))
+    assert estimate['error'] == 0
+    assert estimate['mean'] == pytest.approx(component_paths(graph)[1])
+
+
+def test_sampled_average_path_length_within_interval():
+    graph = nx.connected_watts_strogatz_graph(400, 4, 0.1, seed=6)
+    estimate = estimate_average_path_length(undirected_csr(graph), samples=100)
+    assert estimate['sources'] == 100
+    assert 0 < estimate['error'] < 1
+    assert abs(estimate['mean'] - component_paths(graph)[1]) <= estimate['error']